@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cve_item import CVEItem
+from cve_codec import CODECS, encode_value, decode_value
+
+from synthetic_feed import iter_cve_items
+
+
+def measure(func, values, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode/decode throughput and stored size of CVE record codecs")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--fanout", type=int, default=8, help="CPE URIs per item")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = [CVEItem(item).to_record() for item in iter_cve_items(args.items, cpe_fanout=args.fanout)]
+
+    results = []
+    for name in sorted(CODECS):
+        encoded = [encode_value(record, name) for record in records]
+        encode_time = measure(lambda record: encode_value(record, name), records, args.repeat)
+        decode_time = measure(decode_value, encoded, args.repeat)
+        results.append(dict(
+            codec=name,
+            encode_items_per_sec=args.items / encode_time,
+            decode_items_per_sec=args.items / decode_time,
+            bytes_per_cve=sum(len(value) for value in encoded) / float(args.items),
+        ))
+    print(json.dumps(dict(items=args.items, results=results), indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cpe as cpe_module
+
+import cpe_parser
+
+from synthetic_feed import iter_cve_items
+
+
+def legacy_extract_component_and_version_from_cpe_string(cpe_string):
+    # Copy of the pre-cpe_parser engine implementation (with the None fix)
+    try:
+        cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_2_2)
+    except:
+        try:
+            cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_2_3)
+        except:
+            try:
+                cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_UNDEFINED)
+            except:
+                return None
+    c22_product = cpep.get_product()
+    c22_version = cpep.get_version()
+    result = dict()
+    result["component"] = c22_product[0] if isinstance(c22_product, list) and len(c22_product) > 0 else None
+    result["version"] = c22_version[0] if isinstance(c22_version, list) and len(c22_version) > 0 else None
+    if not result["component"] or not result["version"]:
+        return None
+    return result
+
+
+def measure(func, cpe_strings):
+    start = time.perf_counter()
+    for cpe_string in cpe_strings:
+        func(cpe_string)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPE name parsing: cpe library vs fast path vs cached fast path")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--fanout", type=int, default=8, help="CPE URIs per item")
+    parser.add_argument("--cpe23", action="store_true", help="Use cpe23Uri instead of cpe22Uri")
+    args = parser.parse_args()
+
+    field = "cpe23Uri" if args.cpe23 else "cpe22Uri"
+    cpe_strings = []
+    for item in iter_cve_items(args.items, cpe_fanout=args.fanout):
+        for node in item["configurations"]["nodes"]:
+            for one_cpe in node["cpe"]:
+                cpe_strings.append(one_cpe[field])
+
+    legacy = measure(legacy_extract_component_and_version_from_cpe_string, cpe_strings)
+    fast = measure(cpe_parser.parse_cpe_fast, cpe_strings)
+    cpe_parser.configure_cpe_cache(0)
+    cpe_parser.configure_cpe_cache(cpe_parser.DEFAULT_CACHE_SIZE)
+    cached = measure(cpe_parser.extract_component_and_version, cpe_strings)
+
+    count = float(len(cpe_strings))
+    print(json.dumps(dict(
+        cpe_strings=len(cpe_strings),
+        unique=len(set(cpe_strings)),
+        library_us_per_cpe=legacy / count * 1e6,
+        fast_us_per_cpe=fast / count * 1e6,
+        cached_us_per_cpe=cached / count * 1e6,
+        speedup_cached=legacy / cached if cached else None,
+        cache=cpe_parser.cpe_cache_stats(),
+    ), indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
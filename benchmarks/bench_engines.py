@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import updater
+from cve_item import CVEItem
+from index_mutations import extract_index_mappings, ComponentNames
+
+from synthetic_feed import make_feed
+from feed_server import make_feed_server
+
+# Reproducible end-to-end numbers for every engine in updater.ENGINES:
+# populate throughput, update latency and query latency percentiles, all
+# against synthetic feeds served from a local HTTP server. The Redis
+# engines need a redis-server; the selected database is flushed.
+
+
+def percentile(values, fraction):
+    # Nearest rank, values sorted
+    if len(values) == 0:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(latencies):
+    """
+    :param latencies: (list) - Seconds
+    :return: (dict) - count, p50, p99, max and mean in milliseconds
+    """
+    values = sorted(latency * 1000 for latency in latencies)
+    return dict(
+        count=len(values),
+        p50_ms=percentile(values, 0.50),
+        p99_ms=percentile(values, 0.99),
+        max_ms=values[-1] if values else None,
+        mean_ms=sum(values) / len(values) if values else None,
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_setting(text):
+    # key=value, the value as JSON when it parses: batch_size=500, codec="binary"
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def collect_index_keys(feeds, component_names):
+    """
+    :param feeds: (list) - Synthetic year feeds
+    :param component_names: (ComponentNames) - Naming the engines index with
+    :return: (tuple) - (list of unique (component, version), number of mappings)
+    """
+    keys = dict()
+    mappings_count = 0
+    for feed in feeds:
+        for item in feed["CVE_Items"]:
+            mappings, cpe_count = extract_index_mappings(CVEItem(item).to_record(), component_names)
+            mappings_count += len(mappings)
+            for component, version, version_key in mappings:
+                keys[(component, version)] = True
+    return list(keys), mappings_count
+
+
+def make_queries(index_keys, count, seed=0):
+    """
+    The same query mix for every engine
+    :return: (dict) - Query kind -> list of argument tuples
+    """
+    rnd = random.Random(seed)
+    sample = [index_keys[rnd.randrange(len(index_keys))] for _ in range(count)]
+    return dict(
+        exact=sample,
+        pattern=[(component, version.split(".")[0] + ".*") for component, version in sample],
+        # Bare product names, resolved to all vendors by the engine
+        product=[(component.rpartition(":")[2], version) for component, version in sample],
+        range=[(component, None, version) for component, version in sample],
+        text=[rnd.choice(["buffer overflow", '"remote attackers"', "crafted OR overflow"]) for _ in range(count)],
+        attributes=[dict(cvssv3_severity=rnd.choice(["HIGH", "CRITICAL"]), cwe=rnd.choice(["CWE-79", "CWE-119"]))
+                    for _ in range(count)],
+    )
+
+
+def run_queries(engine, queries):
+    kinds = dict(
+        exact=lambda query: engine.find_by_component_and_version(*query),
+        pattern=lambda query: engine.find_by_component_and_version(*query),
+        product=lambda query: engine.find_by_component_and_version(*query),
+        range=lambda query: engine.find_by_component_and_version_range(*query),
+        text=lambda query: engine.search_descriptions(query),
+        attributes=lambda query: engine.find_ids_by_attributes(**query),
+    )
+    result = dict()
+    for kind, run in kinds.items():
+        latencies = []
+        results = 0
+        for query in queries[kind]:
+            start = time.perf_counter()
+            found = run(query)
+            latencies.append(time.perf_counter() - start)
+            results += len(found)
+        result[kind] = dict(summarize(latencies), results=results)
+    start = time.perf_counter()
+    found = engine.find_many(queries["exact"])
+    result["find_many"] = dict(
+        queries=len(queries["exact"]),
+        total_ms=(time.perf_counter() - start) * 1000,
+        round_trips=found["stats"].get("round_trips"))
+    return result
+
+
+def bump_modified_feed(server, year, items, cpe_fanout, run):
+    # A modified feed that really changes CVEs of the last year feed
+    feed = make_feed(items, year=year, cpe_fanout=cpe_fanout, seed=1000 + run)
+    for item in feed["CVE_Items"]:
+        item["lastModifiedDate"] = "{}-01-01T00:{:02d}Z".format(year + 1, run % 60)
+    server.add_feed("nvdcve-1.0-modified.json.gz", feed)
+
+
+def bench_engine(name, settings, server, args, years, items_count, mappings_count, queries):
+    engine = updater.create_search_engine(dict(settings, engine=name))
+    if hasattr(engine, "cache_for_indexer"):
+        engine.cache_for_indexer.flushdb()
+
+    start = time.perf_counter()
+    populate = engine.action_populate_cve()
+    populate_seconds = time.perf_counter() - start
+
+    update_latencies = []
+    unchanged_latencies = []
+    for run in range(args.updates):
+        bump_modified_feed(server, years[-1], args.update_items, args.fanout, run)
+        start = time.perf_counter()
+        engine.action_update_cve_modified()
+        update_latencies.append(time.perf_counter() - start)
+        # Same feed again: revalidated and skipped
+        start = time.perf_counter()
+        engine.action_update_cve_modified()
+        unchanged_latencies.append(time.perf_counter() - start)
+
+    result = dict(
+        populate=dict(
+            seconds=populate_seconds,
+            items=items_count,
+            mappings=mappings_count,
+            items_per_second=items_count / populate_seconds,
+            mappings_per_second=mappings_count / populate_seconds,
+            changes=populate.get("changes"),
+        ),
+        update=dict(summarize(update_latencies), items=args.update_items),
+        update_unchanged=summarize(unchanged_latencies),
+        queries=run_queries(engine, queries),
+    )
+    if hasattr(engine, "close"):
+        engine.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Populate, update and query benchmark of the search engines on synthetic NVD feeds")
+    parser.add_argument("--engines", default=",".join(sorted(updater.ENGINES)),
+                        help="Comma separated engine names from updater.ENGINES")
+    parser.add_argument("--years", type=int, default=3, help="Year feeds, ending with the current year")
+    parser.add_argument("--items", type=int, default=2000, help="Items per year feed")
+    parser.add_argument("--fanout", type=int, default=8, help="CPE URIs per item")
+    parser.add_argument("--update-items", type=int, default=200, help="Items in each modified feed")
+    parser.add_argument("--updates", type=int, default=5, help="Modified feed updates to time")
+    parser.add_argument("--queries", type=int, default=500, help="Queries of each kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-host", default="127.0.0.1")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--redis-db", type=int, default=15, help="Database for the Redis engines, it is flushed")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a SETTINGS key, the value is parsed as JSON if possible")
+    parser.add_argument("--output", help="Write the JSON result to this file instead of stdout")
+    args = parser.parse_args()
+
+    current_year = datetime.now().year
+    years = list(range(current_year - args.years + 1, current_year + 1))
+    server = make_feed_server(years, args.items, cpe_fanout=args.fanout, update_items=args.update_items).start()
+    work_directory = tempfile.mkdtemp(prefix="bench_engines_")
+
+    overrides = dict(parse_setting(text) for text in args.set)
+    index_keys, mappings_count = collect_index_keys(
+        [make_feed(args.items, year=year, cpe_fanout=args.fanout, seed=seed) for seed, year in enumerate(years)],
+        ComponentNames.from_settings(dict(updater.SETTINGS, **overrides)))
+    queries = make_queries(index_keys, args.queries, seed=args.seed)
+
+    results = dict()
+    try:
+        for name in args.engines.split(","):
+            settings = dict(updater.SETTINGS)
+            settings.update(
+                sources=dict(updater.SETTINGS["sources"], **server.sources()),
+                start_year=years[0],
+                cache_for_indexer=dict(host=args.redis_host, port=args.redis_port, db=args.redis_db),
+                feed_cache_dir=os.path.join(work_directory, name, "feed_cache"),
+                sqlite_path=os.path.join(work_directory, name, "index.sqlite"),
+                snapshot_path=os.path.join(work_directory, name, "index.snapshot"),
+                # Storage latency, not cache hits
+                query_cache_size=0,
+            )
+            settings.update(overrides)
+            os.makedirs(os.path.join(work_directory, name), exist_ok=True)
+            try:
+                # Progress lines of the engines must not mix with the JSON
+                with contextlib.redirect_stdout(sys.stderr):
+                    results[name] = bench_engine(
+                        name, settings, server, args, years, args.items * len(years), mappings_count, queries)
+            except Exception as ex:
+                # A missing redis-server must not hide the other engines
+                results[name] = dict(error="{}: {}".format(type(ex).__name__, ex))
+    finally:
+        server.stop()
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = dict(
+        commit=git_commit(),
+        created=datetime.utcnow().isoformat() + "Z",
+        python=platform.python_version(),
+        parameters=dict(
+            years=years,
+            items_per_year=args.items,
+            fanout=args.fanout,
+            update_items=args.update_items,
+            updates=args.updates,
+            queries=args.queries,
+            seed=args.seed,
+            settings=overrides,
+        ),
+        engines=results,
+    )
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cve_item import CVEItem
+
+from synthetic_feed import iter_cve_items
+
+
+def load_baseline_cve_item(revision):
+    """
+    The eagerly decoding CVEItem of an older commit, so the new class is
+    measured against the code it replaced and not against itself
+    :param revision: (str) - Git revision, the root commit if None
+    :return: (type) - CVEItem class of that revision
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if revision is None:
+        revision = subprocess.check_output(
+            ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=directory).decode("utf-8").split()[0]
+    source = subprocess.check_output(["git", "show", revision + ":src/cve_item.py"], cwd=directory)
+    module = types.ModuleType("baseline_cve_item")
+    exec(compile(source, "baseline_cve_item.py", "exec"), module.__dict__)
+    return module.CVEItem
+
+
+def run_json_round_trip(items, item_class):
+    # Old pipeline: CVEItem -> to_json() -> json.loads() -> json.dumps() at storage
+    for item in items:
+        record = json.loads(item_class(item).to_json())
+        json.dumps(record)
+
+
+def run_eager_record(items, item_class):
+    # Old class without the round trip: every section decoded in __init__
+    for item in items:
+        record = dict(item_class(item).__dict__)
+        json.dumps(record)
+
+
+def run_direct_record(items, item_class):
+    # New pipeline: CVEItem -> to_record() -> json.dumps() at storage
+    for item in items:
+        record = item_class(item).to_record()
+        json.dumps(record)
+
+
+def measure(func, items, item_class, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(items, item_class)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-item CPU of the ingest record pipeline")
+    parser.add_argument("--items", type=int, default=15000, help="Items in the synthetic year feed")
+    parser.add_argument("--fanout", type=int, default=8, help="CPE URIs per item")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline-rev", help="Git revision of the eager CVEItem, the root commit by default")
+    args = parser.parse_args()
+
+    items = list(iter_cve_items(args.items, cpe_fanout=args.fanout))
+    baseline_class = load_baseline_cve_item(args.baseline_rev)
+
+    old = measure(run_json_round_trip, items, baseline_class, args.repeat)
+    eager = measure(run_eager_record, items, baseline_class, args.repeat)
+    new = measure(run_direct_record, items, CVEItem, args.repeat)
+
+    result = dict(
+        items=args.items,
+        json_round_trip_us_per_item=old / args.items * 1e6,
+        eager_record_us_per_item=eager / args.items * 1e6,
+        direct_record_us_per_item=new / args.items * 1e6,
+        saved_us_per_item=(old - new) / args.items * 1e6,
+        speedup=old / new if new else None,
+        speedup_over_eager=eager / new if new else None,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import sys
+import gzip
+import json
+import hashlib
+from datetime import datetime, timezone
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from synthetic_feed import make_feed
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        name = self.path.lstrip("/").split("?", 1)[0]
+        payload = self.server.files.get(name)
+        if payload is None:
+            self.send_error(404, "File not found")
+            return
+        self.server.requests[name] = self.server.requests.get(name, 0) + 1
+        etag = '"{}"'.format(hashlib.sha1(payload).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-gzip" if name.endswith(".gz") else "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalFeedServer(object):
+    """
+    Local HTTP stand-in for the NVD feed site. Serves files from memory
+    under the same names as https://nvd.nist.gov/feeds/json/cve/1.0/
+    """
+
+    def __init__(self, files=None, host="127.0.0.1", port=0):
+        """
+        :param files: (dict) - File name -> bytes
+        :param port: (int) - 0 picks a free port
+        """
+        self.httpd = ThreadingHTTPServer((host, port), FeedRequestHandler)
+        self.httpd.files = files if files is not None else {}
+        # File name -> number of GET requests, to check what was downloaded
+        self.httpd.requests = {}
+        self.thread = None
+
+    @property
+    def files(self):
+        return self.httpd.files
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def add_feed(self, name, feed, meta=True):
+        """
+        Serve a feed, plus its .meta companion like the NVD site does
+        """
+        data = json.dumps(feed).encode("utf-8")
+        payload = gzip.compress(data)
+        self.httpd.files[name] = payload
+        if meta and name.endswith(".json.gz"):
+            self.httpd.files[name[:-len(".json.gz")] + ".meta"] = "\r\n".join([
+                "lastModifiedDate:" + datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+                "size:{}".format(len(data)),
+                "gzSize:{}".format(len(payload)),
+                "sha256:" + hashlib.sha256(data).hexdigest().upper(),
+                ""
+            ]).encode("utf-8")
+
+    def sources(self):
+        # Drop-in replacement for SETTINGS["sources"]
+        return dict(
+            cve_modified=self.base_url + "nvdcve-1.0-modified.json.gz",
+            cve_recent=self.base_url + "nvdcve-1.0-recent.json.gz",
+            cve_base=self.base_url + "nvdcve-1.0-",
+            cve_base_postfix=".json.gz",
+        )
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_feed_server(years, items_per_year, cpe_fanout=8, update_items=None, port=0):
+    """
+    Server with synthetic year feeds plus modified and recent feeds
+    """
+    server = LocalFeedServer(port=port)
+    for seed, year in enumerate(years):
+        server.add_feed("nvdcve-1.0-{}.json.gz".format(year),
+                        make_feed(items_per_year, year=year, cpe_fanout=cpe_fanout, seed=seed))
+    if update_items is None:
+        update_items = max(items_per_year // 10, 1)
+    last_year = years[-1]
+    server.add_feed("nvdcve-1.0-modified.json.gz",
+                    make_feed(update_items, year=last_year, cpe_fanout=cpe_fanout, seed=1000))
+    server.add_feed("nvdcve-1.0-recent.json.gz",
+                    make_feed(update_items, year=last_year, cpe_fanout=cpe_fanout, seed=2000))
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic NVD 1.0 feeds over HTTP")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--start-year", type=int, default=2002)
+    parser.add_argument("--end-year", type=int, default=2018)
+    parser.add_argument("--items", type=int, default=1000, help="Items per year feed")
+    parser.add_argument("--fanout", type=int, default=8, help="CPE URIs per item")
+    args = parser.parse_args()
+
+    server = make_feed_server(list(range(args.start_year, args.end_year + 1)), args.items,
+                              cpe_fanout=args.fanout, port=args.port)
+    print("Serving {} feeds at {}".format(len(server.files), server.base_url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import random
+
+PRODUCTS = [
+    ("openssl", "openssl"),
+    ("linux", "linux_kernel"),
+    ("apache", "http_server"),
+    ("gnu", "glibc"),
+    ("php", "php"),
+    ("oracle", "mysql"),
+    ("microsoft", "windows_10"),
+    ("google", "chrome"),
+]
+
+SEVERITIES_V3 = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+SEVERITIES_V2 = ["LOW", "MEDIUM", "HIGH"]
+
+
+def make_cve_item(index, year=2017, cpe_fanout=8, rnd=None):
+    """
+    Build one NVD 1.0 "CVE_Items" element with realistic shape
+    :param index: (int) - Sequence number used for the CVE ID
+    :param year: (int) - Year of the CVE ID and dates
+    :param cpe_fanout: (int) - Number of CPE URIs in configurations
+    :param rnd: (random.Random) - Source of randomness
+    :return: (dict)
+    """
+    if rnd is None:
+        rnd = random.Random(index)
+    vendor, product = PRODUCTS[rnd.randrange(len(PRODUCTS))]
+    cpe_list = []
+    for n in range(cpe_fanout):
+        version = "{}.{}.{}".format(rnd.randrange(4), rnd.randrange(10), n)
+        cpe_list.append(dict(
+            vulnerable=True,
+            cpe22Uri="cpe:/a:{}:{}:{}".format(vendor, product, version),
+            cpe23Uri="cpe:2.3:a:{}:{}:{}:*:*:*:*:*:*:*".format(vendor, product, version),
+        ))
+    score_v3 = round(rnd.uniform(1.0, 10.0), 1)
+    score_v2 = round(rnd.uniform(1.0, 10.0), 1)
+    return {
+        "cve": {
+            "data_type": "CVE",
+            "data_format": "MITRE",
+            "data_version": "4.0",
+            "CVE_data_meta": {"ID": "CVE-{}-{:05d}".format(year, index), "ASSIGNER": "cve@mitre.org"},
+            "affects": {"vendor": {"vendor_data": [{
+                "vendor_name": vendor,
+                "product": {"product_data": [{
+                    "product_name": product,
+                    "version": {"version_data": [{"version_value": c["cpe22Uri"].rsplit(":", 1)[1]} for c in cpe_list]}
+                }]}
+            }]}},
+            "problemtype": {"problemtype_data": [{"description": [
+                {"lang": "en", "value": "CWE-{}".format(rnd.choice([20, 79, 89, 119, 200, 264, 399]))}
+            ]}]},
+            "references": {"reference_data": [
+                {"url": "https://example.org/advisory/{}/{}".format(year, index), "name": "ADV", "refsource": "MISC"}
+                for _ in range(rnd.randrange(1, 6))
+            ]},
+            "description": {"description_data": [{
+                "lang": "en",
+                "value": "Buffer overflow in {} {} allows remote attackers to execute arbitrary code "
+                         "via a crafted request.".format(vendor, product)
+            }]},
+        },
+        "configurations": {"CVE_data_version": "4.0", "nodes": [{"operator": "OR", "cpe": cpe_list}]},
+        "impact": {
+            "baseMetricV3": {
+                "cvssV3": {
+                    "version": "3.0",
+                    "vectorString": "CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H",
+                    "attackVector": "NETWORK",
+                    "attackComplexity": "LOW",
+                    "privilegesRequired": "NONE",
+                    "userInteraction": "NONE",
+                    "scope": "UNCHANGED",
+                    "confidentialityImpact": "HIGH",
+                    "integrityImpact": "HIGH",
+                    "availabilityImpact": "HIGH",
+                    "baseScore": score_v3,
+                    "baseSeverity": SEVERITIES_V3[min(int(score_v3 // 2.5), 3)],
+                },
+                "exploitabilityScore": 3.9,
+                "impactScore": 5.9,
+            },
+            "baseMetricV2": {
+                "cvssV2": {
+                    "version": "2.0",
+                    "vectorString": "(AV:N/AC:L/Au:N/C:P/I:P/A:P)",
+                    "accessVector": "NETWORK",
+                    "accessComplexity": "LOW",
+                    "authentication": "NONE",
+                    "confidentialityImpact": "PARTIAL",
+                    "integrityImpact": "PARTIAL",
+                    "availabilityImpact": "PARTIAL",
+                    "baseScore": score_v2,
+                },
+                "severity": SEVERITIES_V2[min(int(score_v2 // 4), 2)],
+                "exploitabilityScore": 10.0,
+                "impactScore": 6.4,
+                "obtainAllPrivilege": False,
+                "obtainUserPrivilege": False,
+                "obtainOtherPrivilege": False,
+                "userInteractionRequired": False,
+            },
+        },
+        "publishedDate": "{}-{:02d}-{:02d}T17:29Z".format(year, rnd.randrange(1, 13), rnd.randrange(1, 29)),
+        "lastModifiedDate": "{}-{:02d}-{:02d}T21:29Z".format(year, rnd.randrange(1, 13), rnd.randrange(1, 29)),
+    }
+
+
+def iter_cve_items(count, year=2017, cpe_fanout=8, seed=0):
+    rnd = random.Random(seed)
+    for index in range(count):
+        yield make_cve_item(index, year=year, cpe_fanout=cpe_fanout, rnd=rnd)
+
+
+def make_feed(count, year=2017, cpe_fanout=8, seed=0):
+    items = list(iter_cve_items(count, year=year, cpe_fanout=cpe_fanout, seed=seed))
+    return {
+        "CVE_data_type": "CVE",
+        "CVE_data_format": "MITRE",
+        "CVE_data_version": "4.0",
+        "CVE_data_numberOfCVEs": str(len(items)),
+        "CVE_data_timestamp": "{}-12-31T23:59Z".format(year),
+        "CVE_Items": items,
+    }
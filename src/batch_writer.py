@@ -0,0 +1,58 @@
+import time
+
+from metrics import INGEST_METRICS
+
+
+class RedisBatchWriter(object):
+    """
+    Buffers Redis write commands and sends them through a pipeline in
+    chunks of batch_size. Commands are called on the writer exactly like on
+    a redis client: writer.hset(name, key, value), writer.sadd(name, value).
+    """
+
+    def __init__(self, cache, batch_size=1000, transaction=False):
+        """
+        :param cache: (redis.StrictRedis) - Connection to write into
+        :param batch_size: (int) - Commands per round trip
+        :param transaction: (bool) - Wrap every chunk into MULTI/EXEC
+        """
+        self.cache = cache
+        self.batch_size = max(int(batch_size), 1)
+        self.transaction = transaction
+        self.pipe = cache.pipeline(transaction=transaction)
+        self.pending = 0
+        self.commands = 0
+        self.round_trips = 0
+
+    def __getattr__(self, command):
+        pipe_command = getattr(self.pipe, command)
+
+        def buffered(*args, **kwargs):
+            pipe_command(*args, **kwargs)
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.flush()
+
+        return buffered
+
+    def flush(self):
+        if self.pending == 0:
+            return []
+        start = time.perf_counter()
+        result = self.pipe.execute()
+        INGEST_METRICS.observe("write", time.perf_counter() - start)
+        INGEST_METRICS.increment("write_batches")
+        INGEST_METRICS.increment("write_commands", self.pending)
+        self.commands += self.pending
+        self.round_trips += 1
+        self.pending = 0
+        return result
+
+    def stats(self):
+        return dict(
+            commands=self.commands,
+            round_trips=self.round_trips,
+            commands_per_round_trip=self.commands / self.round_trips if self.round_trips else 0,
+            batch_size=self.batch_size,
+            transaction=self.transaction
+        )
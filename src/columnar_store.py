@@ -0,0 +1,225 @@
+from cve_codec import decode_value
+from index_mutations import extract_index_mappings, split_component, to_timestamp, ComponentNames
+
+# NumPy is optional: only the columnar store needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Severity codes: position in this tuple, 0 - unknown, also for values not listed
+SEVERITIES = ("", "NONE", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+SEVERITY_CODES = dict((severity, code) for code, severity in enumerate(SEVERITIES))
+
+
+def extract_products(record, component_names=None):
+    # Same components the index routes the record to
+    mappings, cpe_count = extract_index_mappings(record, component_names)
+    return set(component for component, version, version_key in mappings)
+
+
+def to_score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class ColumnarCVEStore(object):
+    """
+    In-memory column store of CVE fields for multi-criteria filters and
+    aggregates, e.g. CVSSv3 >= 9, published this year, affecting any of
+    500 products. Each filter is a vectorized mask over all CVEs; products
+    are interned to integer IDs and joined through (CVE row, product ID)
+    pair arrays.
+
+    Records are added with add_record() and the columns are built on the
+    first query; adding more records rebuilds them on the next query.
+    """
+
+    def __init__(self, component_names=None):
+        if np is None:
+            raise ImportError("ColumnarCVEStore needs numpy: pip install -r requirements-columnar.txt")
+        if component_names is None:
+            component_names = ComponentNames()
+        self.component_names = component_names
+        self.rows = dict()
+        self.ids = []
+        self.published = []
+        self.last_modified = []
+        self.cvssv2_score = []
+        self.cvssv3_score = []
+        self.cvssv2_severity = []
+        self.cvssv3_severity = []
+        self.row_products = []
+        self.products = dict()
+        self.product_names = []
+        # Bare product -> IDs of its vendor-qualified names
+        self.products_by_bare_name = dict()
+        self.columns = None
+
+    @classmethod
+    def from_records(cls, records, component_names=None):
+        """
+        :param records: (iterable) - Records from CVEItem.to_record() or decoded CVE bodies
+        :param component_names: (ComponentNames) - Naming of products, as in the index
+        """
+        store = cls(component_names)
+        for record in records:
+            store.add_record(record)
+        return store
+
+    @classmethod
+    def from_snapshot(cls, reader, component_names=None):
+        """
+        :param reader: (SnapshotReader) - Snapshot written by action_export_snapshot
+        """
+        return cls.from_records(
+            (decode_value(body) for cve_id, body, last_modified in reader.iter_cves()), component_names)
+
+    def intern_product(self, product):
+        product_id = self.products.get(product)
+        if product_id is None:
+            product_id = self.products[product] = len(self.product_names)
+            self.product_names.append(product)
+            vendor, bare_name = split_component(product)
+            if vendor is not None:
+                self.products_by_bare_name.setdefault(bare_name, []).append(product_id)
+        return product_id
+
+    def add_record(self, record):
+        """
+        Add a CVE, or replace the one with the same ID
+        """
+        cvssv2 = record.get("cvssv2") or {}
+        cvssv3 = record.get("cvssv3") or {}
+        values = (
+            to_timestamp(record.get("publishedDate")),
+            to_timestamp(record.get("lastModifiedDate")),
+            to_score(cvssv2.get("baseScore")),
+            to_score(cvssv3.get("baseScore")),
+            SEVERITY_CODES.get(cvssv2.get("severity") or "", 0),
+            SEVERITY_CODES.get(cvssv3.get("baseSeverity") or "", 0),
+            sorted(self.intern_product(product) for product in extract_products(record, self.component_names)),
+        )
+        columns = (self.published, self.last_modified, self.cvssv2_score, self.cvssv3_score,
+                   self.cvssv2_severity, self.cvssv3_severity, self.row_products)
+        row = self.rows.get(record["id"])
+        if row is None:
+            self.rows[record["id"]] = len(self.ids)
+            self.ids.append(record["id"])
+            for column, value in zip(columns, values):
+                column.append(value)
+        else:
+            for column, value in zip(columns, values):
+                column[row] = value
+        self.columns = None
+
+    def build_columns(self):
+        if self.columns is not None:
+            return self.columns
+        pair_counts = [len(products) for products in self.row_products]
+        self.columns = dict(
+            id=np.array(self.ids, dtype=object),
+            published=np.array(self.published, dtype=np.float64),
+            last_modified=np.array(self.last_modified, dtype=np.float64),
+            cvssv2_score=np.array(self.cvssv2_score, dtype=np.float32),
+            cvssv3_score=np.array(self.cvssv3_score, dtype=np.float32),
+            cvssv2_severity=np.array(self.cvssv2_severity, dtype=np.int8),
+            cvssv3_severity=np.array(self.cvssv3_severity, dtype=np.int8),
+            pair_row=np.repeat(np.arange(len(self.ids), dtype=np.int32), pair_counts),
+            pair_product=np.array(
+                [product_id for products in self.row_products for product_id in products], dtype=np.int32),
+        )
+        return self.columns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, min_cvssv3=None, max_cvssv3=None, min_cvssv2=None, max_cvssv2=None,
+             cvssv3_severity=None, cvssv2_severity=None, published_after=None, published_before=None,
+             modified_after=None, modified_before=None, products=None):
+        """
+        Boolean mask over all CVEs, criteria that are None are not applied.
+        Scores compare with >= / <=, dates with >= (after) and < (before).
+        :param cvssv3_severity: (list) - Severities like ["HIGH", "CRITICAL"]
+        :param published_after: (str, datetime or float) - Date bound
+        :param products: (list) - Components, "vendor:product" or a bare
+        product for all of its vendors, aliases resolved as in the index;
+        any of them matches
+        :return: (numpy.ndarray) - dtype bool, one entry per CVE
+        """
+        columns = self.build_columns()
+        mask = np.ones(len(self.ids), dtype=bool)
+        # NaN (no score) fails every comparison and drops out
+        for column, bound, above in (
+                ("cvssv3_score", min_cvssv3, True), ("cvssv3_score", max_cvssv3, False),
+                ("cvssv2_score", min_cvssv2, True), ("cvssv2_score", max_cvssv2, False)):
+            if bound is not None:
+                mask &= columns[column] >= bound if above else columns[column] <= bound
+        for column, severities in (("cvssv3_severity", cvssv3_severity), ("cvssv2_severity", cvssv2_severity)):
+            if severities is not None:
+                codes = [SEVERITY_CODES.get(severity.upper(), 0) for severity in severities]
+                mask &= np.isin(columns[column], codes)
+        for column, bound, above in (
+                ("published", published_after, True), ("published", published_before, False),
+                ("last_modified", modified_after, True), ("last_modified", modified_before, False)):
+            if bound is not None:
+                mask &= columns[column] >= to_timestamp(bound) if above else columns[column] < to_timestamp(bound)
+        if products is not None:
+            product_ids = []
+            for product in products:
+                product = self.component_names.canonical(product)
+                if product in self.products:
+                    product_ids.append(self.products[product])
+                product_ids.extend(self.products_by_bare_name.get(product, ()))
+            affected = np.zeros(len(self.ids), dtype=bool)
+            affected[columns["pair_row"][np.isin(columns["pair_product"], product_ids)]] = True
+            mask &= affected
+        return mask
+
+    def filter(self, **criteria):
+        """
+        :param criteria: - Keyword arguments of mask()
+        :return: (list) - Sorted IDs of matching CVEs
+        """
+        return sorted(self.build_columns()["id"][self.mask(**criteria)].tolist())
+
+    def count(self, **criteria):
+        return int(np.count_nonzero(self.mask(**criteria)))
+
+    def count_by_severity(self, cvss_version=3, **criteria):
+        """
+        :return: (dict) - Severity -> number of matching CVEs, "" for unknown
+        """
+        column = self.build_columns()["cvssv3_severity" if cvss_version == 3 else "cvssv2_severity"]
+        counts = np.bincount(column[self.mask(**criteria)], minlength=len(SEVERITIES))
+        return dict((severity, int(counts[code])) for code, severity in enumerate(SEVERITIES))
+
+    def score_summary(self, cvss_version=3, **criteria):
+        """
+        :return: (dict) - count, mean, min and max score of matching CVEs that have one
+        """
+        scores = self.build_columns()["cvssv3_score" if cvss_version == 3 else "cvssv2_score"][self.mask(**criteria)]
+        scores = scores[~np.isnan(scores)]
+        if len(scores) == 0:
+            return dict(count=0, mean=None, min=None, max=None)
+        return dict(
+            count=int(len(scores)),
+            mean=float(scores.mean()),
+            min=float(scores.min()),
+            max=float(scores.max())
+        )
+
+    def count_by_product(self, top=None, **criteria):
+        """
+        :param top: (int) - Keep only the most affected products
+        :return: (list) - (product, number of matching CVEs), most affected first
+        """
+        columns = self.build_columns()
+        selected = self.mask(**criteria)[columns["pair_row"]]
+        counts = np.bincount(columns["pair_product"][selected], minlength=len(self.product_names))
+        order = np.argsort(-counts, kind="stable")
+        if top is not None:
+            order = order[:top]
+        return [(self.product_names[product_id], int(counts[product_id])) for product_id in order if counts[product_id] > 0]
@@ -0,0 +1,165 @@
+import re
+import functools
+
+import cpe as cpe_module
+
+# Characters the fast path accepts in CPE 2.2 URI fields (percent escapes
+# included). Anything else goes to the cpe library, which knows the full
+# grammar.
+URI_FIELD = re.compile(r"^(?:[a-z0-9._\-]|%[0-9a-f]{2})*$")
+URI_PACKED_FIELD = re.compile(r"^(?:[a-z0-9._\-~]|%[0-9a-f]{2})*$")
+# Formatted string (2.3) fields without escapes or embedded wildcards
+FS_FIELD = re.compile(r"^(?:\*|-|[a-z0-9._\-]+)$")
+
+PARTS = ("a", "o", "h")
+
+DEFAULT_CACHE_SIZE = 65536
+
+counters = dict(
+    fast=0,
+    fallback=0,
+)
+
+# cpe_cache_stats() values that add up over processes
+CACHE_COUNTS = ("hits", "misses", "fast_parsed", "library_parsed")
+
+
+def parse_cpe_fast(cpe_string):
+    """
+    Split plain "cpe:/" and "cpe:2.3:" names without the cpe library
+    :param cpe_string: (str) - CPE name
+    :return: (tuple) - (vendor, product, version), or None when the name
+    needs the full parser
+    """
+    lowered = cpe_string.lower()
+    if lowered.startswith("cpe:/"):
+        fields = lowered[5:].split(":")
+        if len(fields) > 7 or fields[0] not in PARTS:
+            return None
+        for field in fields[1:4]:
+            if URI_FIELD.match(field) is None:
+                return None
+        for field in fields[4:6]:
+            if URI_PACKED_FIELD.match(field) is None:
+                return None
+        # Language tags have their own grammar
+        if len(fields) > 6 and fields[6] != "":
+            return None
+        fields.extend([""] * (4 - len(fields)))
+        return fields[1], fields[2], fields[3]
+    if lowered.startswith("cpe:2.3:"):
+        if "\\" in lowered:
+            return None
+        fields = lowered.split(":")
+        if len(fields) != 13 or fields[2] not in PARTS:
+            return None
+        for field in fields[3:]:
+            if FS_FIELD.match(field) is None:
+                return None
+        # Language tags have their own grammar
+        if fields[8] not in ("*", "-"):
+            return None
+        return fields[3], fields[4], fields[5]
+    return None
+
+
+def parse_cpe_with_library(cpe_string):
+    """
+    General parser: try CPE 2.2, then 2.3, then undefined version
+    :param cpe_string: (str) - CPE name
+    :return: (tuple) - (vendor, product, version), None if unparsable
+    """
+    for version in (cpe_module.CPE.VERSION_2_2, cpe_module.CPE.VERSION_2_3, cpe_module.CPE.VERSION_UNDEFINED):
+        try:
+            cpep = cpe_module.CPE(cpe_string, version)
+        except Exception:
+            continue
+        values = []
+        for getter in (cpep.get_vendor, cpep.get_product, cpep.get_version):
+            value = getter()
+            values.append(value[0] if isinstance(value, list) and len(value) > 0 else None)
+        return tuple(values)
+    return None
+
+
+def parse_cpe(cpe_string):
+    parsed = parse_cpe_fast(cpe_string)
+    if parsed is not None:
+        counters["fast"] += 1
+        return parsed
+    counters["fallback"] += 1
+    return parse_cpe_with_library(cpe_string)
+
+
+cached_parse_cpe = functools.lru_cache(maxsize=DEFAULT_CACHE_SIZE)(parse_cpe)
+
+
+def configure_cpe_cache(maxsize):
+    """
+    Resize the parse cache. The cache is dropped only if the size changes.
+    """
+    global cached_parse_cpe
+    if cached_parse_cpe.cache_info().maxsize != maxsize:
+        cached_parse_cpe = functools.lru_cache(maxsize=maxsize)(parse_cpe)
+
+
+def cpe_cache_stats():
+    info = cached_parse_cpe.cache_info()
+    lookups = info.hits + info.misses
+    return dict(
+        hits=info.hits,
+        misses=info.misses,
+        hit_rate=info.hits / lookups if lookups else 0.0,
+        size=info.currsize,
+        maxsize=info.maxsize,
+        fast_parsed=counters["fast"],
+        library_parsed=counters["fallback"],
+    )
+
+
+def cpe_cache_delta(since):
+    """
+    :param since: (dict) - Earlier cpe_cache_stats() of this process
+    :return: (dict) - Lookups and parses after it, with the current size
+    """
+    current = cpe_cache_stats()
+    delta = dict((name, current[name] - since[name]) for name in CACHE_COUNTS)
+    delta.update(size=current["size"], maxsize=current["maxsize"])
+    return delta
+
+
+def merge_cpe_cache_stats(deltas):
+    """
+    Combine the cpe_cache_delta() of worker processes into the form of
+    cpe_cache_stats(); size is that of the largest worker cache
+    """
+    merged = dict((name, sum(delta[name] for delta in deltas)) for name in CACHE_COUNTS)
+    lookups = merged["hits"] + merged["misses"]
+    merged.update(
+        hit_rate=merged["hits"] / lookups if lookups else 0.0,
+        size=max([delta["size"] for delta in deltas] or [0]),
+        maxsize=max([delta["maxsize"] for delta in deltas] or [cached_parse_cpe.cache_info().maxsize]),
+    )
+    return merged
+
+
+def extract_component_and_version(cpe_string):
+    """
+    :param cpe_string: (str) - CPE name in 2.2 URI or 2.3 formatted string form
+    :return: (dict) - New dict with vendor, component and version, None if
+    the name can not be parsed or has no product or version
+    """
+    if not cpe_string:
+        return None
+    parsed = cached_parse_cpe(cpe_string)
+    if parsed is None:
+        return None
+    vendor, product, version = parsed
+    if product is None or version is None or product == "" or version == "":
+        return None
+    # Callers modify the result in place, the cached tuple stays intact
+    return dict(
+        vendor=vendor,
+        component=product,
+        version=version
+    )
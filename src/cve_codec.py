@@ -0,0 +1,243 @@
+import ast
+import json
+import zlib
+import struct
+
+# Every value written by a codec starts with MAGIC followed by a one byte
+# format tag. Values without MAGIC were written before the codec layer
+# existed: plain JSON (stack engine, cve:: records) or a Python repr (hash
+# engine "data" field) - both stay readable.
+MAGIC = 0xCE
+
+TAG_JSON = 1
+TAG_BINARY = 2
+TAG_BINARY_ZLIB = 3
+TAG_JSON_ZLIB = 4
+
+# Strings that are frequent in CVE records. The binary format stores them
+# as a single byte index. The table belongs to TAG_BINARY: never reorder or
+# remove entries, new strings may only be appended.
+STRING_TABLE = (
+    "data_type", "data_format", "data_version", "id", "vendor", "cwe",
+    "references", "description", "cpe", "cvssv2", "cvssv3", "publishedDate",
+    "lastModifiedDate", "component", "version", "data", "product",
+    "vectorString", "accessVector", "accessComplexity", "authentication",
+    "confidentialityImpact", "integrityImpact", "availabilityImpact",
+    "baseScore", "severity", "exploitabilityScore", "impactScore",
+    "obtainAllPrivilege", "obtainUserPrivilege", "obtainOtherPrivilege",
+    "userInteractionRequired", "attackVector", "attackComplexity",
+    "privilegesRequired", "userInteraction", "scope", "baseSeverity",
+    "CVE", "MITRE", "4.0", "2.0", "3.0", "", "NONE", "LOW", "MEDIUM", "HIGH",
+    "CRITICAL", "NETWORK", "ADJACENT_NETWORK", "LOCAL", "PHYSICAL", "SINGLE",
+    "MULTIPLE", "PARTIAL", "COMPLETE", "REQUIRED", "UNCHANGED", "CHANGED",
+    "NVD-CWE-Other", "NVD-CWE-noinfo",
+)
+STRING_INDEX = dict((value, index) for index, value in enumerate(STRING_TABLE))
+
+_DOUBLE = struct.Struct("<d")
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode_binary(value, out):
+    if value is None:
+        out.append(0x4E)  # N
+    elif value is True:
+        out.append(0x54)  # T
+    elif value is False:
+        out.append(0x46)  # F
+    elif isinstance(value, str):
+        index = STRING_INDEX.get(value)
+        if index is not None:
+            out.append(0x4B)  # K
+            out.append(index)
+        else:
+            raw = value.encode("utf-8")
+            out.append(0x53)  # S
+            _write_varint(out, len(raw))
+            out += raw
+    elif isinstance(value, int):
+        out.append(0x49)  # I, zigzag varint
+        _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif isinstance(value, float):
+        out.append(0x44)  # D
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, dict):
+        out.append(0x4D)  # M
+        _write_varint(out, len(value))
+        for key, element in value.items():
+            _encode_binary(str(key), out)
+            _encode_binary(element, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(0x4C)  # L
+        _write_varint(out, len(value))
+        for element in value:
+            _encode_binary(element, out)
+    else:
+        raise CodecError("Can not encode value of type {}".format(type(value).__name__))
+
+
+def _decode_binary(buf, pos):
+    kind = buf[pos]
+    pos += 1
+    if kind == 0x4B:
+        return STRING_TABLE[buf[pos]], pos + 1
+    if kind == 0x53:
+        length, pos = _read_varint(buf, pos)
+        return buf[pos:pos + length].decode("utf-8"), pos + length
+    if kind == 0x4D:
+        count, pos = _read_varint(buf, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _decode_binary(buf, pos)
+            result[key], pos = _decode_binary(buf, pos)
+        return result, pos
+    if kind == 0x4C:
+        count, pos = _read_varint(buf, pos)
+        result = []
+        for _ in range(count):
+            element, pos = _decode_binary(buf, pos)
+            result.append(element)
+        return result, pos
+    if kind == 0x49:
+        zigzag, pos = _read_varint(buf, pos)
+        return (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1), pos
+    if kind == 0x44:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + _DOUBLE.size
+    if kind == 0x4E:
+        return None, pos
+    if kind == 0x54:
+        return True, pos
+    if kind == 0x46:
+        return False, pos
+    raise CodecError("Unknown binary type byte {} at {}".format(kind, pos - 1))
+
+
+class JsonCodec(object):
+    name = "json"
+    tag = TAG_JSON
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, payload):
+        return json.loads(payload.decode("utf-8"))
+
+
+class BinaryCodec(object):
+    name = "binary"
+    tag = TAG_BINARY
+
+    def dumps(self, value):
+        out = bytearray()
+        _encode_binary(value, out)
+        return bytes(out)
+
+    def loads(self, payload):
+        value, pos = _decode_binary(payload, 0)
+        return value
+
+
+class ZlibCodec(object):
+
+    def __init__(self, name, tag, inner, level=6):
+        self.name = name
+        self.tag = tag
+        self.inner = inner
+        self.level = level
+
+    def dumps(self, value):
+        return zlib.compress(self.inner.dumps(value), self.level)
+
+    def loads(self, payload):
+        return self.inner.loads(zlib.decompress(payload))
+
+
+CODECS = dict()
+CODECS_BY_TAG = dict()
+
+
+def register_codec(codec):
+    CODECS[codec.name] = codec
+    CODECS_BY_TAG[codec.tag] = codec
+
+
+register_codec(JsonCodec())
+register_codec(BinaryCodec())
+register_codec(ZlibCodec("binary_zlib", TAG_BINARY_ZLIB, BinaryCodec()))
+register_codec(ZlibCodec("json_zlib", TAG_JSON_ZLIB, JsonCodec()))
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise CodecError("Unknown codec: {}. Available: {}".format(name, ", ".join(sorted(CODECS))))
+
+
+def encode_value(value, codec_name="json"):
+    """
+    Encode value with the named codec and prepend the format tag
+    :param value: (dict, list, str, int, float, bool, None)
+    :param codec_name: (str) - One of CODECS
+    :return: (bytes)
+    """
+    codec = get_codec(codec_name)
+    return bytes((MAGIC, codec.tag)) + codec.dumps(value)
+
+
+def decode_value(value):
+    """
+    Decode a value stored by encode_value or by the pre-codec layouts
+    :param value: (bytes, str)
+    :return: decoded value, None for None
+    :raise CodecError: if the value is corrupt
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if len(value) >= 2 and value[0] == MAGIC:
+        codec = CODECS_BY_TAG.get(value[1])
+        if codec is None:
+            raise CodecError("Unknown codec tag: {}".format(value[1]))
+        # Truncated or corrupt bodies fail deep inside the codecs
+        try:
+            return codec.loads(value[2:])
+        except CodecError:
+            raise
+        except (IndexError, ValueError, struct.error, zlib.error) as ex:
+            raise CodecError("Can not decode {} value: {}".format(codec.name, ex))
+    # Untagged: legacy JSON, or legacy Python repr of the hash engine
+    try:
+        text = value.decode("utf-8")
+    except UnicodeDecodeError as ex:
+        raise CodecError("Can not decode untagged value: {}".format(ex))
+    try:
+        return json.loads(text)
+    except ValueError:
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError) as ex:
+            raise CodecError("Can not decode untagged value: {}".format(ex))
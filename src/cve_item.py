@@ -1,139 +1,252 @@
 import json
 from datetime import datetime
 
+# CVSS fields, split by the level of the NVD structure they are read from
+CVSSV2_VECTOR_FIELDS = (
+    "version",
+    "vectorString",
+    "accessVector",
+    "accessComplexity",
+    "authentication",
+    "confidentialityImpact",
+    "integrityImpact",
+    "availabilityImpact",
+    "baseScore",
+)
+CVSSV2_METRIC_FIELDS = (
+    "severity",
+    "exploitabilityScore",
+    "impactScore",
+    "obtainAllPrivilege",
+    "obtainUserPrivilege",
+    "obtainOtherPrivilege",
+    "userInteractionRequired",
+)
+CVSSV3_VECTOR_FIELDS = (
+    "version",
+    "vectorString",
+    "attackVector",
+    "attackComplexity",
+    "privilegesRequired",
+    "userInteraction",
+    "scope",
+    "confidentialityImpact",
+    "integrityImpact",
+    "availabilityImpact",
+    "baseScore",
+    "baseSeverity",
+)
+CVSSV3_METRIC_FIELDS = (
+    "exploitabilityScore",
+    "impactScore",
+)
+
+
+def decode_cvss(metric, vector_key, vector_fields, metric_fields):
+    vector = metric.get(vector_key, {})
+    result = {field: vector.get(field, "") for field in vector_fields}
+    for field in metric_fields:
+        result[field] = metric.get(field, "")
+    return result
+
+
+# Section decoders, shared by the lazy properties and to_record()
+
+def decode_vendor(cve):
+    vendor_data = []
+    for vd in cve.get("affects", {}).get("vendor", {}).get("vendor_data", []):
+        vendor_name = vd.get("vendor_name", None)
+        for pd in vd.get("product", {}).get("product_data", []):
+            product_name = pd.get("product_name", None)
+            if product_name is None or vendor_name is None:
+                continue
+            for ver in pd.get("version", {}).get("version_data", []):
+                version_value = ver.get("version_value", None)
+                if version_value is not None:
+                    vendor_data.append(dict(
+                        vendor=vendor_name,
+                        product=product_name,
+                        version=version_value
+                    ))
+    return {"data": vendor_data}
+
+
+def decode_cwe(cve):
+    cwe = []
+    for pd in cve.get("problemtype", {}).get("problemtype_data", []):
+        for d in pd.get("description", []):
+            value = d.get("value", None)
+            if value is not None:
+                cwe.append(value)
+    return {"data": cwe}
+
+
+def decode_references(cve):
+    references = []
+    for rd in cve.get("references", {}).get("reference_data", []):
+        url = rd.get("url", None)
+        if url is not None:
+            references.append(url)
+    return {"data": references}
+
+
+def decode_description(cve):
+    return "".join(dd.get("value", "") for dd in cve.get("description", {}).get("description_data", []))
+
+
 class CVEItem(object):
+    """
+    Compact view of ONE NVD item. Only the routing fields (id, cpe, dates)
+    are decoded up front; the other sections are decoded from the raw
+    structure on first access and cached.
+    """
+
+    __slots__ = (
+        "_data",
+        "_cve",
+        "id",
+        "cpe",
+        "publishedDate",
+        "lastModifiedDate",
+        "component",
+        "version",
+        "_vendor",
+        "_cwe",
+        "_references",
+        "_description",
+        "_cvssv2",
+        "_cvssv3",
+    )
 
     def __init__(self, data):
         """
         Parse JSON data structure for ONE item
         :param data: (dict) - Item to parse
         """
-        cve = data.get("cve", {})
-
-        # Get Data Type -> str
-        self.data_type = cve.get("data_type", None)
-        # Get Data Format -> str
-        self.data_format = cve.get("data_format", None)
-        # Get Data Version -> str
-        self.data_version = cve.get("data_version", None)  # Data version like 4.0
+        self._data = data
+        self._cve = cve = data.get("cve", {})
+
         # Get CVE ID like CVE-2002-2446 -> str
-        CVE_data_meta = cve.get("CVE_data_meta", {})
-        self.id = CVE_data_meta.get("ID", None)
-        # Get Vendor -> JSON with list -> {"data": vendor_data}
-        affects = cve.get("affects", {})
-        vendor = affects.get("vendor", {})
-        vendor_data = []
-        vdata = vendor.get("vendor_data", [])
-        for vd in vdata:
-            vendor_name = vd.get("vendor_name", None)  # vendor name - one value - VENDOR
-            product = vd.get("product", {})
-            product_data = product.get("product_data", [])
-            for pd in product_data:
-                product_name = pd.get("product_name", None)  # product name - list of products for VENDOR
-                version = pd.get("version", {})
-                version_data = version.get("version_data", [])
-                for vd in version_data:
-                    version_value = vd.get("version_value", None)  # version value list of versions for PRODUCT
-                    # create json set
-                    if version_value is not None and product_name is not None and vendor_name is not None:
-                        jtemplate = dict(
-                            vendor=vendor_name,
-                            product=product_name,
-                            version=version_value
-                        )
-                        vendor_data.append(jtemplate)
-                        del jtemplate
-        self.vendor = {"data": vendor_data}
-        # GET CWEs -> JSON with list -> {"data": cwe}
-        cwe = []
-        problemtype = cve.get("problemtype", {})
-        problemtype_data = problemtype.get("problemtype_data", [])
-        for pd in problemtype_data:
-            description = pd.get("description", [])
-            for d in description:
-                value = d.get("value", None)
-                if value is not None:
-                    cwe.append(value)
-        self.cwe = {"data": cwe}
-        # GET RREFERENCES -> JSON with list -> {"data": references}
-        references = []
-        ref = cve.get("references", {})
-        reference_data = ref.get("reference_data", [])
-        for rd in reference_data:
-            url = rd.get("url", None)
-            if url is not None:
-                references.append(url)
-        self.references = {"data": references}
-        # GET DESCRIPTION -> str
-        self.description = ""
-        descr = cve.get("description", {})
-        description_data = descr.get("description_data", [])
-        for dd in description_data:
-            value = dd.get("value", "")
-            self.description = self.description + value
+        self.id = cve.get("CVE_data_meta", {}).get("ID", None)
+
         # GET cpe -> JSON with list -> {"data": cpe22}
         cpe22 = []
-        conf = data.get("configurations", {})
-        nodes = conf.get("nodes", [])
-        for n in nodes:
-            cpe = n.get("cpe", [])
-            for c in cpe:
-                c22 = c.get("cpe22Uri", None)
-                cpe22.append(c22)
+        for n in data.get("configurations", {}).get("nodes", []):
+            for c in n.get("cpe", []):
+                cpe22.append(c.get("cpe22Uri", None))
         self.cpe = {"data": cpe22}
 
-        impact = data.get("impact", {})
-
-        # GET CVSSV2
-        self.cvssv2 = {}
-        baseMetricV2 = impact.get("baseMetricV2", {})
-        cvssV2 = baseMetricV2.get("cvssV2", {})
-        self.cvssv2["version"] = cvssV2.get("version", "")
-        self.cvssv2["vectorString"] = cvssV2.get("vectorString", "")
-        self.cvssv2["accessVector"] = cvssV2.get("accessVector", "")
-        self.cvssv2["accessComplexity"] = cvssV2.get("accessComplexity", "")
-        self.cvssv2["authentication"] = cvssV2.get("authentication", "")
-        self.cvssv2["confidentialityImpact"] = cvssV2.get("confidentialityImpact", "")
-        self.cvssv2["integrityImpact"] = cvssV2.get("integrityImpact", "")
-        self.cvssv2["availabilityImpact"] = cvssV2.get("availabilityImpact", "")
-        self.cvssv2["baseScore"] = cvssV2.get("baseScore", "")
-        self.cvssv2["severity"] = baseMetricV2.get("severity", "")
-        self.cvssv2["exploitabilityScore"] = baseMetricV2.get("exploitabilityScore", "")
-        self.cvssv2["impactScore"] = baseMetricV2.get("impactScore", "")
-        self.cvssv2["obtainAllPrivilege"] = baseMetricV2.get("obtainAllPrivilege", "")
-        self.cvssv2["obtainUserPrivilege"] = baseMetricV2.get("obtainUserPrivilege", "")
-        self.cvssv2["obtainOtherPrivilege"] = baseMetricV2.get("obtainOtherPrivilege", "")
-        self.cvssv2["userInteractionRequired"] = baseMetricV2.get("userInteractionRequired", "")
-
-        # GET CVSSV3
-        self.cvssv3 = {}
-        baseMetricV3 = impact.get("baseMetricV3", {})
-        cvssV3 = baseMetricV3.get("cvssV3", {})
-        self.cvssv3["version"] = cvssV3.get("version", "")
-        self.cvssv3["vectorString"] = cvssV3.get("vectorString", "")
-        self.cvssv3["attackVector"] = cvssV3.get("attackVector", "")
-        self.cvssv3["attackComplexity"] = cvssV3.get("attackComplexity", "")
-        self.cvssv3["privilegesRequired"] = cvssV3.get("privilegesRequired", "")
-        self.cvssv3["userInteraction"] = cvssV3.get("userInteraction", "")
-        self.cvssv3["scope"] = cvssV3.get("scope", "")
-        self.cvssv3["confidentialityImpact"] = cvssV3.get("confidentialityImpact", "")
-        self.cvssv3["integrityImpact"] = cvssV3.get("integrityImpact", "")
-        self.cvssv3["availabilityImpact"] = cvssV3.get("availabilityImpact", "")
-        self.cvssv3["baseScore"] = cvssV3.get("baseScore", "")
-        self.cvssv3["baseSeverity"] = cvssV3.get("baseSeverity", "")
-        self.cvssv3["exploitabilityScore"] = baseMetricV3.get("exploitabilityScore", "")
-        self.cvssv3["impactScore"] = baseMetricV3.get("impactScore", "")
-
         # GET Dates
-
-        self.publishedDate = data.get("publishedDate", datetime.utcnow())
-        self.lastModifiedDate = data.get("lastModifiedDate", datetime.utcnow())
+        self.publishedDate = data["publishedDate"] if "publishedDate" in data else datetime.utcnow()
+        self.lastModifiedDate = data["lastModifiedDate"] if "lastModifiedDate" in data else datetime.utcnow()
 
         # Additional fields
         self.component = ""
         self.version = ""
 
+        # Lazily decoded sections
+        self._vendor = None
+        self._cwe = None
+        self._references = None
+        self._description = None
+        self._cvssv2 = None
+        self._cvssv3 = None
+
+    @property
+    def data_type(self):
+        return self._cve.get("data_type", None)
+
+    @property
+    def data_format(self):
+        return self._cve.get("data_format", None)
+
+    @property
+    def data_version(self):
+        # Data version like 4.0
+        return self._cve.get("data_version", None)
+
+    @property
+    def vendor(self):
+        # Get Vendor -> JSON with list -> {"data": vendor_data}
+        if self._vendor is None:
+            self._vendor = decode_vendor(self._cve)
+        return self._vendor
+
+    @property
+    def cwe(self):
+        # GET CWEs -> JSON with list -> {"data": cwe}
+        if self._cwe is None:
+            self._cwe = decode_cwe(self._cve)
+        return self._cwe
+
+    @property
+    def references(self):
+        # GET RREFERENCES -> JSON with list -> {"data": references}
+        if self._references is None:
+            self._references = decode_references(self._cve)
+        return self._references
+
+    @property
+    def description(self):
+        # GET DESCRIPTION -> str
+        if self._description is None:
+            self._description = decode_description(self._cve)
+        return self._description
+
+    @property
+    def cvssv2(self):
+        if self._cvssv2 is None:
+            self._cvssv2 = decode_cvss(
+                self._data.get("impact", {}).get("baseMetricV2", {}),
+                "cvssV2",
+                CVSSV2_VECTOR_FIELDS,
+                CVSSV2_METRIC_FIELDS
+            )
+        return self._cvssv2
+
+    @property
+    def cvssv3(self):
+        if self._cvssv3 is None:
+            self._cvssv3 = decode_cvss(
+                self._data.get("impact", {}).get("baseMetricV3", {}),
+                "cvssV3",
+                CVSSV3_VECTOR_FIELDS,
+                CVSSV3_METRIC_FIELDS
+            )
+        return self._cvssv3
+
+    def to_record(self):
+        """
+        Ready-to-index structure, equal to json.loads(self.to_json())
+        but without the serialize/deserialize round trip. Sections are
+        decoded straight into the record; only those already accessed are
+        taken from the cache, the item itself stays lazy
+        :return: (dict)
+        """
+        cve = self._cve
+        impact = self._data.get("impact", {})
+        published = self.publishedDate
+        last_modified = self.lastModifiedDate
+        return {
+            "data_type": cve.get("data_type", None),
+            "data_format": cve.get("data_format", None),
+            "data_version": cve.get("data_version", None),
+            "id": self.id,
+            "vendor": self._vendor if self._vendor is not None else decode_vendor(cve),
+            "cwe": self._cwe if self._cwe is not None else decode_cwe(cve),
+            "references": self._references if self._references is not None else decode_references(cve),
+            "description": self._description if self._description is not None else decode_description(cve),
+            "cpe": self.cpe,
+            "cvssv2": self._cvssv2 if self._cvssv2 is not None else decode_cvss(
+                impact.get("baseMetricV2", {}), "cvssV2", CVSSV2_VECTOR_FIELDS, CVSSV2_METRIC_FIELDS),
+            "cvssv3": self._cvssv3 if self._cvssv3 is not None else decode_cvss(
+                impact.get("baseMetricV3", {}), "cvssV3", CVSSV3_VECTOR_FIELDS, CVSSV3_METRIC_FIELDS),
+            "publishedDate": published.isoformat() if isinstance(published, datetime) else published,
+            "lastModifiedDate": last_modified.isoformat() if isinstance(last_modified, datetime) else last_modified,
+            "component": self.component,
+            "version": self.version,
+        }
+
     def to_json(self):
-        return json.dumps(self,
-                          default=lambda o: o.__dict__,
-                          sort_keys=True)
\ No newline at end of file
+        return json.dumps(self.to_record(),
+                          sort_keys=True)
@@ -0,0 +1,156 @@
+from text_index import tokenize, match_clause
+from columnar_store import ColumnarCVEStore
+
+
+class SearchEngineBase(object):
+    """
+    Methods every storage engine provides. updater.create_search_engine
+    picks the engine named by SETTINGS["engine"].
+
+    find_* methods return lists of CVE records with "component" and
+    "version" filled in; queries over several versions also set
+    "matched_versions". action_* methods return a result dict with count,
+    time_delta and message.
+
+    Components are "vendor:product"; a bare product name is resolved to
+    all of its vendors and their results are merged.
+    """
+
+    def resolve_components(self, component):
+        """
+        :return: (list) - Index components the queried name stands for
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def merge_component_results(lists_of_components):
+        # Each CVE once, under the first vendor it was found for
+        merged = dict()
+        for list_of_components in lists_of_components:
+            for one_component in list_of_components:
+                merged.setdefault(one_component["id"], one_component)
+        return [merged[cve_id] for cve_id in sorted(merged)]
+
+    @staticmethod
+    def merge_component_versions(lists_of_versions, key=None):
+        """
+        :param key: (function) - Sort key of versions, lexicographic order if None
+        """
+        versions = set(version for versions in lists_of_versions for version in versions)
+        if key is None:
+            return sorted(versions)
+        return sorted(versions, key=lambda version: (key(version), version))
+
+    def get_cve_records_by_ids(self, cve_ids):
+        """
+        :return: (list) - Decoded CVE records in the order of cve_ids, missing ones left out
+        """
+        raise NotImplementedError
+
+    def get_all_cve_ids(self):
+        """
+        :return: (list) - Sorted IDs of every CVE in the live index
+        """
+        raise NotImplementedError
+
+    def create_columnar_store(self, chunk_size=1000):
+        """
+        Load every CVE of the live index into a ColumnarCVEStore (needs
+        numpy), with products named as in the index
+        :return: (ColumnarCVEStore)
+        """
+        store = ColumnarCVEStore(self.component_names)
+        cve_ids = self.get_all_cve_ids()
+        for start in range(0, len(cve_ids), chunk_size):
+            for one_cve in self.get_cve_records_by_ids(cve_ids[start:start + chunk_size]):
+                store.add_record(one_cve)
+        return store
+
+    def filter_text_candidates(self, matched, candidates, limit=None, chunk_size=1000):
+        """
+        Last step of search_descriptions
+        :param matched: (set) - IDs a clause of indexed words matched
+        :param candidates: (dict) - ID -> clauses to check on the description text
+        :return: (list) - Matching CVE records sorted by ID, at most limit
+        """
+        cve_ids = sorted(matched.union(candidates))
+        if len(candidates) == 0:
+            # No text to check: read only the records that are returned
+            cve_ids = cve_ids[:limit]
+        list_of_cves = []
+        for start in range(0, len(cve_ids), chunk_size):
+            for one_cve in self.get_cve_records_by_ids(cve_ids[start:start + chunk_size]):
+                if one_cve["id"] not in matched:
+                    tokens = tokenize(one_cve.get("description"))
+                    if not any(match_clause(tokens, clause) for clause in candidates[one_cve["id"]]):
+                        continue
+                list_of_cves.append(one_cve)
+                if limit is not None and len(list_of_cves) >= limit:
+                    return list_of_cves
+        return list_of_cves
+
+    @staticmethod
+    def add_failed_feeds(result, failed):
+        """
+        Report feeds that could not be downloaded or parsed in the result of
+        an action_* method. They are not marked as indexed, so the next run
+        tries them again
+        :param failed: (list) - (label, error) pairs, label is a year, modified or recent
+        """
+        result["failed"] = [label for label, error in failed]
+        if len(failed) > 0:
+            result["message"] = result["message"].rstrip(".") + ". Failed feeds: {}".format(
+                ", ".join("{} ({})".format(label, error) for label, error in failed))
+        return result
+
+    def find_by_component_and_version(self, component, version):
+        """
+        :param version: (str) - Exact version or fnmatch pattern, None for all
+        """
+        raise NotImplementedError
+
+    def find_versions_by_pattern(self, component, pattern=None):
+        raise NotImplementedError
+
+    def find_versions_by_range(self, component, lo=None, hi=None, inclusive=True):
+        raise NotImplementedError
+
+    def find_by_component_and_version_range(self, component, lo=None, hi=None, inclusive=True):
+        raise NotImplementedError
+
+    def find_by_component_and_versions(self, component, versions):
+        raise NotImplementedError
+
+    def find_many(self, queries):
+        """
+        :param queries: (list) - (component, version) pairs
+        :return: (dict) - results: {(component, version): list of CVEs}, stats
+        """
+        raise NotImplementedError
+
+    def search_descriptions(self, query, limit=None):
+        """
+        :param query: (str) - Keywords, "quoted phrases" and OR
+        :return: (list) - Matching CVE records sorted by ID
+        """
+        raise NotImplementedError
+
+    def find_ids_by_attributes(self, cwe=None, cvssv2_severity=None, cvssv3_severity=None,
+                               published_after=None, published_before=None,
+                               modified_after=None, modified_before=None):
+        """
+        :return: (list) - Sorted IDs of the CVEs that meet every given criterion
+        """
+        raise NotImplementedError
+
+    def find_by_attributes(self, **criteria):
+        raise NotImplementedError
+
+    def action_populate_cve(self):
+        raise NotImplementedError
+
+    def action_update_cve_modified(self):
+        raise NotImplementedError
+
+    def action_update_cve_recent(self):
+        raise NotImplementedError
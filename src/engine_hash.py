@@ -1,218 +1,130 @@
-import re
 import time
-import json
-import redis
-import urllib
-import string
 
-import cpe as cpe_module
+from engine_redis import SearchEngineRedis
+from cve_codec import decode_value, CodecError
 
-from utils import *
 
-class SearchEngineHashes(object):
+class SearchEngineHashes(SearchEngineRedis):
+    """
+    indexer::<component>::<version> keys are hashes: one field per CVE ID
+    with its lastModifiedDate
+    """
 
-    def __init__(self, SETTINGS):
-        self.SETTINGS = SETTINGS
-        self.cache_for_indexer = redis.StrictRedis(
-            host=SETTINGS["cache_for_indexer"]["host"],
-            port=SETTINGS["cache_for_indexer"]["port"],
-            db=SETTINGS["cache_for_indexer"]["db"]
+    def check_if_item_already_in_index_by_component_and_version(self, item_to_check):
+        collection_name = self.create_collection_name_by_component_and_version(
+            component=item_to_check["component"],
+            version=item_to_check["version"]
         )
+        result = self.cache_for_indexer.hlen(collection_name)
+        if result == 0:
+            return False
+        return True
 
     def get_all_cache_elements_as_list_of_jsons(self, collection_name, clear_it=True):
         try:
-            list_of_elements = eval(
+            list_of_elements = decode_value(
                 self.cache_for_indexer.hget(
                     collection_name,
                     "data"
                 ))
-        except:
+        except CodecError:
+            return []
+        if list_of_elements is None:
             return []
         if clear_it:
             self.cache_for_indexer.delete(collection_name)
         return list_of_elements
 
-    def save_list_of_elements_into_cache(self, collection_name, list_to_save=[], clear_it_before=True):
-        if clear_it_before:
-            self.cache_for_indexer.delete(
-                collection_name
-            )
-        self.cache_for_indexer.hset(
-            collection_name,
-            "data",
-            list_to_save
-        )
-
-    def create_collection_name_by_component_and_version(self, component, version=None):
-        if version is None:
-            version = "*"
-        collection_name = "".join([
-            self.SETTINGS["collection_for_index"],
-            component,
-            "::",
-            version
-        ])
-        return collection_name
-
-    def verify_if_component_and_version_is_valid(self, item_to_verify, only_digits__and_dot_in_version=False):
-        if item_to_verify["version"] is not None:
-            if item_to_verify["version"] == "":
-                return None
-            try:
-                item_to_verify["version"] = urllib.parse.unquote(item_to_verify["version"])
-            except:
-                pass
-            try:
-                item_to_verify["component"] = urllib.parse.unquote(item_to_verify["component"])
-            except:
-                pass
-            if only_digits__and_dot_in_version:
-                allow = string.digits + '.' + '(' + ')'
-                item_to_verify["version"] = re.sub('[^%s]' % allow, '', item_to_verify["version"])
-            return item_to_verify
-        return None
-
-    @staticmethod
-    def extract_component_and_version_from_cpe_string(cpe_string):
-        result = None
-        try:
-            cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_2_2)
-        except:
-            try:
-                cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_2_3)
-            except:
-                try:
-                    cpep = cpe_module.CPE(cpe_string, cpe_module.CPE.VERSION_UNDEFINED)
-                except:
-                    cpep = None
-        if cpep is not None:
-            c22_product = cpep.get_product() if cpep is not None else []
-            c22_version = cpep.get_version() if cpep is not None else []
-            result = dict()
-            result["component"] = c22_product[0] if isinstance(c22_product, list) and len(c22_product) > 0 else None
-            result["version"] = c22_version[0] if isinstance(c22_version, list) and len(c22_version) > 0 else None
-        if result["component"] is None or result["version"] is None:
-            result = None
-        if result["component"] == "" or result["version"] == "":
-            result = None
-        return result
-
-    def append_item_in_index(self, item_to_update):
+    def get_ids_from_index(self, collection_name):
+        # One hash field per CVE ID; "data" is the field of the legacy layout
+        return sorted(
+            field.decode("utf-8") for field in self.cache_for_indexer.hkeys(collection_name)
+            if field != b"data")
+
+    def get_ids_from_indexes(self, collection_names):
+        # All collections in one round trip
+        pipe = self.cache_for_indexer.pipeline(transaction=False)
+        for collection_name in collection_names:
+            pipe.hkeys(collection_name)
+        return [
+            sorted(field.decode("utf-8") for field in fields if field != b"data")
+            for fields in pipe.execute()]
+
+    def append_item_in_index(self, item_to_update, cache=None):
         collection_name = self.create_collection_name_by_component_and_version(
             component=item_to_update["component"],
             version=item_to_update["version"]
         )
-
-        items_in_cache = self.get_all_cache_elements_as_list_of_jsons(collection_name, clear_it=True)
-
-        items_to_save = []
-
-        if len(items_in_cache) == 0:
-            items_to_save.append(
-                item_to_update
-            )
-        else:
-            for one_item in items_in_cache:
-                element = one_item.copy()
-                if element["id"] == item_to_update["id"]:
-                    element.update(item_to_update)
-                items_to_save.append(
-                    element
-                )
-                del element
-
-        self.save_list_of_elements_into_cache(collection_name, items_to_save)
-
-    def update_items_in_cache_index(self, items_to_update):
-        count = 0
-
-        if isinstance(items_to_update, list):
-            for one_item in items_to_update:
-
-                one_item_in_json = json.loads(one_item)
-
-                cpe_strings = one_item_in_json["cpe"]["data"]
-
-                for one_cpe_string in cpe_strings:
-                    component_and_version = self.extract_component_and_version_from_cpe_string(one_cpe_string)
-                    if component_and_version is not None:
-                        result_of_verify = self.verify_if_component_and_version_is_valid(component_and_version)
-                        if result_of_verify is not None:
-                            one_item_in_json["component"] = result_of_verify["component"]
-                            one_item_in_json["version"] = result_of_verify["version"]
-                            self.append_item_in_index(one_item_in_json)
-
-                    count += 1
-                pass
-            pass
-
-        return count
-
-    def find_by_component_and_version(self, component, version):
-        collection = self.create_collection_name_by_component_and_version(component=component, version=version)
-        list_of_components = self.get_all_cache_elements_as_list_of_jsons(collection, clear_it=False)
-        return list_of_components
-
-    pass
-
-    pass
-
-    pass
-
-    def action_update_cve_modified(self):
-        result = dict(
-            count=0,
-            time_delta=0,
-            message=""
+        # Single HSET per mapping: constant cost and the key is never
+        # deleted, so readers always see a complete collection
+        if cache is None:
+            cache = self.cache_for_indexer
+        cache.hset(
+            collection_name,
+            item_to_update["id"],
+            item_to_update["lastModifiedDate"]
         )
-
-        start_time = time.time()
-
-        modified_items, response = download_cve_file(self.SETTINGS["sources"]["cve_modified"])
-        modified_parsed = parse_cve_file(modified_items)
-
-        count = self.update_items_in_cache_index(modified_parsed)
-        time_delta = time.time() - start_time
-
-        result["count"] = count
-        result["time_delta"] = time_delta
-        result["message"] = "Complete process {} modified items at {} sec.".format(
-            count,
-            time_delta
+        # Known versions of the component for wildcard queries
+        cache.zadd(
+            self.create_versions_collection_name(item_to_update["component"]),
+            0,
+            item_to_update["version"]
         )
-        return result
-
-    def action_update_cve_recent(self):
-        result = dict(
-            count=0,
-            time_delta=0,
-            message=""
+        # Known versions in semantic order for range queries
+        cache.zadd(
+            self.create_version_order_collection_name(item_to_update["component"]),
+            0,
+            self.create_version_order_member(item_to_update["version"], item_to_update.get("version_key"))
         )
+        self.append_component_in_products(item_to_update["component"], cache=cache)
 
-        start_time = time.time()
-
-        recent_items, response = download_cve_file(self.SETTINGS["sources"]["cve_recent"])
-        recent_parsed = parse_cve_file(recent_items)
-
-        count = self.update_items_in_cache_index(recent_parsed)
-        time_delta = time.time() - start_time
-
-        result["count"] = count
-        result["time_delta"] = time_delta
-        result["message"] = "Complete process {} recent items at {} sec.".format(
-            count,
-            time_delta
+    @staticmethod
+    def queue_index_size(pipe, collection_name):
+        pipe.hlen(collection_name)
+
+    def remove_item_from_index(self, item_to_remove, cache=None):
+        # Counterpart of append_item_in_index for a mapping a changed CVE
+        # lost; the version stays in versions:: until its key is empty
+        if cache is None:
+            cache = self.cache_for_indexer
+        cache.hdel(
+            self.create_collection_name_by_component_and_version(
+                component=item_to_remove["component"],
+                version=item_to_remove["version"]
+            ),
+            item_to_remove["id"]
         )
-        return result
-
-    def cve_loop(self, parsed_item):
-        count = 0
-
-        count = self.update_items_in_cache_index(parsed_item)
 
-        return count
-
-    def action_populate_cve(self):
+    def append_ids_in_index(self, component, version, ids_and_dates, cache=None):
+        """
+        Bulk counterpart of append_item_in_index: all CVEs of one index key
+        :param ids_and_dates: (list) - (CVE ID, lastModifiedDate) pairs
+        """
+        if len(ids_and_dates) == 0:
+            return
+        if cache is None:
+            cache = self.cache_for_indexer
+        collection_name = self.create_collection_name_by_component_and_version(
+            component=component,
+            version=version
+        )
+        cache.hmset(
+            collection_name,
+            dict(ids_and_dates)
+        )
+        cache.zadd(self.create_versions_collection_name(component), 0, version)
+        cache.zadd(
+            self.create_version_order_collection_name(component),
+            0,
+            self.create_version_order_member(version))
+        self.append_component_in_products(component, cache=cache)
+
+    def migrate_legacy_index(self):
+        """
+        Convert index keys of the legacy layout (a "data" field with a list
+        of CVE bodies or IDs) into one cve::<ID> record per CVE plus one
+        hash field per CVE ID
+        """
         result = dict(
             count=0,
             time_delta=0,
@@ -221,22 +133,42 @@ class SearchEngineHashes(object):
         count = 0
         start_time = time.time()
 
-        current_year = datetime.now().year
-        for year in range(self.SETTINGS["start_year"], current_year + 1):
-            source = self.SETTINGS["sources"]["cve_base"] + str(year) + self.SETTINGS["sources"]["cve_base_postfix"]
-            cve_item, response = download_cve_file(source)
-            parsed_cve_item = parse_cve_file(cve_item)
-
-            count += self.cve_loop(parsed_cve_item)
-
-            print("Populate CVE-{} takes {} sec.".format(year, time.time() - start_time))
-
+        # Collect key names first: rewriting keys while SCAN is running may
+        # return them twice
+        collection_names = list(self.cache_for_indexer.scan_iter(
+            match=self.namespace + self.SETTINGS["collection_for_index"] + "*"))
+        for collection_name in collection_names:
+            if self.cache_for_indexer.type(collection_name) != b"hash":
+                continue
+            if not self.cache_for_indexer.hexists(collection_name, "data"):
+                continue
+            elements = self.get_all_cache_elements_as_list_of_jsons(collection_name, clear_it=False)
+            fields = {}
+            for element in elements:
+                if isinstance(element, dict):
+                    self.save_cve_record(element)
+                    fields[element["id"]] = element.get("lastModifiedDate", "")
+                else:
+                    fields[element] = ""
+            pipe = self.cache_for_indexer.pipeline(transaction=True)
+            pipe.hdel(collection_name, "data")
+            if len(fields) > 0:
+                pipe.hmset(collection_name, fields)
+            component, version = self.split_collection_name(collection_name)
+            pipe.zadd(self.create_versions_collection_name(component), 0, version)
+            pipe.zadd(self.create_version_order_collection_name(component), 0,
+                      self.create_version_order_member(version))
+            pipe.execute()
+            count += 1
+
+        if count > 0:
+            self.commit_index_update()
         time_delta = time.time() - start_time
 
         result["count"] = count
         result["time_delta"] = time_delta
-        result["message"] = "Complete process {} populated items at {} sec.".format(
+        result["message"] = "Complete migrate {} index keys at {} sec.".format(
             count,
             time_delta
         )
-        return result
\ No newline at end of file
+        return result
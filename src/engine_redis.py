@@ -0,0 +1,1601 @@
+import re
+import time
+import uuid
+import threading
+import fnmatch
+import multiprocessing
+import json
+import redis
+
+from utils import *
+from engine_base import SearchEngineBase
+from batch_writer import RedisBatchWriter
+from cve_codec import decode_value, get_codec, CodecError
+from version_key import version_sort_key
+from cpe_parser import extract_component_and_version, configure_cpe_cache, cpe_cache_stats, merge_cpe_cache_stats
+from index_mutations import verify_component_and_version, encode_cve_body, make_index_mutation, \
+    prepare_feed_mutations, make_cve_state, classify_change, empty_changes, ComponentNames, split_component, \
+    extract_attributes, extract_index_mappings, to_timestamp, LEGACY_INDEX_LAYOUT
+from feed_pipeline import FeedPipeline
+from feed_cache import FeedCache
+from query_cache import QueryCache
+from snapshot import write_snapshot, SnapshotReader
+from text_index import description_terms, parse_text_query, clause_terms, needs_text_check
+from metrics import INGEST_METRICS, with_ingest_metrics
+from concurrent.futures import ThreadPoolExecutor
+
+WILDCARD_CHARS = re.compile(r"[*?\[]")
+
+# Separates the sort key from the raw version in version_order:: members
+VERSION_ORDER_SEPARATOR = b"\x00"
+
+class SearchEngineRedis(SearchEngineBase):
+    """
+    Everything the Redis engines share: namespaces, CVE records, mutations,
+    products, text and attribute indexes, query cache, snapshots and the
+    action_* methods. Subclasses only choose the Redis type of the
+    indexer::<component>::<version> keys and implement the methods that
+    read or write them.
+    """
+
+    def __init__(self, SETTINGS):
+        self.SETTINGS = SETTINGS
+        self.cache_for_indexer = redis.StrictRedis(
+            host=SETTINGS["cache_for_indexer"]["host"],
+            port=SETTINGS["cache_for_indexer"]["port"],
+            db=SETTINGS["cache_for_indexer"]["db"]
+        )
+        self.codec_name = get_codec(SETTINGS.get("codec", "json")).name
+        self.component_names = ComponentNames.from_settings(SETTINGS)
+        if "cpe_cache_size" in SETTINGS:
+            configure_cpe_cache(SETTINGS["cpe_cache_size"])
+        self.feed_cache = None
+        if SETTINGS.get("feed_cache_dir"):
+            self.feed_cache = FeedCache(SETTINGS["feed_cache_dir"])
+        # Prefix of every key of the index; "" is the original namespace.
+        # After a shadow rebuild the live prefix is read from a pointer key
+        self.namespace = ""
+        self.building_shadow = False
+        self.query_cache = None
+        if SETTINGS.get("query_cache_size", 0) > 0:
+            self.query_cache = QueryCache(
+                maxsize=SETTINGS["query_cache_size"],
+                ttl=SETTINGS.get("query_cache_ttl", 300))
+
+    @staticmethod
+    def deserialize(element):
+        try:
+            return decode_value(element)
+        except CodecError:
+            return None
+
+    def check_if_item_already_in_index_by_component_and_version(self, item_to_check):
+        raise NotImplementedError
+
+    def get_all_cache_elements_as_list_of_jsons(self, collection_name, clear_it=True):
+        """
+        :return: (list) - Elements of an index key in the legacy layout
+        """
+        raise NotImplementedError
+
+    def get_ids_from_index(self, collection_name):
+        """
+        :return: (list) - Sorted CVE IDs of one index key
+        """
+        raise NotImplementedError
+
+    def get_ids_from_indexes(self, collection_names):
+        """
+        :return: (list) - Sorted CVE IDs of every index key, in one round trip
+        """
+        raise NotImplementedError
+
+    def append_item_in_index(self, item_to_update, cache=None):
+        raise NotImplementedError
+
+    @staticmethod
+    def queue_index_size(pipe, collection_name):
+        """
+        Queue the command that counts the CVE IDs of an index key
+        """
+        raise NotImplementedError
+
+    def remove_item_from_index(self, item_to_remove, cache=None):
+        """
+        :param item_to_remove: (dict) - id, component and version
+        """
+        raise NotImplementedError
+
+    def append_ids_in_index(self, component, version, ids_and_dates, cache=None):
+        raise NotImplementedError
+
+    def migrate_legacy_index(self):
+        raise NotImplementedError
+
+    def create_collection_name_by_component_and_version(self, component, version=None):
+        if version is None:
+            version = "*"
+        collection_name = "".join([
+            self.namespace,
+            self.SETTINGS["collection_for_index"],
+            component,
+            "::",
+            version
+        ])
+        return collection_name
+
+    def create_batch_writer(self):
+        return RedisBatchWriter(
+            self.cache_for_indexer,
+            batch_size=self.SETTINGS.get("batch_size", 1000),
+            transaction=self.SETTINGS.get("batch_transaction", False)
+        )
+
+    def create_versions_collection_name(self, component):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_versions", "versions::"),
+            component
+        ])
+
+    def create_version_order_collection_name(self, component):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_version_order", "version_order::"),
+            component
+        ])
+
+    def create_products_collection_name(self, product):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_products", "products::"),
+            product
+        ])
+
+    def append_component_in_products(self, component, cache=None):
+        # Vendors of the product, for queries by the bare product name
+        vendor, product = split_component(component)
+        if vendor is None:
+            return
+        if cache is None:
+            cache = self.cache_for_indexer
+        cache.sadd(self.create_products_collection_name(product), component)
+
+    def resolve_components(self, component):
+        return self.resolve_many_components([component])[0][component]
+
+    def resolve_many_components(self, components):
+        """
+        Index components of queried names: a "vendor:product" name is one
+        component after aliases, a bare product stands for all of its
+        vendors. One round trip for all bare products
+        :param components: (iterable) - Queried component names
+        :return: (tuple) - ({name: list of components}, number of round trips)
+        """
+        canonical = dict((component, self.component_names.canonical(component)) for component in components)
+        bare = sorted(set(name for name in canonical.values() if self.component_names.is_bare(name)))
+        vendors = dict()
+        round_trips = 0
+        if len(bare) > 0:
+            pipe = self.cache_for_indexer.pipeline(transaction=False)
+            for product in bare:
+                pipe.smembers(self.create_products_collection_name(product))
+            for product, members in zip(bare, pipe.execute()):
+                vendors[product] = sorted(member.decode("utf-8") for member in members)
+            round_trips += 1
+        # Unknown products and keys of an unqualified index keep the name
+        return dict(
+            (component, vendors.get(name) or [name])
+            for component, name in canonical.items()), round_trips
+
+    @staticmethod
+    def create_version_order_member(version, version_key=None):
+        if version_key is None:
+            version_key = version_sort_key(version)
+        return version_key.encode("utf-8") + VERSION_ORDER_SEPARATOR + version.encode("utf-8")
+
+    def split_collection_name(self, collection_name):
+        # indexer::<component>::<version> -> (component, version)
+        if isinstance(collection_name, bytes):
+            collection_name = collection_name.decode("utf-8")
+        name = collection_name[len(self.namespace) + len(self.SETTINGS["collection_for_index"]):]
+        component, _, version = name.partition("::")
+        return component, version
+
+    def create_cve_record_name(self, cve_id):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_cve", "cve::"),
+            cve_id
+        ])
+
+    def save_cve_record(self, item_to_save, cache=None):
+        self.save_encoded_cve_record(
+            item_to_save["id"],
+            encode_cve_body(item_to_save, self.codec_name),
+            cache=cache)
+
+    def save_encoded_cve_record(self, cve_id, body, cache=None):
+        if cache is None:
+            cache = self.cache_for_indexer
+        cache.set(
+            self.create_cve_record_name(cve_id),
+            body)
+
+    def get_cve_records_by_ids(self, cve_ids):
+        if len(cve_ids) == 0:
+            return []
+        bodies = self.cache_for_indexer.mget(
+            [self.create_cve_record_name(cve_id) for cve_id in cve_ids])
+        records = []
+        for body in bodies:
+            record = self.deserialize(body)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def get_all_cve_ids(self):
+        self.refresh_index_namespace()
+        prefix = self.create_cve_record_name("")
+        return sorted(
+            key.decode("utf-8")[len(prefix):]
+            for key in self.cache_for_indexer.scan_iter(match=prefix + "*", count=1000))
+
+    def verify_if_component_and_version_is_valid(self, item_to_verify, only_digits__and_dot_in_version=False):
+        return verify_component_and_version(item_to_verify, only_digits__and_dot_in_version)
+
+    @staticmethod
+    def extract_component_and_version_from_cpe_string(cpe_string):
+        # Memoized fast-path parser, the cpe library is only used for
+        # names the fast path does not understand
+        return extract_component_and_version(cpe_string)
+
+    def create_text_collection_name(self, term):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_text", "text::"),
+            term
+        ])
+
+    def append_terms_in_text_index(self, cve_id, terms, cache=None):
+        # Terms a changed description lost are removed by
+        # remove_stale_index_entries, so posting lists are exact
+        if cache is None:
+            cache = self.cache_for_indexer
+        for term in terms:
+            cache.sadd(self.create_text_collection_name(term), cve_id)
+
+    def create_attribute_collection_name(self, field, value):
+        # cwe::<CWE ID>, severity::<cvssv2 or cvssv3>::<severity>
+        if field == "cwe":
+            return "".join([self.namespace, self.SETTINGS.get("collection_for_cwe", "cwe::"), value])
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_severity", "severity::"),
+            field,
+            "::",
+            value
+        ])
+
+    def create_date_collection_name(self, field):
+        # field: published or modified
+        return self.namespace + self.SETTINGS.get("collection_for_" + field, field + "_dates")
+
+    def append_attributes_in_index(self, cve_id, attributes, cache=None):
+        """
+        :param attributes: (tuple) - extract_attributes() of the CVE
+        """
+        if cache is None:
+            cache = self.cache_for_indexer
+        tags, published, modified = attributes
+        for field, value in tags:
+            cache.sadd(self.create_attribute_collection_name(field, value), cve_id)
+        for field, timestamp in (("published", published), ("modified", modified)):
+            # NaN for a missing date
+            if timestamp == timestamp:
+                cache.zadd(self.create_date_collection_name(field), timestamp, cve_id)
+
+    def remove_stale_index_entries(self, mutations, cache=None):
+        """
+        Take changed CVEs out of the index keys, CWE and severity sets and
+        text posting lists they no longer belong to. The indexed versions
+        are read with one MGET per batch and their mappings, attributes and
+        terms diffed against the new ones. Date scores are simply overwritten
+        """
+        if len(mutations) == 0:
+            return
+        if cache is None:
+            cache = self.cache_for_indexer
+        else:
+            # Earlier chunks of the batch may still sit in the writer
+            cache.flush()
+        secondary_indexes = self.SETTINGS.get("secondary_indexes", True)
+        text_index = self.SETTINGS.get("text_index", True)
+        records, round_trips = self.get_cve_records_map([mutation[0] for mutation in mutations])
+        # (component, version) -> (version_key, IDs taken out of the key)
+        removed = dict()
+        for mutation in mutations:
+            cve_id, mappings, terms, attributes = mutation[0], mutation[3], mutation[4], mutation[5]
+            if cve_id not in records:
+                continue
+            indexed_mappings, cpe_count = extract_index_mappings(records[cve_id], self.component_names)
+            kept = set((component, version) for component, version, version_key in mappings)
+            for component, version, version_key in indexed_mappings:
+                if (component, version) in kept:
+                    continue
+                self.remove_item_from_index(dict(id=cve_id, component=component, version=version), cache=cache)
+                removed.setdefault((component, version), (version_key, set()))[1].add(cve_id)
+            if secondary_indexes:
+                for field, value in set(extract_attributes(records[cve_id])[0]) - set(attributes[0]):
+                    cache.srem(self.create_attribute_collection_name(field, value), cve_id)
+            if text_index:
+                for term in set(description_terms(records[cve_id].get("description"))) - set(terms):
+                    cache.srem(self.create_text_collection_name(term), cve_id)
+        self.remove_empty_versions(removed, cache=cache)
+
+    def remove_empty_versions(self, removed, cache=None):
+        """
+        Drop versions whose index key the queued removals empty from the
+        versions:: and version_order:: sorted sets, and components left
+        without versions from products::. Key sizes are read in one round
+        trip; mappings of the same batch that add to a key again are queued
+        after these commands and add the version back
+        :param removed: (dict) - (component, version) -> (version_key, set of removed CVE IDs)
+        """
+        if len(removed) == 0:
+            return
+        if cache is None:
+            cache = self.cache_for_indexer
+        keys = sorted(removed)
+        components = sorted(set(component for component, version in keys))
+        pipe = self.cache_for_indexer.pipeline(transaction=False)
+        for component, version in keys:
+            self.queue_index_size(pipe, self.create_collection_name_by_component_and_version(component, version))
+        for component in components:
+            pipe.zcard(self.create_versions_collection_name(component))
+        sizes = pipe.execute()
+        emptied = dict((component, 0) for component in components)
+        for (component, version), size in zip(keys, sizes):
+            version_key, cve_ids = removed[(component, version)]
+            if size > len(cve_ids):
+                continue
+            cache.zrem(self.create_versions_collection_name(component), version)
+            cache.zrem(
+                self.create_version_order_collection_name(component),
+                self.create_version_order_member(version, version_key))
+            emptied[component] += 1
+        for component, versions_count in zip(components, sizes[len(keys):]):
+            vendor, product = split_component(component)
+            if vendor is not None and 0 < versions_count <= emptied[component]:
+                cache.srem(self.create_products_collection_name(product), component)
+
+    def create_cve_state_collection_name(self):
+        return self.namespace + self.SETTINGS.get("collection_for_cve_state", "cve_state")
+
+    def apply_index_mutation(self, mutation, cache=None, state=None):
+        cve_id, last_modified, body, mappings, terms, attributes = mutation
+        if cache is None:
+            cache = self.cache_for_indexer
+        self.save_encoded_cve_record(cve_id, body, cache=cache)
+        if state is None:
+            state = make_cve_state(last_modified, body)
+        cache.hset(self.create_cve_state_collection_name(), cve_id, state)
+        if self.SETTINGS.get("text_index", True):
+            self.append_terms_in_text_index(cve_id, terms, cache=cache)
+        if self.SETTINGS.get("secondary_indexes", True):
+            self.append_attributes_in_index(cve_id, attributes, cache=cache)
+        for component, version, version_key in mappings:
+            self.append_item_in_index(
+                dict(
+                    id=cve_id,
+                    component=component,
+                    version=version,
+                    version_key=version_key,
+                    lastModifiedDate=last_modified
+                ),
+                cache=cache)
+
+    def apply_changed_index_mutations(self, mutations, cache=None, changes=None):
+        """
+        Apply only the mutations of CVEs that are new or changed since they
+        were indexed; the stored states are read with a single HMGET
+        :param mutations: (list) - Results of make_index_mutation
+        :param changes: (dict) - Counters new, changed, unchanged and skipped to add to
+        :return: (int) - Number of applied mutations
+        """
+        if changes is None:
+            changes = empty_changes()
+        if len(mutations) == 0:
+            return 0
+        if not self.SETTINGS.get("change_detection", True):
+            self.remove_stale_index_entries(mutations, cache=cache)
+            for mutation in mutations:
+                self.apply_index_mutation(mutation, cache=cache)
+            changes["changed"] += len(mutations)
+            return len(mutations)
+        stored_states = self.cache_for_indexer.hmget(
+            self.create_cve_state_collection_name(),
+            [mutation[0] for mutation in mutations])
+        pending = []
+        for mutation, stored_state in zip(mutations, stored_states):
+            state = make_cve_state(mutation[1], mutation[2])
+            kind = classify_change(stored_state, state)
+            changes[kind] += 1
+            if kind in ("new", "changed"):
+                pending.append((mutation, state, kind))
+        # Before the new bodies replace the indexed ones
+        self.remove_stale_index_entries(
+            [mutation for mutation, state, kind in pending if kind == "changed"], cache=cache)
+        for mutation, state, kind in pending:
+            self.apply_index_mutation(mutation, cache=cache, state=state)
+        return len(pending)
+
+    def update_items_in_cache_index(self, items_to_update, writer=None, changes=None):
+        count = 0
+
+        # Writes go through a pipelined batch writer; a writer passed by the
+        # caller is flushed and committed by the caller
+        own_writer = writer is None
+        if own_writer:
+            writer = self.create_batch_writer()
+            if changes is None:
+                changes = empty_changes()
+
+        # Mutations are classified in chunks, one state lookup per chunk
+        chunk_size = self.SETTINGS.get("batch_size", 1000)
+        mutations = []
+
+        # Accept lists as well as generators from the streaming parser
+        if items_to_update is not None:
+            for one_item in items_to_update:
+
+                # Records come straight from CVEItem.to_record(); JSON strings
+                # are still accepted from older callers
+                if isinstance(one_item, str):
+                    one_item_in_json = json.loads(one_item)
+                else:
+                    one_item_in_json = one_item
+
+                mutation, cpe_count = make_index_mutation(one_item_in_json, self.codec_name, self.component_names)
+                mutations.append(mutation)
+                count += cpe_count
+                if len(mutations) >= chunk_size:
+                    self.apply_changed_index_mutations(mutations, cache=writer, changes=changes)
+                    mutations = []
+        self.apply_changed_index_mutations(mutations, cache=writer, changes=changes)
+
+        if own_writer:
+            writer.flush()
+            self.commit_index_update(changes)
+
+        return count
+
+    def get_index_generation(self):
+        generation = self.cache_for_indexer.get(
+            self.SETTINGS.get("collection_for_generation", "index_generation"))
+        return int(generation) if generation is not None else 0
+
+    def refresh_index_namespace(self):
+        """
+        Follow the pointer to the live namespace and read the index
+        generation, in one round trip. Every engine follows the pointer,
+        whatever its own shadow_rebuild setting: the namespace it replaced
+        is deleted after the switch
+        :return: (int) - Index generation
+        """
+        if self.building_shadow:
+            return self.get_index_generation()
+        pointer, generation = self.cache_for_indexer.mget([
+            self.SETTINGS.get("collection_for_index_pointer", "index_pointer"),
+            self.SETTINGS.get("collection_for_generation", "index_generation")])
+        self.namespace = pointer.decode("utf-8") if pointer is not None else ""
+        return int(generation) if generation is not None else 0
+
+    def bump_index_generation(self):
+        return self.cache_for_indexer.incr(
+            self.SETTINGS.get("collection_for_generation", "index_generation"))
+
+    def commit_index_update(self, changes=None):
+        """
+        Called by the action_* methods once their writes are flushed: query
+        caches of every process drop results of older generations
+        :param changes: (dict) - Change counters; no bump if nothing was written
+        """
+        if changes is not None and changes["new"] + changes["changed"] == 0:
+            return None
+        return self.bump_index_generation()
+
+    def query_cache_stats(self):
+        if self.query_cache is None:
+            return None
+        return self.query_cache.stats()
+
+    def find_by_component_and_version(self, component, version):
+        """
+        :param component: (str) - "vendor:product", or a bare product for
+        all of its vendors
+        """
+        # One GET per query keeps the cache exactly as fresh as the index.
+        # The cache is keyed on the query as given, so a hit needs no
+        # product resolution and holds the merged result of all vendors
+        generation = self.refresh_index_namespace()
+        if self.query_cache is None:
+            return self.read_by_queried_component(component, version)
+        key = (component, version)
+        hit, list_of_components = self.query_cache.get(key, generation)
+        if not hit:
+            list_of_components = self.read_by_queried_component(component, version)
+            self.query_cache.put(key, generation, list_of_components)
+        # Cached records are shared, callers get their own top level dicts
+        return [dict(one_component) for one_component in list_of_components]
+
+    def read_by_queried_component(self, component, version):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.read_by_component_and_version(one_component, version) for one_component in components])
+        return self.read_by_component_and_version(components[0], version)
+
+    def read_by_component_and_version(self, component, version):
+        if version is None or WILDCARD_CHARS.search(version):
+            return self.find_by_component_and_version_pattern(component, version)
+        collection = self.create_collection_name_by_component_and_version(component=component, version=version)
+        ids = self.get_ids_from_index(collection)
+        list_of_components = self.get_cve_records_by_ids(ids)
+        for one_component in list_of_components:
+            one_component["component"] = component
+            one_component["version"] = version
+        return list_of_components
+
+    def find_versions_by_pattern(self, component, pattern=None):
+        """
+        Resolve a version pattern like "1.0*" against the sorted set of
+        known versions of the component, without KEYS/SCAN
+        :param component: (str) - Component name
+        :param pattern: (str) - fnmatch style pattern, None for all versions
+        :return: (list) - Matching versions in lexicographic order
+        """
+        self.refresh_index_namespace()
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_versions(
+                [self.find_versions_by_pattern(one_component, pattern) for one_component in components])
+        component = components[0]
+        lex_min, lex_max = self.create_version_pattern_bounds(pattern)
+        return self.filter_versions_by_pattern(
+            self.cache_for_indexer.zrangebylex(
+                self.create_versions_collection_name(component), lex_min, lex_max),
+            pattern)
+
+    @staticmethod
+    def create_version_pattern_bounds(pattern=None):
+        # ZRANGEBYLEX bounds that cover every version with the literal
+        # prefix of the pattern
+        prefix = WILDCARD_CHARS.split(pattern or "*", 1)[0]
+        if prefix == "":
+            return "-", "+"
+        return b"[" + prefix.encode("utf-8"), b"[" + prefix.encode("utf-8") + b"\xff"
+
+    @staticmethod
+    def filter_versions_by_pattern(members, pattern=None):
+        versions = [member.decode("utf-8") for member in members]
+        if pattern is not None and pattern != "*":
+            versions = [version for version in versions if fnmatch.fnmatchcase(version, pattern)]
+        return versions
+
+    def find_versions_by_range(self, component, lo=None, hi=None, inclusive=True):
+        """
+        Versions of the component between lo and hi in semantic order
+        :param component: (str) - Component name
+        :param lo: (str) - Lower bound, None for no bound
+        :param hi: (str) - Upper bound, None for no bound
+        :param inclusive: (bool or tuple) - Include the bounds, or (lo, hi) flags
+        :return: (list) - Matching versions, lowest first
+        """
+        self.refresh_index_namespace()
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_versions(
+                [self.find_versions_by_range(one_component, lo, hi, inclusive) for one_component in components],
+                key=version_sort_key)
+        component = components[0]
+        if isinstance(inclusive, tuple):
+            lo_inclusive, hi_inclusive = inclusive
+        else:
+            lo_inclusive = hi_inclusive = inclusive
+        # Members are <sort key> \x00 <version>: appending \xff to a key
+        # moves the bound past every member with that key
+        if lo is None:
+            lex_min = "-"
+        elif lo_inclusive:
+            lex_min = b"[" + version_sort_key(lo).encode("utf-8")
+        else:
+            lex_min = b"(" + version_sort_key(lo).encode("utf-8") + VERSION_ORDER_SEPARATOR + b"\xff"
+        if hi is None:
+            lex_max = "+"
+        elif hi_inclusive:
+            lex_max = b"[" + version_sort_key(hi).encode("utf-8") + VERSION_ORDER_SEPARATOR + b"\xff"
+        else:
+            lex_max = b"(" + version_sort_key(hi).encode("utf-8")
+        members = self.cache_for_indexer.zrangebylex(
+            self.create_version_order_collection_name(component), lex_min, lex_max)
+        return [member.split(VERSION_ORDER_SEPARATOR, 1)[1].decode("utf-8") for member in members]
+
+    def find_by_component_and_version_range(self, component, lo=None, hi=None, inclusive=True):
+        """
+        CVEs affecting any version of the component between lo and hi,
+        e.g. ("openssl", hi="1.0.2k", inclusive=False) for openssl < 1.0.2k
+        """
+        self.refresh_index_namespace()
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.find_by_component_and_version_range(one_component, lo, hi, inclusive)
+                 for one_component in components])
+        component = components[0]
+        versions = self.find_versions_by_range(component, lo, hi, inclusive)
+        return self.find_by_component_and_versions(component, versions)
+
+    def find_by_component_and_version_pattern(self, component, pattern=None):
+        versions = self.find_versions_by_pattern(component, pattern)
+        return self.find_by_component_and_versions(component, versions)
+
+    def find_by_component_and_versions(self, component, versions):
+        # Each CVE once; "version" is the first matching version
+        self.refresh_index_namespace()
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.find_by_component_and_versions(one_component, versions) for one_component in components])
+        component = components[0]
+        collections = [
+            self.create_collection_name_by_component_and_version(component=component, version=version)
+            for version in versions]
+        matched_versions = dict()
+        for version, ids in zip(versions, self.get_ids_from_indexes(collections)):
+            for cve_id in ids:
+                matched_versions.setdefault(cve_id, []).append(version)
+        list_of_components = self.get_cve_records_by_ids(sorted(matched_versions))
+        for one_component in list_of_components:
+            one_component["component"] = component
+            one_component["version"] = matched_versions[one_component["id"]][0]
+            one_component["matched_versions"] = matched_versions[one_component["id"]]
+        return list_of_components
+
+    def search_descriptions(self, query, limit=None):
+        """
+        Keyword search over CVE descriptions, one SINTER per OR clause in a
+        single round trip, then one MGET for the candidates:
+            heap overflow             all words
+            "heap overflow" libpng    phrase and word
+            xss OR "cross site"       either side
+        Clauses made only of stop words can not use the index and match nothing.
+        Clauses of indexed words are answered by the posting lists alone,
+        only phrases and stop words are checked on the description text.
+        :param query: (str) - Keyword query
+        :param limit: (int) - Return at most this many CVEs
+        :return: (list) - Matching CVE records sorted by ID
+        """
+        self.refresh_index_namespace()
+        clauses = [clause for clause in parse_text_query(query) if len(clause_terms(clause)) > 0]
+        if len(clauses) == 0:
+            return []
+        pipe = self.cache_for_indexer.pipeline(transaction=False)
+        for clause in clauses:
+            pipe.sinter([self.create_text_collection_name(term) for term in clause_terms(clause)])
+        matched = set()
+        candidates = dict()
+        for clause, ids in zip(clauses, pipe.execute()):
+            checked = needs_text_check(clause)
+            for cve_id in ids:
+                if checked:
+                    candidates.setdefault(cve_id.decode("utf-8"), []).append(clause)
+                else:
+                    matched.add(cve_id.decode("utf-8"))
+        return self.filter_text_candidates(matched, candidates, limit, self.SETTINGS.get("batch_size", 1000))
+
+    def find_ids_by_attributes(self, cwe=None, cvssv2_severity=None, cvssv3_severity=None,
+                               published_after=None, published_before=None,
+                               modified_after=None, modified_before=None):
+        """
+        IDs of the CVEs that meet every given criterion, computed by Redis
+        in one MULTI: sets are intersected, sorted sets cut by date. E.g.
+        CRITICAL CVEs modified in the last 24 hours:
+            find_ids_by_attributes(cvssv3_severity="CRITICAL", modified_after=time.time() - 86400)
+        :param cwe: (str or list) - CWE IDs like "CWE-79", any of them matches
+        :param cvssv3_severity: (str or list) - Severities, any of them matches
+        :param published_after: (str, datetime or float) - Dates compare with
+        >= (after) and < (before)
+        :return: (list) - Sorted CVE IDs
+        """
+        self.refresh_index_namespace()
+        set_criteria = []
+        for field, values in (("cwe", cwe), ("cvssv2", cvssv2_severity), ("cvssv3", cvssv3_severity)):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            if field != "cwe":
+                values = [value.upper() for value in values]
+            if len(values) == 0:
+                return []
+            set_criteria.append([self.create_attribute_collection_name(field, value) for value in values])
+        date_criteria = []
+        for field, after, before in (
+                ("published", published_after, published_before), ("modified", modified_after, modified_before)):
+            if after is not None or before is not None:
+                date_criteria.append((self.create_date_collection_name(field), after, before))
+        if len(set_criteria) == 0 and len(date_criteria) == 0:
+            raise ValueError("At least one criterion is required")
+
+        temporary_prefix = "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_temporary", "tmp::"),
+            uuid.uuid4().hex
+        ])
+        temporary_keys = []
+        pipe = self.cache_for_indexer.pipeline(transaction=True)
+        keys = []
+        for collection_names in set_criteria:
+            if len(collection_names) == 1:
+                keys.append(collection_names[0])
+                continue
+            union = "{}::{}".format(temporary_prefix, len(temporary_keys))
+            temporary_keys.append(union)
+            pipe.sunionstore(union, collection_names)
+            keys.append(union)
+        if len(date_criteria) == 0:
+            pipe.sinter(keys)
+        elif len(date_criteria) == 1 and len(keys) == 0:
+            collection_name, after, before = date_criteria[0]
+            pipe.zrangebyscore(
+                collection_name,
+                "-inf" if after is None else to_timestamp(after),
+                "+inf" if before is None else "({}".format(to_timestamp(before)))
+        else:
+            # Sets join with weight 0, so the score left is the date
+            result = temporary_prefix + "::result"
+            temporary_keys.append(result)
+            for number, (collection_name, after, before) in enumerate(date_criteria):
+                weights = {collection_name: 1}
+                for key in (keys if number == 0 else [result]):
+                    weights[key] = 0
+                pipe.zinterstore(result, weights)
+                if after is not None:
+                    pipe.zremrangebyscore(result, "-inf", "({}".format(to_timestamp(after)))
+                if before is not None:
+                    pipe.zremrangebyscore(result, to_timestamp(before), "+inf")
+            pipe.zrange(result, 0, -1)
+        if len(temporary_keys) > 0:
+            pipe.delete(*temporary_keys)
+        replies = pipe.execute()
+        ids = replies[-2] if len(temporary_keys) > 0 else replies[-1]
+        return sorted(cve_id.decode("utf-8") for cve_id in ids)
+
+    def find_by_attributes(self, **criteria):
+        """
+        :param criteria: - Keyword arguments of find_ids_by_attributes
+        :return: (list) - Matching CVE records sorted by ID
+        """
+        cve_ids = self.find_ids_by_attributes(**criteria)
+        records, round_trips = self.get_cve_records_map(cve_ids)
+        return [records[cve_id] for cve_id in cve_ids if cve_id in records]
+
+    def get_cve_records_map(self, cve_ids):
+        """
+        :param cve_ids: (list) - Unique CVE IDs
+        :return: (tuple) - ({cve_id: record}, number of MGET round trips)
+        """
+        records = dict()
+        round_trips = 0
+        chunk_size = self.SETTINGS.get("batch_size", 1000)
+        for start in range(0, len(cve_ids), chunk_size):
+            chunk = cve_ids[start:start + chunk_size]
+            bodies = self.cache_for_indexer.mget(
+                [self.create_cve_record_name(cve_id) for cve_id in chunk])
+            round_trips += 1
+            for cve_id, body in zip(chunk, bodies):
+                if body is None:
+                    continue
+                record = self.deserialize(body)
+                if record is not None:
+                    records[cve_id] = record
+        return records, round_trips
+
+    def find_many(self, queries):
+        """
+        Answer a whole inventory in a few round trips: one for version
+        patterns, one for the index keys, one MGET per batch_size CVEs
+        :param queries: (list) - (component, version) pairs, version may be
+        a pattern like in find_by_component_and_version
+        :return: (dict) - results: {(component, version): list of CVEs, as
+        find_by_component_and_version returns them}, stats: counters of the call
+        """
+        start_time = time.time()
+        self.refresh_index_namespace()
+        requested_queries = list(dict.fromkeys((component, version) for component, version in queries))
+        components, round_trips = self.resolve_many_components(
+            set(component for component, version in requested_queries))
+        # Queries by bare product run once per vendor and are merged at the end
+        unique_queries = list(dict.fromkeys(
+            (one_component, version)
+            for component, version in requested_queries
+            for one_component in components[component]))
+
+        versions_by_query = dict()
+        patterns = []
+        for component, version in unique_queries:
+            if version is None or WILDCARD_CHARS.search(version):
+                patterns.append((component, version))
+            else:
+                versions_by_query[(component, version)] = [version]
+        if len(patterns) > 0:
+            pipe = self.cache_for_indexer.pipeline(transaction=False)
+            for component, pattern in patterns:
+                lex_min, lex_max = self.create_version_pattern_bounds(pattern)
+                pipe.zrangebylex(self.create_versions_collection_name(component), lex_min, lex_max)
+            round_trips += 1
+            for (component, pattern), members in zip(patterns, pipe.execute()):
+                versions_by_query[(component, pattern)] = self.filter_versions_by_pattern(members, pattern)
+
+        # Every index key is read once, however many queries share it
+        keys = list(dict.fromkeys(
+            (component, version)
+            for (component, _), versions in versions_by_query.items()
+            for version in versions))
+        ids_by_key = dict()
+        if len(keys) > 0:
+            ids_by_key = dict(zip(keys, self.get_ids_from_indexes([
+                self.create_collection_name_by_component_and_version(component=component, version=version)
+                for component, version in keys])))
+            round_trips += 1
+
+        # Every CVE body is read and decoded once
+        cve_ids = sorted(set(cve_id for ids in ids_by_key.values() for cve_id in ids))
+        records, mget_round_trips = self.get_cve_records_map(cve_ids)
+        round_trips += mget_round_trips
+
+        pattern_queries = set(patterns)
+        results = dict()
+        for query in unique_queries:
+            component, version = query
+            matched_versions = dict()
+            for one_version in versions_by_query[query]:
+                for cve_id in ids_by_key[(component, one_version)]:
+                    matched_versions.setdefault(cve_id, []).append(one_version)
+            list_of_components = []
+            for cve_id in sorted(matched_versions):
+                if cve_id not in records:
+                    continue
+                one_component = dict(records[cve_id])
+                one_component["component"] = component
+                one_component["version"] = matched_versions[cve_id][0]
+                if query in pattern_queries:
+                    one_component["matched_versions"] = matched_versions[cve_id]
+                list_of_components.append(one_component)
+            results[query] = list_of_components
+
+        for component, version in requested_queries:
+            if components[component] != [component]:
+                results[(component, version)] = self.merge_component_results(
+                    [[dict(one_component) for one_component in results[(one_component, version)]]
+                     for one_component in components[component]])
+        results = dict((query, results[query]) for query in requested_queries)
+
+        return dict(
+            results=results,
+            stats=dict(
+                queries=len(queries),
+                unique_queries=len(requested_queries),
+                index_keys=len(keys),
+                cves=len(records),
+                round_trips=round_trips,
+                time_delta=time.time() - start_time
+            )
+        )
+
+    def action_export_snapshot(self, path=None):
+        """
+        Write the live index and the CVE bodies to a snapshot file that
+        SnapshotReader serves without Redis, with the key layout the index
+        was built with. Legacy layouts have to be migrated first.
+        :param path: (str) - Target file, SETTINGS["snapshot_path"] by default
+        """
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        if path is None:
+            path = self.SETTINGS.get("snapshot_path", "cve_index.snapshot")
+        start_time = time.time()
+        self.refresh_index_namespace()
+        chunk_size = self.SETTINGS.get("batch_size", 1000)
+
+        collection_names = sorted(set(self.cache_for_indexer.scan_iter(
+            match=self.namespace + self.SETTINGS["collection_for_index"] + "*")))
+        index = dict()
+        for start in range(0, len(collection_names), chunk_size):
+            chunk = collection_names[start:start + chunk_size]
+            for collection_name, ids in zip(chunk, self.get_ids_from_indexes(chunk)):
+                if len(ids) > 0:
+                    index[self.split_collection_name(collection_name)] = ids
+
+        cve_ids = sorted(set(cve_id for ids in index.values() for cve_id in ids))
+        bodies = dict()
+        last_modified = dict()
+        for start in range(0, len(cve_ids), chunk_size):
+            chunk = cve_ids[start:start + chunk_size]
+            records = self.cache_for_indexer.mget([self.create_cve_record_name(cve_id) for cve_id in chunk])
+            states = self.cache_for_indexer.hmget(self.create_cve_state_collection_name(), chunk)
+            for cve_id, body, state in zip(chunk, records, states):
+                if body is None:
+                    continue
+                bodies[cve_id] = body
+                if state is not None:
+                    last_modified[cve_id] = state.decode("utf-8").rpartition("|")[0]
+                else:
+                    last_modified[cve_id] = (self.deserialize(body) or {}).get("lastModifiedDate")
+
+        # Records the layout of an index that has none yet
+        self.index_layout_changed()
+        stats = write_snapshot(path, index, bodies, last_modified, self.get_index_layout() or LEGACY_INDEX_LAYOUT)
+        time_delta = time.time() - start_time
+
+        result["count"] = stats["cves"]
+        result["time_delta"] = time_delta
+        result["keys"] = stats["keys"]
+        result["size"] = stats["size"]
+        result["path"] = path
+        result["message"] = "Complete export {} CVEs and {} index keys to {} at {} sec.".format(
+            stats["cves"],
+            stats["keys"],
+            path,
+            time_delta
+        )
+        return result
+
+    def action_import_snapshot(self, path=None):
+        """
+        Bulk load a snapshot into the live namespace, e.g. into a fresh Redis.
+        Snapshots exported under another key layout than the one of the
+        settings are not imported; a live index of another layout is
+        replaced by the snapshot
+        :param path: (str) - Snapshot file, SETTINGS["snapshot_path"] by default
+        """
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        if path is None:
+            path = self.SETTINGS.get("snapshot_path", "cve_index.snapshot")
+        start_time = time.time()
+        self.refresh_index_namespace()
+        writer = self.create_batch_writer()
+        state_collection_name = self.create_cve_state_collection_name()
+
+        count = 0
+        keys = 0
+        text_index = self.SETTINGS.get("text_index", True)
+        secondary_indexes = self.SETTINGS.get("secondary_indexes", True)
+        with SnapshotReader(path) as snapshot:
+            layout = snapshot.index_layout()
+            if layout != self.component_names.layout():
+                result["time_delta"] = time.time() - start_time
+                result["layout"] = dict(snapshot=layout, current=self.component_names.layout())
+                result["message"] = "Snapshot {} was exported with key layout {}, the settings use {}: not imported".format(
+                    path,
+                    layout,
+                    self.component_names.layout()
+                )
+                return result
+            if self.index_layout_changed():
+                self.delete_namespace_keys(self.namespace)
+            last_modified = dict()
+            for cve_id, body, cve_last_modified in snapshot.iter_cves():
+                self.save_encoded_cve_record(cve_id, body, cache=writer)
+                writer.hset(state_collection_name, cve_id, make_cve_state(cve_last_modified, body))
+                if text_index or secondary_indexes:
+                    record = decode_value(body)
+                if text_index:
+                    self.append_terms_in_text_index(cve_id, description_terms(record.get("description")), cache=writer)
+                if secondary_indexes:
+                    self.append_attributes_in_index(cve_id, extract_attributes(record), cache=writer)
+                last_modified[cve_id] = cve_last_modified
+                count += 1
+            for component, version, ids in snapshot.iter_keys():
+                self.append_ids_in_index(
+                    component,
+                    version,
+                    [(cve_id, last_modified[cve_id]) for cve_id in ids],
+                    cache=writer)
+                keys += 1
+        writer.flush()
+        self.cache_for_indexer.set(self.create_layout_collection_name(), layout)
+        self.commit_index_update()
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["keys"] = keys
+        result["writes"] = writer.stats()
+        result["message"] = "Complete import {} CVEs and {} index keys from {} at {} sec.".format(
+            count,
+            keys,
+            path,
+            time_delta
+        )
+        return result
+
+    def create_feed_marker_name(self, source):
+        return "".join([
+            self.namespace,
+            self.SETTINGS.get("collection_for_feeds", "feeds::"),
+            source
+        ])
+
+    def is_feed_indexed(self, source, digest):
+        if digest is None:
+            return False
+        return self.cache_for_indexer.get(self.create_feed_marker_name(source)) == digest.encode("utf-8")
+
+    def mark_feed_indexed(self, source, digest, cache=None):
+        # Digest of the feed version the index was built from
+        if digest is None:
+            return
+        if cache is None:
+            cache = self.cache_for_indexer
+        cache.set(self.create_feed_marker_name(source), digest)
+
+    def discard_feed(self, feed):
+        # A cached copy that failed to parse must not be revalidated as unchanged
+        if self.feed_cache is not None and feed["digest"] is not None:
+            self.feed_cache.discard(feed["source"])
+
+    def fetch_feed(self, source):
+        """
+        Bring one feed into the local feed cache
+        :param source: (str) - Feed URL
+        :return: (dict) - source, path to read the feed from (None if this
+        version of the feed is already indexed), digest and cache status
+        """
+        if self.feed_cache is None:
+            return dict(source=source, path=source, digest=None, status="uncached")
+        entry = self.feed_cache.fetch(source)
+        if entry["status"] == "error":
+            # Let the regular download report the problem
+            print("Can not cache {}: {}".format(source, entry["error"]))
+            return dict(source=source, path=source, digest=None, status="error")
+        if self.is_feed_indexed(source, entry["digest"]):
+            return dict(source=source, path=None, digest=entry["digest"], status="indexed")
+        return dict(source=source, path=entry["path"], digest=entry["digest"], status=entry["status"])
+
+    def fetch_feeds(self, sources):
+        """
+        fetch_feed for several feeds, with concurrent downloads
+        :param sources: (list) - Feed URLs
+        :return: (list) - fetch_feed results in the order of sources
+        """
+        if self.feed_cache is None or len(sources) < 2:
+            return [self.fetch_feed(source) for source in sources]
+        concurrency = self.SETTINGS.get("pipeline_fetch_concurrency", 4)
+        with ThreadPoolExecutor(max_workers=max(min(concurrency, len(sources)), 1)) as executor:
+            return list(executor.map(self.fetch_feed, sources))
+
+    def download_and_parse_cve_file(self, source):
+        """
+        :return: (tuple) - (parsed items, response), (None, error) on failure
+        """
+        if self.SETTINGS.get("stream_feeds", False):
+            items, response = stream_cve_file(source)
+        else:
+            items, response = download_cve_file(source)
+        if items is None:
+            print("Can not download {}: {}".format(source, response))
+            return None, response
+        if self.SETTINGS.get("stream_feeds", False):
+            return iter_parse_cve_file(items), response
+        return parse_cve_file(items), response
+
+    def index_feed(self, feed, writer, changes):
+        """
+        Download and index one fetched feed; it is marked as indexed only
+        once all of its items are written
+        :return: (tuple) - (number of CPE strings seen, None), (0, error) if
+        the feed could not be downloaded or broke off while it was streamed
+        """
+        parsed, error = self.download_and_parse_cve_file(feed["path"])
+        if parsed is not None:
+            try:
+                count = self.update_items_in_cache_index(parsed, writer=writer, changes=changes)
+            except FEED_READ_ERRORS as read_error:
+                print("Can not read {}: {}".format(feed["path"], read_error))
+                error = "Read error: {}".format(read_error)
+            else:
+                writer.flush()
+                self.mark_feed_indexed(feed["source"], feed["digest"])
+                return count, None
+        # Items written before the feed broke off stay, they are complete CVEs
+        writer.flush()
+        self.discard_feed(feed)
+        return 0, error
+
+    def run_ingest_pipeline(self, kind, sources):
+        """
+        Run feeds through the overlapped fetch/parse/write pipeline
+        :param kind: (str) - Name used in the message: modified, recent, populated
+        :param sources: (list) - (label, url) pairs
+        """
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        pipeline = FeedPipeline(
+            self,
+            fetch_concurrency=self.SETTINGS.get("pipeline_fetch_concurrency", 4),
+            queue_size=self.SETTINGS.get("pipeline_queue_size", 4),
+            batch_items=self.SETTINGS.get("pipeline_batch_items", 500),
+            stream_feeds=self.SETTINGS.get("stream_feeds", False)
+        )
+        pipeline_result = pipeline.run(sources)
+        self.commit_index_update(pipeline_result["changes"])
+
+        result["count"] = pipeline_result["count"]
+        result["time_delta"] = pipeline_result["time_delta"]
+        result["feeds"] = pipeline_result["feeds"]
+        result["skipped"] = [feed["label"] for feed in pipeline_result["feeds"] if feed["skipped"]]
+        result["changes"] = pipeline_result["changes"]
+        result["stages"] = pipeline_result["stages"]
+        result["writes"] = pipeline_result["writes"]
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} {} items at {} sec. CVEs: {} new, {} changed, {} unchanged, {} skipped".format(
+            result["count"],
+            kind,
+            result["time_delta"],
+            result["changes"]["new"],
+            result["changes"]["changed"],
+            result["changes"]["unchanged"],
+            result["changes"]["skipped"]
+        )
+        return self.add_failed_feeds(
+            result, [(feed["label"], feed["error"]) for feed in pipeline_result["feeds"] if feed["error"] is not None])
+
+    @with_ingest_metrics
+    def action_update_cve_modified(self):
+        self.refresh_index_namespace()
+        if self.index_layout_changed():
+            print(self.action_rebuild_index_for_layout()["message"])
+        if self.SETTINGS.get("ingest_pipeline", False):
+            return self.run_ingest_pipeline(
+                "modified", [("modified", self.SETTINGS["sources"]["cve_modified"])])
+
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+
+        start_time = time.time()
+
+        feed = self.fetch_feed(self.SETTINGS["sources"]["cve_modified"])
+        if feed["path"] is None:
+            result["time_delta"] = time.time() - start_time
+            result["skipped"] = ["modified"]
+            result["message"] = "Feed of modified items is unchanged, skip it"
+            return result
+
+        writer = self.create_batch_writer()
+        changes = empty_changes()
+        count, error = self.index_feed(feed, writer, changes)
+        self.commit_index_update(changes)
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["skipped"] = []
+        result["changes"] = changes
+        result["writes"] = writer.stats()
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} modified items at {} sec. CVEs: {} new, {} changed, {} unchanged, {} skipped".format(
+            count,
+            time_delta,
+            changes["new"],
+            changes["changed"],
+            changes["unchanged"],
+            changes["skipped"]
+        )
+        return self.add_failed_feeds(result, [("modified", error)] if error is not None else [])
+
+    @with_ingest_metrics
+    def action_update_cve_recent(self):
+        self.refresh_index_namespace()
+        if self.index_layout_changed():
+            print(self.action_rebuild_index_for_layout()["message"])
+        if self.SETTINGS.get("ingest_pipeline", False):
+            return self.run_ingest_pipeline(
+                "recent", [("recent", self.SETTINGS["sources"]["cve_recent"])])
+
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+
+        start_time = time.time()
+
+        feed = self.fetch_feed(self.SETTINGS["sources"]["cve_recent"])
+        if feed["path"] is None:
+            result["time_delta"] = time.time() - start_time
+            result["skipped"] = ["recent"]
+            result["message"] = "Feed of recent items is unchanged, skip it"
+            return result
+
+        writer = self.create_batch_writer()
+        changes = empty_changes()
+        count, error = self.index_feed(feed, writer, changes)
+        self.commit_index_update(changes)
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["skipped"] = []
+        result["changes"] = changes
+        result["writes"] = writer.stats()
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} recent items at {} sec. CVEs: {} new, {} changed, {} unchanged, {} skipped".format(
+            count,
+            time_delta,
+            changes["new"],
+            changes["changed"],
+            changes["unchanged"],
+            changes["skipped"]
+        )
+        return self.add_failed_feeds(result, [("recent", error)] if error is not None else [])
+
+    def cve_loop(self, parsed_item, writer=None, changes=None):
+        count = 0
+
+        count = self.update_items_in_cache_index(parsed_item, writer=writer, changes=changes)
+
+        return count
+
+    @with_ingest_metrics
+    def action_populate_cve(self):
+        self.refresh_index_namespace()
+        if not self.building_shadow and self.index_layout_changed():
+            return self.action_rebuild_index_for_layout()
+        if self.SETTINGS.get("shadow_rebuild", False) and not self.building_shadow:
+            return self.action_rebuild_index_in_shadow()
+        workers = self.SETTINGS.get("populate_workers", 1)
+        if workers > 1:
+            return self.action_populate_cve_parallel(workers)
+        if self.SETTINGS.get("ingest_pipeline", False):
+            sources = []
+            for year in range(self.SETTINGS["start_year"], datetime.now().year + 1):
+                source = self.SETTINGS["sources"]["cve_base"] + str(year) + self.SETTINGS["sources"]["cve_base_postfix"]
+                sources.append((year, source))
+            return self.run_ingest_pipeline("populated", sources)
+
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        count = 0
+        years = []
+        skipped = []
+        failed = []
+        changes = empty_changes()
+        start_time = time.time()
+
+        writer = self.create_batch_writer()
+
+        current_year = datetime.now().year
+        all_years = list(range(self.SETTINGS["start_year"], current_year + 1))
+        fetched = self.fetch_feeds([
+            self.SETTINGS["sources"]["cve_base"] + str(year) + self.SETTINGS["sources"]["cve_base_postfix"]
+            for year in all_years])
+        for year, feed in zip(all_years, fetched):
+            if feed["path"] is None:
+                skipped.append(year)
+                print("CVE-{} is unchanged, skip it".format(year))
+                continue
+            year_start_time = time.time()
+            year_count, error = self.index_feed(feed, writer, changes)
+            if error is not None:
+                failed.append((year, error))
+                continue
+            count += year_count
+            years.append(dict(
+                year=year,
+                count=year_count,
+                time_delta=time.time() - year_start_time
+            ))
+
+            print("Populate CVE-{} takes {} sec.".format(year, time.time() - year_start_time))
+
+        self.commit_index_update(changes)
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["years"] = years
+        result["skipped"] = skipped
+        result["changes"] = changes
+        result["writes"] = writer.stats()
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} populated items at {} sec.".format(
+            count,
+            time_delta
+        )
+        return self.add_failed_feeds(result, failed)
+
+    def create_layout_collection_name(self):
+        return self.SETTINGS.get("collection_for_layout", "index_layout")
+
+    def index_exists(self):
+        if self.cache_for_indexer.exists(self.create_cve_state_collection_name()):
+            return True
+        # Indexes older than the change detection state
+        for key in self.cache_for_indexer.scan_iter(
+                match=self.namespace + self.SETTINGS["collection_for_index"] + "*", count=1000):
+            return True
+        return False
+
+    def get_index_layout(self):
+        layout = self.cache_for_indexer.get(self.create_layout_collection_name())
+        return layout.decode("utf-8") if layout is not None else None
+
+    def index_layout_changed(self):
+        """
+        Compare the key layout the live index was built with to the one of
+        the settings. An empty index records the current layout, one built
+        before layouts were recorded counts as LEGACY_INDEX_LAYOUT. If such
+        an index is kept, index keys still holding CVE bodies are migrated
+        first; otherwise the rebuild replaces them
+        :return: (bool) - True if the index has to be rebuilt
+        """
+        layout = self.component_names.layout()
+        stored = self.get_index_layout()
+        if stored is not None:
+            return stored != layout
+        legacy = self.index_exists()
+        if legacy:
+            stored = LEGACY_INDEX_LAYOUT
+        else:
+            stored = layout
+        if stored == layout:
+            if legacy:
+                print(self.migrate_legacy_index()["message"])
+            self.cache_for_indexer.set(self.create_layout_collection_name(), layout)
+        return stored != layout
+
+    def action_rebuild_index_for_layout(self):
+        """
+        Index all year feeds again after the key layout changed. The feed
+        markers and change detection states of the old index would skip
+        every unchanged feed and CVE, so the index is rebuilt in a shadow
+        namespace, or without shadow_rebuild its keys are deleted first
+        """
+        previous = self.get_index_layout() or LEGACY_INDEX_LAYOUT
+        if self.SETTINGS.get("shadow_rebuild", False):
+            result = self.action_rebuild_index_in_shadow()
+        else:
+            self.refresh_index_namespace()
+            self.delete_namespace_keys(self.namespace)
+            self.cache_for_indexer.delete(self.create_layout_collection_name())
+            result = self.action_populate_cve()
+        result["layout"] = dict(previous=previous, current=self.component_names.layout())
+        result["message"] = "Index layout changed from {} to {}, rebuilt. {}".format(
+            previous, self.component_names.layout(), result["message"])
+        return result
+
+    def create_index_namespace(self):
+        counter = self.cache_for_indexer.incr(
+            self.SETTINGS.get("collection_for_namespace_counter", "index_namespace_counter"))
+        return "g{}:".format(counter)
+
+    def create_retired_namespaces_collection_name(self):
+        return self.SETTINGS.get("collection_for_retired_namespaces", "index_retired_namespaces")
+
+    def action_rebuild_index_in_shadow(self):
+        """
+        Blue/green populate: the year feeds are indexed into a fresh
+        namespace while queries keep reading the live one. Then the pointer
+        is switched and the generation bumped in one MULTI. The old
+        namespace is deleted afterwards in small batches.
+        CVEs that only came from the modified/recent feeds are indexed again
+        by the next action_update_cve_* run.
+        """
+        self.refresh_index_namespace()
+        live_namespace = self.namespace
+        # Namespaces retired by an earlier run whose collection did not finish
+        leftovers = [
+            namespace.decode("utf-8") for namespace in
+            self.cache_for_indexer.smembers(self.create_retired_namespaces_collection_name())]
+
+        shadow = self.__class__(self.SETTINGS)
+        shadow.namespace = self.create_index_namespace()
+        shadow.building_shadow = True
+        result = shadow.action_populate_cve()
+
+        pipe = self.cache_for_indexer.pipeline(transaction=True)
+        pipe.set(self.SETTINGS.get("collection_for_index_pointer", "index_pointer"), shadow.namespace)
+        pipe.incr(self.SETTINGS.get("collection_for_generation", "index_generation"))
+        pipe.sadd(self.create_retired_namespaces_collection_name(), live_namespace)
+        pipe.set(self.create_layout_collection_name(), self.component_names.layout())
+        pipe.execute()
+        self.namespace = shadow.namespace
+
+        retired = [live_namespace] + [namespace for namespace in leftovers if namespace != live_namespace]
+        collector = threading.Thread(
+            target=self.collect_index_namespaces,
+            args=(retired, self.SETTINGS.get("shadow_gc_delay", 5)),
+            name="index-gc")
+        if self.SETTINGS.get("shadow_gc_background", True):
+            collector.start()
+        else:
+            collector.run()
+
+        result["namespace"] = shadow.namespace
+        result["retired_namespaces"] = retired
+        result["message"] = "{} Switched index to {}".format(result["message"], shadow.namespace)
+        return result
+
+    def create_namespace_key_patterns(self, namespace):
+        # Every kind of key the index writes, the pointer and counters excluded
+        prefixes = [
+            self.SETTINGS["collection_for_index"],
+            self.SETTINGS.get("collection_for_cve", "cve::"),
+            self.SETTINGS.get("collection_for_versions", "versions::"),
+            self.SETTINGS.get("collection_for_version_order", "version_order::"),
+            self.SETTINGS.get("collection_for_feeds", "feeds::"),
+            self.SETTINGS.get("collection_for_text", "text::"),
+            self.SETTINGS.get("collection_for_products", "products::"),
+            self.SETTINGS.get("collection_for_cwe", "cwe::"),
+            self.SETTINGS.get("collection_for_severity", "severity::"),
+            self.SETTINGS.get("collection_for_temporary", "tmp::"),
+        ]
+        patterns = [namespace + prefix + "*" for prefix in prefixes]
+        patterns.append(namespace + self.SETTINGS.get("collection_for_cve_state", "cve_state"))
+        patterns.append(namespace + self.SETTINGS.get("collection_for_published", "published_dates"))
+        patterns.append(namespace + self.SETTINGS.get("collection_for_modified", "modified_dates"))
+        return patterns
+
+    def collect_index_namespaces(self, namespaces, delay=0):
+        """
+        Delete the keys of retired namespaces with SCAN and DEL of
+        shadow_gc_batch keys at a time, so Redis is never blocked for long
+        :param namespaces: (list) - Namespace prefixes, never the live one
+        :param delay: (float) - Seconds to let running queries finish first
+        :return: (int) - Deleted keys
+        """
+        if delay:
+            time.sleep(delay)
+        deleted = 0
+        for namespace in namespaces:
+            deleted += self.delete_namespace_keys(namespace)
+            self.cache_for_indexer.srem(self.create_retired_namespaces_collection_name(), namespace)
+        return deleted
+
+    def delete_namespace_keys(self, namespace):
+        """
+        :return: (int) - Deleted keys of the namespace
+        """
+        batch_size = self.SETTINGS.get("shadow_gc_batch", 500)
+        pause = self.SETTINGS.get("shadow_gc_pause", 0.01)
+        deleted = 0
+        for pattern in self.create_namespace_key_patterns(namespace):
+            # Repeat until a pass finds nothing: deleting while scanning
+            # may hide keys from the running SCAN
+            found = True
+            while found:
+                found = False
+                batch = []
+                for key in self.cache_for_indexer.scan_iter(match=pattern, count=batch_size):
+                    found = True
+                    batch.append(key)
+                    if len(batch) >= batch_size:
+                        deleted += self.cache_for_indexer.delete(*batch)
+                        batch = []
+                        time.sleep(pause)
+                if len(batch) > 0:
+                    deleted += self.cache_for_indexer.delete(*batch)
+        return deleted
+
+    def action_populate_cve_parallel(self, workers=None):
+        """
+        Populate with a process pool. Workers download, parse and route the
+        year feeds into index mutations; this process is the only Redis
+        writer and applies them in year order, so the resulting index is the
+        same as after the sequential run.
+        :param workers: (int) - Worker processes, SETTINGS["populate_workers"] by default
+        """
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        if workers is None:
+            workers = self.SETTINGS.get("populate_workers", multiprocessing.cpu_count())
+        count = 0
+        years = []
+        skipped = []
+        failed = []
+        changes = empty_changes()
+        cpe_cache = []
+        start_time = time.time()
+
+        writer = self.create_batch_writer()
+
+        jobs = []
+        feeds = {}
+        current_year = datetime.now().year
+        all_years = list(range(self.SETTINGS["start_year"], current_year + 1))
+        fetched = self.fetch_feeds([
+            self.SETTINGS["sources"]["cve_base"] + str(year) + self.SETTINGS["sources"]["cve_base_postfix"]
+            for year in all_years])
+        for year, feed in zip(all_years, fetched):
+            if feed["path"] is None:
+                skipped.append(year)
+                continue
+            feeds[year] = feed
+            jobs.append((
+                year, feed["path"], self.SETTINGS.get("stream_feeds", False), self.codec_name, self.component_names))
+
+        pool = multiprocessing.Pool(processes=workers)
+        try:
+            # imap keeps the job order, writes happen as soon as the next
+            # year in order is ready
+            for prepared in pool.imap(prepare_feed_mutations, jobs):
+                # Stage metrics and CPE cache counts of the worker
+                INGEST_METRICS.merge(prepared["metrics"])
+                cpe_cache.append(prepared["cpe_cache"])
+                if prepared["error"] is not None:
+                    print("Can not download CVE-{}: {}".format(prepared["year"], prepared["error"]))
+                    self.discard_feed(feeds[prepared["year"]])
+                    failed.append((prepared["year"], prepared["error"]))
+                    continue
+                write_start_time = time.time()
+                chunk_size = self.SETTINGS.get("batch_size", 1000)
+                for start in range(0, len(prepared["mutations"]), chunk_size):
+                    self.apply_changed_index_mutations(
+                        prepared["mutations"][start:start + chunk_size], cache=writer, changes=changes)
+                writer.flush()
+                feed = feeds[prepared["year"]]
+                self.mark_feed_indexed(feed["source"], feed["digest"])
+                write_time = time.time() - write_start_time
+                count += prepared["count"]
+                years.append(dict(
+                    year=prepared["year"],
+                    count=prepared["count"],
+                    prepare_time=prepared["prepare_time"],
+                    write_time=write_time
+                ))
+                print("Populate CVE-{} prepared in {} sec., written in {} sec.".format(
+                    prepared["year"],
+                    prepared["prepare_time"],
+                    write_time
+                ))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.commit_index_update(changes)
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["years"] = years
+        result["skipped"] = skipped
+        result["changes"] = changes
+        result["writes"] = writer.stats()
+        result["cpe_cache"] = merge_cpe_cache_stats(cpe_cache)
+        result["message"] = "Complete process {} populated items at {} sec. with {} workers".format(
+            count,
+            time_delta,
+            workers
+        )
+        return self.add_failed_feeds(result, failed)
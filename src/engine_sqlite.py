@@ -0,0 +1,668 @@
+import re
+import time
+import json
+import fnmatch
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import *
+from engine_base import SearchEngineBase
+from cve_codec import decode_value, get_codec
+from version_key import version_sort_key
+from cpe_parser import configure_cpe_cache, cpe_cache_stats
+from index_mutations import make_index_mutation, make_cve_state, classify_change, empty_changes, \
+    ComponentNames, split_component, to_timestamp, LEGACY_INDEX_LAYOUT
+from feed_cache import FeedCache
+from text_index import parse_text_query, clause_terms, needs_text_check
+from metrics import INGEST_METRICS, with_ingest_metrics
+
+WILDCARD_CHARS = re.compile(r"[*?\[]")
+
+# Host parameters per statement, well below SQLITE_MAX_VARIABLE_NUMBER
+MAX_PARAMETERS = 500
+
+SCHEMA = (
+    # One row per CVE: encoded body plus the change detection state
+    """CREATE TABLE IF NOT EXISTS cve (
+        id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        body BLOB NOT NULL
+    ) WITHOUT ROWID""",
+    # One row per (component, version, CVE); the primary key serves exact
+    # and prefix lookups, the second index range queries
+    """CREATE TABLE IF NOT EXISTS cve_index (
+        component TEXT NOT NULL,
+        version TEXT NOT NULL,
+        version_key TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        last_modified TEXT,
+        PRIMARY KEY (component, version, cve_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS cve_index_by_version_key ON cve_index (component, version_key)",
+    "CREATE INDEX IF NOT EXISTS cve_index_by_cve_id ON cve_index (cve_id)",
+    # Vendor-qualified components of each product, for bare product queries
+    """CREATE TABLE IF NOT EXISTS component_product (
+        product TEXT NOT NULL,
+        component TEXT NOT NULL,
+        PRIMARY KEY (product, component)
+    ) WITHOUT ROWID""",
+    # Inverted index over the descriptions, one row per (term, CVE)
+    """CREATE TABLE IF NOT EXISTS cve_term (
+        term TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        PRIMARY KEY (term, cve_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS cve_term_by_cve_id ON cve_term (cve_id)",
+    # Secondary indexes: CWE and severity values (field cwe, cvssv2 or
+    # cvssv3), dates in epoch seconds
+    """CREATE TABLE IF NOT EXISTS cve_attribute (
+        field TEXT NOT NULL,
+        value TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        PRIMARY KEY (field, value, cve_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS cve_attribute_by_cve_id ON cve_attribute (cve_id)",
+    """CREATE TABLE IF NOT EXISTS cve_date (
+        cve_id TEXT PRIMARY KEY,
+        published REAL,
+        modified REAL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS cve_date_by_published ON cve_date (published)",
+    "CREATE INDEX IF NOT EXISTS cve_date_by_modified ON cve_date (modified)",
+    # Digest of the feed version each source was indexed from
+    """CREATE TABLE IF NOT EXISTS feed (
+        source TEXT PRIMARY KEY,
+        digest TEXT NOT NULL
+    ) WITHOUT ROWID""",
+    # Properties of the whole index: the key layout it was built with
+    """CREATE TABLE IF NOT EXISTS index_meta (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID""",
+)
+
+# Tables emptied before the index is rebuilt in a new layout
+INDEX_TABLES = ("cve", "cve_index", "component_product", "cve_term", "cve_attribute", "cve_date", "feed")
+
+
+def placeholders(count):
+    return ", ".join("?" * count)
+
+
+class SearchEngineSQLite(SearchEngineBase):
+    """
+    Engine for hosts without Redis: the whole index lives in one SQLite
+    file. WAL mode lets readers query while an update is written, every
+    feed is written in one transaction.
+    """
+
+    def __init__(self, SETTINGS):
+        self.SETTINGS = SETTINGS
+        self.connection = sqlite3.connect(SETTINGS.get("sqlite_path", "cve_index.sqlite"))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_schema()
+        self.codec_name = get_codec(SETTINGS.get("codec", "json")).name
+        self.component_names = ComponentNames.from_settings(SETTINGS)
+        if "cpe_cache_size" in SETTINGS:
+            configure_cpe_cache(SETTINGS["cpe_cache_size"])
+        self.feed_cache = None
+        if SETTINGS.get("feed_cache_dir"):
+            self.feed_cache = FeedCache(SETTINGS["feed_cache_dir"])
+
+    def create_schema(self):
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def get_cve_records_by_ids(self, cve_ids):
+        bodies = dict()
+        for start in range(0, len(cve_ids), MAX_PARAMETERS):
+            chunk = cve_ids[start:start + MAX_PARAMETERS]
+            bodies.update(self.connection.execute(
+                "SELECT id, body FROM cve WHERE id IN ({})".format(placeholders(len(chunk))),
+                chunk))
+        return [decode_value(bodies[cve_id]) for cve_id in cve_ids if cve_id in bodies]
+
+    def get_all_cve_ids(self):
+        return [cve_id for (cve_id,) in self.connection.execute("SELECT id FROM cve ORDER BY id")]
+
+    def apply_changed_index_mutations(self, mutations, changes=None):
+        """
+        Write the new and changed CVEs of a batch. The caller commits.
+        A changed CVE gets its index and term rows replaced, so mappings
+        and words it lost disappear from the index.
+        :param mutations: (list) - Results of make_index_mutation
+        :param changes: (dict) - Counters new, changed, unchanged and skipped to add to
+        :return: (int) - Number of applied mutations
+        """
+        if changes is None:
+            changes = empty_changes()
+        cve_ids = [mutation[0] for mutation in mutations]
+        stored_states = dict()
+        for start in range(0, len(cve_ids), MAX_PARAMETERS):
+            chunk = cve_ids[start:start + MAX_PARAMETERS]
+            stored_states.update(self.connection.execute(
+                "SELECT id, state FROM cve WHERE id IN ({})".format(placeholders(len(chunk))),
+                chunk))
+        indexed = set(stored_states)
+
+        detect = self.SETTINGS.get("change_detection", True)
+        pending = dict()
+        for cve_id, last_modified, body, mappings, terms, attributes in mutations:
+            state = make_cve_state(last_modified, body)
+            kind = classify_change(stored_states.get(cve_id), state) if detect else "changed"
+            changes[kind] += 1
+            if kind in ("new", "changed"):
+                # The latest version wins if a batch has the CVE twice
+                stored_states[cve_id] = state
+                pending[cve_id] = (state, body, last_modified, mappings, terms, attributes)
+
+        start = time.perf_counter()
+        replaced = [(cve_id,) for cve_id in pending if cve_id in indexed]
+        # Components the replaced CVEs were indexed under; a vendor left
+        # without rows is taken out of component_product below
+        replaced_components = set()
+        for start_index in range(0, len(replaced), MAX_PARAMETERS):
+            chunk = [cve_id for (cve_id,) in replaced[start_index:start_index + MAX_PARAMETERS]]
+            replaced_components.update(component for (component,) in self.connection.execute(
+                "SELECT DISTINCT component FROM cve_index WHERE cve_id IN ({})".format(placeholders(len(chunk))),
+                chunk))
+        self.connection.executemany("DELETE FROM cve_index WHERE cve_id = ?", replaced)
+        self.connection.executemany("DELETE FROM cve_term WHERE cve_id = ?", replaced)
+        self.connection.executemany("DELETE FROM cve_attribute WHERE cve_id = ?", replaced)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO cve (id, state, body) VALUES (?, ?, ?)",
+            [(cve_id, state, body) for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()])
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO cve_index (component, version, version_key, cve_id, last_modified) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(component, version, version_key, cve_id, last_modified)
+             for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()
+             for component, version, version_key in mappings])
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO component_product (product, component) VALUES (?, ?)",
+            set((split_component(component)[1], component)
+                for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()
+                for component, version, version_key in mappings
+                if split_component(component)[0] is not None))
+        self.connection.executemany(
+            "DELETE FROM component_product WHERE component = ? "
+            "AND NOT EXISTS (SELECT 1 FROM cve_index WHERE component = ?)",
+            [(component, component) for component in replaced_components])
+        if self.SETTINGS.get("text_index", True):
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO cve_term (term, cve_id) VALUES (?, ?)",
+                [(term, cve_id)
+                 for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()
+                 for term in terms])
+        if self.SETTINGS.get("secondary_indexes", True):
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO cve_attribute (field, value, cve_id) VALUES (?, ?, ?)",
+                [(field, value, cve_id)
+                 for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()
+                 for field, value in attributes[0]])
+            # NaN dates are stored as NULL and match no range
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cve_date (cve_id, published, modified) VALUES (?, ?, ?)",
+                [(cve_id, attributes[1], attributes[2])
+                 for cve_id, (state, body, last_modified, mappings, terms, attributes) in pending.items()])
+        INGEST_METRICS.observe("write", time.perf_counter() - start)
+        INGEST_METRICS.increment("write_batches")
+        INGEST_METRICS.increment("write_commands", len(pending))
+        return len(pending)
+
+    def update_items_in_cache_index(self, items_to_update, changes=None):
+        count = 0
+        chunk_size = self.SETTINGS.get("batch_size", 1000)
+        mutations = []
+        if items_to_update is not None:
+            for one_item in items_to_update:
+                if isinstance(one_item, str):
+                    one_item = json.loads(one_item)
+                mutation, cpe_count = make_index_mutation(one_item, self.codec_name, self.component_names)
+                mutations.append(mutation)
+                count += cpe_count
+                if len(mutations) >= chunk_size:
+                    self.apply_changed_index_mutations(mutations, changes=changes)
+                    mutations = []
+        self.apply_changed_index_mutations(mutations, changes=changes)
+        return count
+
+    def resolve_components(self, component):
+        """
+        :return: (list) - The canonical "vendor:product", or every vendor of
+        a bare product; unknown names are kept
+        """
+        name = self.component_names.canonical(component)
+        if not self.component_names.is_bare(name):
+            return [name]
+        components = [one_component for (one_component,) in self.connection.execute(
+            "SELECT component FROM component_product WHERE product = ? ORDER BY component", (name,))]
+        return components or [name]
+
+    def find_by_component_and_version(self, component, version):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.find_by_component_and_version(one_component, version) for one_component in components])
+        component = components[0]
+        if version is None or WILDCARD_CHARS.search(version):
+            return self.find_by_component_and_version_pattern(component, version)
+        list_of_components = []
+        for (body,) in self.connection.execute(
+                "SELECT cve.body FROM cve_index JOIN cve ON cve.id = cve_index.cve_id "
+                "WHERE cve_index.component = ? AND cve_index.version = ? ORDER BY cve_index.cve_id",
+                (component, version)):
+            one_component = decode_value(body)
+            one_component["component"] = component
+            one_component["version"] = version
+            list_of_components.append(one_component)
+        return list_of_components
+
+    def find_versions_by_pattern(self, component, pattern=None):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_versions(
+                [self.find_versions_by_pattern(one_component, pattern) for one_component in components])
+        component = components[0]
+        prefix = WILDCARD_CHARS.split(pattern or "*", 1)[0]
+        if prefix == "":
+            rows = self.connection.execute(
+                "SELECT DISTINCT version FROM cve_index WHERE component = ? ORDER BY version",
+                (component,))
+        else:
+            rows = self.connection.execute(
+                "SELECT DISTINCT version FROM cve_index WHERE component = ? AND version >= ? AND version < ? "
+                "ORDER BY version",
+                (component, prefix, prefix + "\U0010ffff"))
+        versions = [version for (version,) in rows]
+        if pattern is not None and pattern != "*":
+            versions = [version for version in versions if fnmatch.fnmatchcase(version, pattern)]
+        return versions
+
+    def find_versions_by_range(self, component, lo=None, hi=None, inclusive=True):
+        """
+        Versions of the component between lo and hi in semantic order
+        :param inclusive: (bool or tuple) - Include the bounds, or (lo, hi) flags
+        """
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_versions(
+                [self.find_versions_by_range(one_component, lo, hi, inclusive) for one_component in components],
+                key=version_sort_key)
+        component = components[0]
+        if isinstance(inclusive, tuple):
+            lo_inclusive, hi_inclusive = inclusive
+        else:
+            lo_inclusive = hi_inclusive = inclusive
+        conditions = ["component = ?"]
+        parameters = [component]
+        if lo is not None:
+            conditions.append("version_key >= ?" if lo_inclusive else "version_key > ?")
+            parameters.append(version_sort_key(lo))
+        if hi is not None:
+            conditions.append("version_key <= ?" if hi_inclusive else "version_key < ?")
+            parameters.append(version_sort_key(hi))
+        rows = self.connection.execute(
+            "SELECT DISTINCT version_key, version FROM cve_index WHERE {} ORDER BY version_key, version".format(
+                " AND ".join(conditions)),
+            parameters)
+        return [version for version_key, version in rows]
+
+    def find_by_component_and_version_range(self, component, lo=None, hi=None, inclusive=True):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.find_by_component_and_version_range(one_component, lo, hi, inclusive)
+                 for one_component in components])
+        component = components[0]
+        versions = self.find_versions_by_range(component, lo, hi, inclusive)
+        return self.find_by_component_and_versions(component, versions)
+
+    def find_by_component_and_version_pattern(self, component, pattern=None):
+        versions = self.find_versions_by_pattern(component, pattern)
+        return self.find_by_component_and_versions(component, versions)
+
+    def find_by_component_and_versions(self, component, versions):
+        # Each CVE once; "version" is the first matching version
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return self.merge_component_results(
+                [self.find_by_component_and_versions(one_component, versions) for one_component in components])
+        component = components[0]
+        order = dict((version, number) for number, version in enumerate(versions))
+        matched_versions = dict()
+        for start in range(0, len(versions), MAX_PARAMETERS):
+            chunk = versions[start:start + MAX_PARAMETERS]
+            for cve_id, version in self.connection.execute(
+                    "SELECT cve_id, version FROM cve_index WHERE component = ? AND version IN ({})".format(
+                        placeholders(len(chunk))),
+                    [component] + chunk):
+                matched_versions.setdefault(cve_id, []).append(version)
+        list_of_components = self.get_cve_records_by_ids(sorted(matched_versions))
+        for one_component in list_of_components:
+            one_versions = sorted(matched_versions[one_component["id"]], key=order.get)
+            one_component["component"] = component
+            one_component["version"] = one_versions[0]
+            one_component["matched_versions"] = one_versions
+        return list_of_components
+
+    def search_descriptions(self, query, limit=None):
+        """
+        Keyword search over CVE descriptions, see text_index.parse_text_query.
+        Each OR clause is one GROUP BY over the term rows, phrases and stop
+        words are checked on the description text.
+        :param limit: (int) - Return at most this many CVEs
+        :return: (list) - Matching CVE records sorted by ID
+        """
+        matched = set()
+        candidates = dict()
+        for clause in parse_text_query(query):
+            terms = clause_terms(clause)
+            if len(terms) == 0 or len(terms) > MAX_PARAMETERS:
+                continue
+            for (cve_id,) in self.connection.execute(
+                    "SELECT cve_id FROM cve_term WHERE term IN ({}) "
+                    "GROUP BY cve_id HAVING COUNT(*) = ?".format(placeholders(len(terms))),
+                    terms + [len(terms)]):
+                if needs_text_check(clause):
+                    candidates.setdefault(cve_id, []).append(clause)
+                else:
+                    matched.add(cve_id)
+        return self.filter_text_candidates(matched, candidates, limit, MAX_PARAMETERS)
+
+    def find_ids_by_attributes(self, cwe=None, cvssv2_severity=None, cvssv3_severity=None,
+                               published_after=None, published_before=None,
+                               modified_after=None, modified_before=None):
+        """
+        IDs of the CVEs that meet every given criterion, one INTERSECT query
+        :param cwe: (str or list) - CWE IDs like "CWE-79", any of them matches
+        :param cvssv3_severity: (str or list) - Severities, any of them matches
+        :param published_after: (str, datetime or float) - Dates compare with
+        >= (after) and < (before)
+        :return: (list) - Sorted CVE IDs
+        """
+        selects = []
+        parameters = []
+        for field, values in (("cwe", cwe), ("cvssv2", cvssv2_severity), ("cvssv3", cvssv3_severity)):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            if field != "cwe":
+                values = [value.upper() for value in values]
+            if len(values) == 0:
+                return []
+            selects.append("SELECT cve_id FROM cve_attribute WHERE field = ? AND value IN ({})".format(
+                placeholders(len(values))))
+            parameters += [field] + list(values)
+        for column, after, before in (
+                ("published", published_after, published_before), ("modified", modified_after, modified_before)):
+            conditions = []
+            if after is not None:
+                conditions.append("{} >= ?".format(column))
+                parameters.append(to_timestamp(after))
+            if before is not None:
+                conditions.append("{} < ?".format(column))
+                parameters.append(to_timestamp(before))
+            if len(conditions) > 0:
+                selects.append("SELECT cve_id FROM cve_date WHERE " + " AND ".join(conditions))
+        if len(selects) == 0:
+            raise ValueError("At least one criterion is required")
+        return [cve_id for (cve_id,) in self.connection.execute(
+            " INTERSECT ".join(selects) + " ORDER BY cve_id", parameters)]
+
+    def find_by_attributes(self, **criteria):
+        """
+        :param criteria: - Keyword arguments of find_ids_by_attributes
+        :return: (list) - Matching CVE records sorted by ID
+        """
+        return self.get_cve_records_by_ids(self.find_ids_by_attributes(**criteria))
+
+    def find_many(self, queries):
+        """
+        Answer a whole inventory; every distinct query runs once, there are
+        no round trips to save with a local database
+        :return: (dict) - results: {(component, version): list of CVEs}, stats
+        """
+        start_time = time.time()
+        unique_queries = list(dict.fromkeys((component, version) for component, version in queries))
+        results = dict()
+        for component, version in unique_queries:
+            results[(component, version)] = self.find_by_component_and_version(component, version)
+        return dict(
+            results=results,
+            stats=dict(
+                queries=len(queries),
+                unique_queries=len(unique_queries),
+                cves=len(set(one_component["id"] for found in results.values() for one_component in found)),
+                round_trips=0,
+                time_delta=time.time() - start_time
+            )
+        )
+
+    def is_feed_indexed(self, source, digest):
+        if digest is None:
+            return False
+        row = self.connection.execute("SELECT digest FROM feed WHERE source = ?", (source,)).fetchone()
+        return row is not None and row[0] == digest
+
+    def mark_feed_indexed(self, source, digest):
+        if digest is None:
+            return
+        self.connection.execute("INSERT OR REPLACE INTO feed (source, digest) VALUES (?, ?)", (source, digest))
+
+    def discard_feed(self, feed):
+        # A cached copy that failed to parse must not be revalidated as unchanged
+        if self.feed_cache is not None and feed["digest"] is not None:
+            self.feed_cache.discard(feed["source"])
+
+    def fetch_feeds(self, sources):
+        """
+        Bring feeds into the local feed cache, downloads run concurrently
+        :param sources: (list) - Feed URLs
+        :return: (list) - dict(source, path, digest, status) per source; path
+        is None if this version of the feed is already indexed
+        """
+        if self.feed_cache is None:
+            return [dict(source=source, path=source, digest=None, status="uncached") for source in sources]
+        concurrency = self.SETTINGS.get("pipeline_fetch_concurrency", 4)
+        with ThreadPoolExecutor(max_workers=max(min(concurrency, len(sources)), 1)) as executor:
+            entries = list(executor.map(self.feed_cache.fetch, sources))
+        # The connection stays in this thread
+        fetched = []
+        for source, entry in zip(sources, entries):
+            if entry["status"] == "error":
+                print("Can not cache {}: {}".format(source, entry["error"]))
+                fetched.append(dict(source=source, path=source, digest=None, status="error"))
+            elif self.is_feed_indexed(source, entry["digest"]):
+                fetched.append(dict(source=source, path=None, digest=entry["digest"], status="indexed"))
+            else:
+                fetched.append(dict(source=source, path=entry["path"], digest=entry["digest"], status=entry["status"]))
+        return fetched
+
+    def download_and_parse_cve_file(self, source):
+        """
+        :return: (tuple) - (parsed items, response), (None, error) on failure
+        """
+        if self.SETTINGS.get("stream_feeds", False):
+            items, response = stream_cve_file(source)
+        else:
+            items, response = download_cve_file(source)
+        if items is None:
+            print("Can not download {}: {}".format(source, response))
+            return None, response
+        if self.SETTINGS.get("stream_feeds", False):
+            return iter_parse_cve_file(items), response
+        return parse_cve_file(items), response
+
+    def index_feed(self, feed, changes):
+        """
+        Index one fetched feed in a single transaction
+        :return: (tuple) - (number of CPE strings seen, None), (0, error) if
+        the feed could not be downloaded or read; nothing of it is kept then
+        """
+        parsed, error = self.download_and_parse_cve_file(feed["path"])
+        if parsed is not None:
+            feed_changes = empty_changes()
+            try:
+                with self.connection:
+                    count = self.update_items_in_cache_index(parsed, changes=feed_changes)
+                    self.mark_feed_indexed(feed["source"], feed["digest"])
+            except FEED_READ_ERRORS as read_error:
+                print("Can not read {}: {}".format(feed["path"], read_error))
+                error = "Read error: {}".format(read_error)
+            else:
+                for kind, value in feed_changes.items():
+                    changes[kind] += value
+                return count, None
+        self.discard_feed(feed)
+        return 0, error
+
+    def update_from_feed(self, kind, source):
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        start_time = time.time()
+        changes = empty_changes()
+        feed = self.fetch_feeds([source])[0]
+        if feed["path"] is None:
+            result["time_delta"] = time.time() - start_time
+            result["skipped"] = [kind]
+            result["changes"] = changes
+            result["message"] = "Feed of {} items is unchanged, skip it".format(kind)
+            return result
+
+        count, error = self.index_feed(feed, changes)
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["skipped"] = []
+        result["changes"] = changes
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} {} items at {} sec. CVEs: {} new, {} changed, {} unchanged, {} skipped".format(
+            count,
+            kind,
+            time_delta,
+            changes["new"],
+            changes["changed"],
+            changes["unchanged"],
+            changes["skipped"]
+        )
+        return self.add_failed_feeds(result, [(kind, error)] if error is not None else [])
+
+    def get_index_layout(self):
+        row = self.connection.execute("SELECT value FROM index_meta WHERE name = 'layout'").fetchone()
+        return row[0] if row is not None else None
+
+    def set_index_layout(self, layout):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO index_meta (name, value) VALUES ('layout', ?)", (layout,))
+
+    def index_layout_changed(self):
+        """
+        Compare the key layout the index was built with to the one of the
+        settings. An empty index records the current layout, one built
+        before layouts were recorded counts as LEGACY_INDEX_LAYOUT
+        :return: (bool) - True if the index has to be rebuilt
+        """
+        layout = self.component_names.layout()
+        stored = self.get_index_layout()
+        if stored is not None:
+            return stored != layout
+        if self.connection.execute("SELECT 1 FROM cve LIMIT 1").fetchone() is not None:
+            stored = LEGACY_INDEX_LAYOUT
+        else:
+            stored = layout
+        if stored == layout:
+            self.set_index_layout(layout)
+        return stored != layout
+
+    def action_rebuild_index_for_layout(self):
+        """
+        Index all year feeds again after the key layout changed. The feed
+        digests and change detection states of the old index would skip
+        every unchanged feed and CVE, so all index tables are emptied first
+        """
+        previous = self.get_index_layout() or LEGACY_INDEX_LAYOUT
+        with self.connection:
+            for table in INDEX_TABLES:
+                self.connection.execute("DELETE FROM {}".format(table))
+            self.connection.execute("DELETE FROM index_meta WHERE name = 'layout'")
+        result = self.action_populate_cve()
+        result["layout"] = dict(previous=previous, current=self.component_names.layout())
+        result["message"] = "Index layout changed from {} to {}, rebuilt. {}".format(
+            previous, self.component_names.layout(), result["message"])
+        return result
+
+    @with_ingest_metrics
+    def action_update_cve_modified(self):
+        if self.index_layout_changed():
+            print(self.action_rebuild_index_for_layout()["message"])
+        return self.update_from_feed("modified", self.SETTINGS["sources"]["cve_modified"])
+
+    @with_ingest_metrics
+    def action_update_cve_recent(self):
+        if self.index_layout_changed():
+            print(self.action_rebuild_index_for_layout()["message"])
+        return self.update_from_feed("recent", self.SETTINGS["sources"]["cve_recent"])
+
+    @with_ingest_metrics
+    def action_populate_cve(self):
+        if self.index_layout_changed():
+            return self.action_rebuild_index_for_layout()
+        result = dict(
+            count=0,
+            time_delta=0,
+            message=""
+        )
+        count = 0
+        years = []
+        skipped = []
+        failed = []
+        changes = empty_changes()
+        start_time = time.time()
+
+        all_years = list(range(self.SETTINGS["start_year"], datetime.now().year + 1))
+        fetched = self.fetch_feeds([
+            self.SETTINGS["sources"]["cve_base"] + str(year) + self.SETTINGS["sources"]["cve_base_postfix"]
+            for year in all_years])
+        for year, feed in zip(all_years, fetched):
+            if feed["path"] is None:
+                skipped.append(year)
+                print("CVE-{} is unchanged, skip it".format(year))
+                continue
+            year_start_time = time.time()
+            year_count, error = self.index_feed(feed, changes)
+            if error is not None:
+                failed.append((year, error))
+                continue
+            count += year_count
+            years.append(dict(
+                year=year,
+                count=year_count,
+                time_delta=time.time() - year_start_time
+            ))
+            print("Populate CVE-{} takes {} sec.".format(year, time.time() - year_start_time))
+
+        time_delta = time.time() - start_time
+
+        result["count"] = count
+        result["time_delta"] = time_delta
+        result["years"] = years
+        result["skipped"] = skipped
+        result["changes"] = changes
+        result["cpe_cache"] = cpe_cache_stats()
+        result["message"] = "Complete process {} populated items at {} sec.".format(
+            count,
+            time_delta
+        )
+        return self.add_failed_feeds(result, failed)
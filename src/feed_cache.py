@@ -0,0 +1,195 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import urllib.error
+import urllib.request as req
+
+# Compressed feed suffixes that have a .meta companion on the NVD site
+FEED_SUFFIXES = (".json.gz", ".json.zip")
+
+# Bytes copied from the response to the cache file per step
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def meta_url_for(source):
+    """
+    https://.../nvdcve-1.0-2017.json.gz -> https://.../nvdcve-1.0-2017.meta
+    :return: (str) - URL of the .meta file, None if the source has none
+    """
+    for suffix in FEED_SUFFIXES:
+        if source.endswith(suffix):
+            return source[:-len(suffix)] + ".meta"
+    return None
+
+
+def parse_meta(text):
+    """
+    Parse an NVD .meta file:
+        lastModifiedDate:2018-04-01T03:03:30-04:00
+        size:4823487
+        sha256:0F3E...
+    :return: (dict)
+    """
+    meta = dict()
+    for line in text.splitlines():
+        key, separator, value = line.partition(":")
+        if separator:
+            meta[key.strip()] = value.strip()
+    return meta
+
+
+class HashingReader(object):
+    """
+    File-like wrapper that hashes what is read through it
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.sha256.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+class FeedCache(object):
+    """
+    On-disk cache of downloaded feeds, keyed by URL. Freshness is checked
+    with the NVD .meta companion (sha256 and lastModifiedDate); feeds
+    without one are revalidated with ETag / If-Modified-Since.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_name(self, source):
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+    def payload_path(self, source):
+        # Keep the original file name: the extension tells how to unpack it
+        basename = source.rstrip("/").rsplit("/", 1)[-1]
+        return os.path.join(self.directory, "{}-{}".format(self.entry_name(source), basename))
+
+    def entry_path(self, source):
+        return os.path.join(self.directory, "{}.json".format(self.entry_name(source)))
+
+    def load_entry(self, source):
+        try:
+            with open(self.entry_path(source)) as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_entry(self, source, entry):
+        self.write_atomic(self.entry_path(source), json.dumps(entry).encode("utf-8"))
+
+    def discard(self, source):
+        """
+        Drop the cached copy of a feed that could not be parsed, so the next
+        fetch downloads it again instead of revalidating it
+        """
+        for path in (self.entry_path(source), self.payload_path(source)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write_atomic(self, path, data):
+        self.copy_atomic(path, io.BytesIO(data))
+
+    def copy_atomic(self, path, stream):
+        """
+        Copy a stream to path in chunks, replacing path only once complete
+        :return: (str) - Hex sha256 of the copied bytes
+        """
+        digest = HashingReader(stream)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                shutil.copyfileobj(digest, temp_file, COPY_CHUNK_SIZE)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digest.hexdigest()
+
+    @staticmethod
+    def fetch_meta(source):
+        meta_url = meta_url_for(source)
+        if meta_url is None:
+            return None
+        try:
+            response = req.urlopen(meta_url)
+            try:
+                meta = parse_meta(response.read().decode("utf-8"))
+            finally:
+                response.close()
+        except Exception:
+            return None
+        if "sha256" not in meta:
+            return None
+        return meta
+
+    def fetch(self, source):
+        """
+        Make sure the cache holds the current version of the feed
+        :param source: (str) - Feed URL
+        :return: (dict) - status (new, changed, unchanged or error), path of
+        the cached file, digest of its content and error message
+        """
+        entry = self.load_entry(source)
+        path = self.payload_path(source)
+        cached = len(entry) > 0 and os.path.isfile(path)
+        meta = self.fetch_meta(source)
+
+        if cached and meta is not None \
+                and entry.get("sha256") == meta["sha256"] \
+                and entry.get("lastModifiedDate") == meta.get("lastModifiedDate"):
+            return dict(status="unchanged", path=path, digest=entry["digest"], error=None)
+
+        headers = dict()
+        if cached and meta is None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = req.urlopen(req.Request(source, headers=headers))
+        except urllib.error.HTTPError as ex:
+            if ex.code == 304 and cached:
+                return dict(status="unchanged", path=path, digest=entry["digest"], error=None)
+            return dict(status="error", path=None, digest=None, error=str(ex))
+        except Exception as ex:
+            return dict(status="error", path=None, digest=None, error=str(ex))
+        try:
+            info = response.info()
+            payload_sha256 = self.copy_atomic(path, response)
+        except Exception as ex:
+            return dict(status="error", path=None, digest=None, error=str(ex))
+        finally:
+            response.close()
+
+        if meta is not None:
+            digest = "sha256:" + meta["sha256"].lower()
+        else:
+            digest = "payload-sha256:" + payload_sha256
+        self.save_entry(source, dict(
+            url=source,
+            etag=info.get("ETag"),
+            last_modified=info.get("Last-Modified"),
+            content_type=info.get("Content-Type"),
+            sha256=meta["sha256"] if meta is not None else None,
+            lastModifiedDate=meta.get("lastModifiedDate") if meta is not None else None,
+            digest=digest
+        ))
+        status = "changed" if len(entry) > 0 else "new"
+        if entry.get("digest") == digest:
+            status = "unchanged"
+        return dict(status=status, path=path, digest=digest, error=None)
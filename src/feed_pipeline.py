@@ -0,0 +1,206 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from index_mutations import make_index_mutation, empty_changes
+from utils import download_raw_file, unpack_payload, stream_cve_file, iter_cve_items, make_cve_record, \
+    FEED_READ_ERRORS
+
+# Marks the end of the stream in a stage queue
+END_OF_STREAM = None
+
+
+class StageTimer(object):
+    """
+    Busy time of one pipeline stage, summed over its workers
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.busy = 0.0
+        self.calls = 0
+
+    def add(self, seconds):
+        with self.lock:
+            self.busy += seconds
+            self.calls += 1
+
+    def stats(self):
+        return dict(busy_time=self.busy, calls=self.calls)
+
+
+class FeedPipeline(object):
+    """
+    Overlapped ingest of several feeds:
+
+        fetch (feed cache, open the feed) -> parse (unpack, CVEItem, CPE
+            routing) -> write (new and changed CVEs through the batch writer)
+
+    Stages are connected by bounded queues, so a slow stage holds back the
+    faster ones instead of letting data pile up in memory. The total wall
+    time approaches the time of the slowest stage instead of their sum.
+    With stream_feeds the fetch stage only opens the feed and the parse
+    stage reads it while it decompresses, so at most one chunk of a feed
+    is in memory; otherwise every feed is downloaded whole first.
+    """
+
+    def __init__(self, engine, fetch_concurrency=4, queue_size=4, batch_items=500, stream_feeds=True):
+        """
+        :param engine: (SearchEngineRedis) - Index to write into
+        :param fetch_concurrency: (int) - Parallel downloads
+        :param queue_size: (int) - Capacity of each queue between stages
+        :param batch_items: (int) - CVEs per batch handed to the writer
+        :param stream_feeds: (bool) - Parse feeds from the open response
+        """
+        self.engine = engine
+        self.fetch_concurrency = max(int(fetch_concurrency), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.batch_items = max(int(batch_items), 1)
+        self.stream_feeds = stream_feeds
+
+    def open_feed(self, path):
+        """
+        :return: (tuple) - (generator of CVE_Items, None), (None, error) on failure
+        """
+        if self.stream_feeds:
+            items, response = stream_cve_file(path)
+            return items, None if items is not None else response
+        payload, content_type = download_raw_file(path)
+        if payload is None:
+            return None, content_type
+        return iter_cve_items(unpack_payload(payload, content_type)), None
+
+    def run(self, sources):
+        """
+        :param sources: (list) - (label, url) pairs; label is reported back
+        :return: (dict) - count, time_delta, per feed counts (feeds already
+        indexed in their current version are skipped), stage timings
+        """
+        return asyncio.run(self.run_async(sources))
+
+    async def run_async(self, sources):
+        loop = asyncio.get_running_loop()
+        fetched = asyncio.Queue(maxsize=self.queue_size)
+        batches = asyncio.Queue(maxsize=self.queue_size)
+        timers = dict(fetch=StageTimer(), parse=StageTimer(), write=StageTimer())
+        feeds = dict((label, dict(label=label, count=0, items=0, error=None, skipped=False))
+                     for label, source in sources)
+        digests = dict()
+        changes = empty_changes()
+        writer = self.engine.create_batch_writer()
+
+        # Downloads wait on the network and parse/write hold the GIL only
+        # while they compute, so threads are enough to overlap the stages
+        io_executor = ThreadPoolExecutor(max_workers=self.fetch_concurrency)
+        parse_executor = ThreadPoolExecutor(max_workers=1)
+        write_executor = ThreadPoolExecutor(max_workers=1)
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def fetch(label, source):
+            async with semaphore:
+                start = time.time()
+                # Goes through the local feed cache if the engine has one
+                feed = await loop.run_in_executor(io_executor, self.engine.fetch_feed, source)
+                if feed["path"] is None:
+                    timers["fetch"].add(time.time() - start)
+                    feeds[label]["skipped"] = True
+                    return
+                digests[label] = feed["digest"]
+                items, error = await loop.run_in_executor(io_executor, self.open_feed, feed["path"])
+                timers["fetch"].add(time.time() - start)
+            if items is None:
+                feeds[label]["error"] = error
+                print("Can not download {}: {}".format(source, error))
+                return
+            await fetched.put((label, items))
+
+        async def fetch_all():
+            try:
+                await asyncio.gather(*[fetch(label, source) for label, source in sources])
+            finally:
+                await fetched.put(END_OF_STREAM)
+
+        def put_batch(batch):
+            # Called from the parse thread; blocks while the write queue is full
+            asyncio.run_coroutine_threadsafe(batches.put(batch), loop).result()
+
+        def parse(label, items):
+            start = time.time()
+            mutations = []
+            cpe_count = 0
+            try:
+                for item in items:
+                    mutation, count = make_index_mutation(
+                        make_cve_record(item), self.engine.codec_name, self.engine.component_names)
+                    mutations.append(mutation)
+                    cpe_count += count
+                    if len(mutations) >= self.batch_items:
+                        timers["parse"].add(time.time() - start)
+                        put_batch((label, mutations, cpe_count))
+                        start = time.time()
+                        mutations = []
+                        cpe_count = 0
+            except FEED_READ_ERRORS as read_error:
+                # Batches already queued are complete CVEs; the feed is not
+                # marked as indexed, so the next run reads all of it again
+                feeds[label]["error"] = "Read error: {}".format(read_error)
+                print("Can not read {}: {}".format(label, read_error))
+            finally:
+                # Closes the response if the feed was not read to the end
+                items.close()
+            timers["parse"].add(time.time() - start)
+            if len(mutations) > 0:
+                put_batch((label, mutations, cpe_count))
+
+        async def parse_all():
+            try:
+                while True:
+                    feed = await fetched.get()
+                    if feed is END_OF_STREAM:
+                        break
+                    await loop.run_in_executor(parse_executor, parse, *feed)
+            finally:
+                await batches.put(END_OF_STREAM)
+
+        def write(label, mutations, cpe_count):
+            start = time.time()
+            self.engine.apply_changed_index_mutations(mutations, cache=writer, changes=changes)
+            writer.flush()
+            feeds[label]["count"] += cpe_count
+            feeds[label]["items"] += len(mutations)
+            timers["write"].add(time.time() - start)
+
+        async def write_all():
+            while True:
+                batch = await batches.get()
+                if batch is END_OF_STREAM:
+                    break
+                await loop.run_in_executor(write_executor, write, *batch)
+
+        start_time = time.time()
+        try:
+            await asyncio.gather(fetch_all(), parse_all(), write_all())
+        finally:
+            io_executor.shutdown(wait=False)
+            parse_executor.shutdown(wait=False)
+            write_executor.shutdown(wait=False)
+        # A feed counts as indexed only after all of its batches are written;
+        # the cached copy of a failed one is downloaded again next time
+        for label, source in sources:
+            if label not in digests:
+                continue
+            if feeds[label]["error"] is None:
+                self.engine.mark_feed_indexed(source, digests[label])
+            else:
+                self.engine.discard_feed(dict(source=source, digest=digests[label]))
+        time_delta = time.time() - start_time
+
+        return dict(
+            count=sum(feed["count"] for feed in feeds.values()),
+            time_delta=time_delta,
+            feeds=[feeds[label] for label, source in sources],
+            changes=changes,
+            stages=dict((name, timer.stats()) for name, timer in timers.items()),
+            writes=writer.stats()
+        )
@@ -0,0 +1,295 @@
+import re
+import json
+import time
+import hashlib
+import string
+import urllib.parse
+from datetime import datetime, timezone
+
+from dateutil.parser import parse as parse_datetime
+
+from cve_codec import encode_value
+from cpe_parser import extract_component_and_version, cpe_cache_stats, cpe_cache_delta
+from version_key import version_sort_key
+from text_index import description_terms
+from metrics import INGEST_METRICS
+from utils import download_cve_file, parse_cve_file, stream_cve_file, iter_parse_cve_file, FEED_READ_ERRORS
+
+# Fields that describe one index mapping, not the CVE itself
+MAPPING_FIELDS = ("component", "version", "version_key")
+
+# Outcomes of change detection, in the order they are reported
+CHANGE_KINDS = ("new", "changed", "unchanged", "skipped")
+
+
+def verify_component_and_version(item_to_verify, only_digits__and_dot_in_version=False):
+    if item_to_verify["version"] is not None:
+        if item_to_verify["version"] == "":
+            return None
+        try:
+            item_to_verify["version"] = urllib.parse.unquote(item_to_verify["version"])
+        except:
+            pass
+        try:
+            item_to_verify["component"] = urllib.parse.unquote(item_to_verify["component"])
+        except:
+            pass
+        if only_digits__and_dot_in_version:
+            allow = string.digits + '.' + '(' + ')'
+            item_to_verify["version"] = re.sub('[^%s]' % allow, '', item_to_verify["version"])
+        # Comparable key for range queries, computed once at ingest
+        item_to_verify["version_key"] = version_sort_key(item_to_verify["version"])
+        return item_to_verify
+    return None
+
+
+# Joins vendor and product in the component name of index keys
+COMPONENT_SEPARATOR = ":"
+
+
+def split_component(component):
+    """
+    :param component: (str) - Component name of an index key
+    :return: (tuple) - (vendor, product), vendor None for a bare product
+    """
+    vendor, separator, product = component.partition(COMPONENT_SEPARATOR)
+    if separator == "":
+        return None, component
+    return vendor, product
+
+
+# Layout of indexes built before the layout was recorded: bare product keys
+LEGACY_INDEX_LAYOUT = "product"
+
+
+class ComponentNames(object):
+    """
+    Names index keys by "<vendor>:<product>", so products of different
+    vendors that share a name get keys of their own. Alias tables map the
+    names a vendor or a product was published under to one canonical name,
+    at ingest and for queries:
+        vendor_aliases   {"openssl_project": "openssl"}
+        product_aliases  {"apache:httpd_server": "apache:http_server"}
+    """
+
+    def __init__(self, qualified=True, vendor_aliases=None, product_aliases=None):
+        self.qualified = qualified
+        self.vendor_aliases = dict(vendor_aliases or {})
+        self.product_aliases = dict(product_aliases or {})
+
+    @classmethod
+    def from_settings(cls, SETTINGS):
+        return cls(
+            qualified=SETTINGS.get("vendor_qualified_index", True),
+            vendor_aliases=SETTINGS.get("vendor_aliases"),
+            product_aliases=SETTINGS.get("product_aliases"))
+
+    def qualify(self, vendor, product):
+        """
+        :return: (str) - Canonical component name; the bare product if the
+        vendor is unknown or the index is not vendor-qualified
+        """
+        if not self.qualified or not vendor:
+            return product
+        component = self.vendor_aliases.get(vendor, vendor) + COMPONENT_SEPARATOR + product
+        return self.product_aliases.get(component, component)
+
+    def canonical(self, component):
+        """
+        Canonical name of a queried component, "vendor:product" or a bare product
+        """
+        vendor, product = split_component(component)
+        return self.qualify(vendor, product)
+
+    def layout(self):
+        """
+        :return: (str) - Identifies how index keys are named; an index
+        stored under another layout has to be rebuilt
+        """
+        if not self.qualified:
+            return "product"
+        if not self.vendor_aliases and not self.product_aliases:
+            return "vendor"
+        aliases = json.dumps([sorted(self.vendor_aliases.items()), sorted(self.product_aliases.items())])
+        return "vendor+" + hashlib.sha1(aliases.encode("utf-8")).hexdigest()[:12]
+
+    def is_bare(self, component):
+        # A bare product stands for all of its vendors
+        return self.qualified and split_component(component)[0] is None
+
+
+def extract_index_mappings(record, component_names=None):
+    """
+    Route one CVE record to the index keys it belongs to
+    :param record: (dict) - Record from CVEItem.to_record()
+    :param component_names: (ComponentNames) - Naming of index components,
+    vendor-qualified without aliases by default
+    :return: (tuple) - (list of unique (component, version, version_key),
+    number of CPE strings seen)
+    """
+    if component_names is None:
+        component_names = ComponentNames()
+    mappings = []
+    seen = set()
+    cpe_strings = record["cpe"]["data"]
+    for one_cpe_string in cpe_strings:
+        component_and_version = extract_component_and_version(one_cpe_string)
+        if component_and_version is None:
+            continue
+        result_of_verify = verify_component_and_version(component_and_version)
+        if result_of_verify is None:
+            continue
+        vendor = result_of_verify["vendor"]
+        if vendor:
+            vendor = urllib.parse.unquote(vendor)
+        mapping = (
+            component_names.qualify(vendor, result_of_verify["component"]),
+            result_of_verify["version"],
+            result_of_verify["version_key"]
+        )
+        if mapping not in seen:
+            seen.add(mapping)
+            mappings.append(mapping)
+    return mappings, len(cpe_strings)
+
+
+def to_timestamp(value):
+    """
+    :param value: (str, datetime, int or float) - NVD date string, datetime or epoch seconds
+    :return: (float) - Epoch seconds, naive dates are taken as UTC; NaN if empty
+    """
+    if value is None or value == "":
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, datetime):
+        try:
+            # NVD dates like 2017-05-01T17:29Z, much faster than dateutil
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            value = parse_datetime(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def extract_attributes(record):
+    """
+    Values of the secondary indexes of one CVE
+    :param record: (dict) - Record from CVEItem.to_record() or a decoded CVE body
+    :return: (tuple) - (sorted (field, value) pairs, field is cwe, cvssv2 or
+    cvssv3 (severity); publishedDate and lastModifiedDate in epoch seconds,
+    NaN if missing)
+    """
+    tags = set(("cwe", cwe) for cwe in (record.get("cwe") or {}).get("data", []) if cwe)
+    for field, severity_field in (("cvssv2", "severity"), ("cvssv3", "baseSeverity")):
+        severity = (record.get(field) or {}).get(severity_field)
+        if severity:
+            tags.add((field, severity.upper()))
+    return (
+        tuple(sorted(tags)),
+        to_timestamp(record.get("publishedDate")),
+        to_timestamp(record.get("lastModifiedDate"))
+    )
+
+
+def encode_cve_body(record, codec_name="json"):
+    # The body is stored once per CVE; component and version belong to
+    # the index key and are filled in again on lookup
+    body = dict(record)
+    for field in MAPPING_FIELDS:
+        body.pop(field, None)
+    return encode_value(body, codec_name)
+
+
+def make_index_mutation(record, codec_name="json", component_names=None):
+    """
+    Everything the writer needs to index one CVE, in compact form
+    :return: (tuple) - ((cve_id, lastModifiedDate, encoded body, mappings,
+    description terms, attributes), number of CPE strings seen)
+    """
+    start = time.perf_counter()
+    mappings, cpe_count = extract_index_mappings(record, component_names)
+    INGEST_METRICS.observe("cpe_extraction", time.perf_counter() - start)
+    INGEST_METRICS.increment("mappings", len(mappings))
+    mutation = (
+        record["id"],
+        record["lastModifiedDate"],
+        encode_cve_body(record, codec_name),
+        mappings,
+        description_terms(record.get("description")),
+        extract_attributes(record)
+    )
+    return mutation, cpe_count
+
+
+def make_cve_state(last_modified, body):
+    """
+    What the index remembers about an indexed CVE: its lastModifiedDate
+    and a digest of the encoded body (CPE names included)
+    :return: (str) - "<lastModifiedDate>|<sha1 of body>"
+    """
+    return "{}|{}".format(last_modified or "", hashlib.sha1(body).hexdigest())
+
+
+def classify_change(stored_state, new_state):
+    """
+    :param stored_state: (bytes) - State saved when the CVE was indexed, None if never
+    :param new_state: (str) - make_cve_state() of the incoming version
+    :return: (str) - new, changed, unchanged or skipped (the incoming
+    version is older than the indexed one)
+    """
+    if stored_state is None:
+        return "new"
+    if isinstance(stored_state, bytes):
+        stored_state = stored_state.decode("utf-8")
+    if stored_state == new_state:
+        return "unchanged"
+    stored_modified = stored_state.rpartition("|")[0]
+    new_modified = new_state.rpartition("|")[0]
+    # Dates come from to_record(), all in the same isoformat
+    if stored_modified and new_modified and new_modified < stored_modified:
+        return "skipped"
+    return "changed"
+
+
+def empty_changes():
+    return dict((kind, 0) for kind in CHANGE_KINDS)
+
+
+def prepare_feed_mutations(job):
+    """
+    Worker entry point for parallel populate: download, parse and route a
+    whole feed without touching Redis
+    :param job: (tuple) - (year, source, stream_feeds, codec_name, component_names)
+    :return: (dict) - year, mutations, count, stage timings, the download
+    error (None if the feed was read) and the stage metrics and CPE cache
+    counts of the job, for the parent process to merge
+    """
+    year, source, stream_feeds, codec_name, component_names = job
+    start_time = time.time()
+    metrics_since = INGEST_METRICS.snapshot()
+    cpe_cache_since = cpe_cache_stats()
+    prepared = dict(year=year, mutations=[], count=0, error=None)
+    if stream_feeds:
+        items, response = stream_cve_file(source)
+        parsed = iter_parse_cve_file(items)
+    else:
+        items, response = download_cve_file(source)
+        parsed = parse_cve_file(items)
+    if items is None:
+        prepared["error"] = response
+    else:
+        try:
+            for record in parsed:
+                mutation, cpe_count = make_index_mutation(record, codec_name, component_names)
+                prepared["mutations"].append(mutation)
+                prepared["count"] += cpe_count
+        except FEED_READ_ERRORS as read_error:
+            prepared.update(mutations=[], count=0, error="Read error: {}".format(read_error))
+    prepared.update(
+        prepare_time=time.time() - start_time,
+        metrics=INGEST_METRICS.delta(metrics_since),
+        cpe_cache=cpe_cache_delta(cpe_cache_since)
+    )
+    return prepared
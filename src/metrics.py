@@ -0,0 +1,238 @@
+import os
+import time
+import bisect
+import tempfile
+import threading
+import contextlib
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Ingest stages in pipeline order. Where a feed is streamed from the
+# network, the transfer overlaps with decompression and is counted in gunzip
+STAGES = ("download", "gunzip", "json_parse", "cve_item", "cpe_extraction", "write")
+
+COUNTERS = dict(
+    feeds="Feeds downloaded",
+    bytes="Bytes of feed payloads downloaded whole, streamed feeds are not counted",
+    items="CVE items parsed",
+    mappings="Index mappings extracted from CPE names",
+    write_batches="Batches of index writes sent to the storage",
+    write_commands="Commands or rows in those batches",
+)
+
+# Upper bounds in seconds: per item stages land in the low buckets,
+# downloads and write batches in the high ones
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class StageMetrics(object):
+    """
+    Counters and latency histograms of the ingest stages, shared by all
+    engines of the process. Values only grow, as Prometheus expects; the
+    numbers of one action are the difference to a snapshot() taken before it.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix="cve_ingest"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = dict((name, 0) for name in COUNTERS)
+        # stage -> [observations per bucket, last one is +Inf]
+        self.histograms = dict((stage, [0] * (len(self.buckets) + 1)) for stage in STAGES)
+        self.sums = dict((stage, 0.0) for stage in STAGES)
+
+    def observe(self, stage, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.histograms[stage][index] += 1
+            self.sums[stage] += seconds
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(
+                counters=dict(self.counters),
+                histograms=dict((stage, list(counts)) for stage, counts in self.histograms.items()),
+                sums=dict(self.sums)
+            )
+
+    def delta(self, since):
+        """
+        :param since: (dict) - Earlier snapshot()
+        :return: (dict) - What was recorded after it, in the snapshot() form
+        """
+        current = self.snapshot()
+        return dict(
+            counters=dict((name, current["counters"][name] - since["counters"][name]) for name in COUNTERS),
+            histograms=dict((stage, [now - before for now, before in zip(
+                current["histograms"][stage], since["histograms"][stage])]) for stage in STAGES),
+            sums=dict((stage, current["sums"][stage] - since["sums"][stage]) for stage in STAGES)
+        )
+
+    def merge(self, delta):
+        """
+        Add the delta() of another process, e.g. a populate worker
+        """
+        with self.lock:
+            for name in COUNTERS:
+                self.counters[name] += delta["counters"][name]
+            for stage in STAGES:
+                for index, count in enumerate(delta["histograms"][stage]):
+                    self.histograms[stage][index] += count
+                self.sums[stage] += delta["sums"][stage]
+
+    def estimate_quantile(self, counts, quantile):
+        # Linear interpolation inside the bucket, as histogram_quantile() does
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = quantile * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count > 0 and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self, since=None):
+        """
+        :param since: (dict) - snapshot() to subtract, None for everything
+        since the start of the process
+        :return: (dict) - counters, and per stage: count, total seconds,
+        mean, estimated p50 and p99 in milliseconds
+        """
+        current = self.snapshot()
+        if since is None:
+            since = dict(
+                counters=dict((name, 0) for name in COUNTERS),
+                histograms=dict((stage, [0] * (len(self.buckets) + 1)) for stage in STAGES),
+                sums=dict((stage, 0.0) for stage in STAGES)
+            )
+        stages = dict()
+        for stage in STAGES:
+            counts = [now - before for now, before in zip(current["histograms"][stage], since["histograms"][stage])]
+            count = sum(counts)
+            total = current["sums"][stage] - since["sums"][stage]
+            p50 = self.estimate_quantile(counts, 0.50)
+            p99 = self.estimate_quantile(counts, 0.99)
+            stages[stage] = dict(
+                count=count,
+                total_seconds=total,
+                mean_ms=total / count * 1000 if count else None,
+                p50_ms=p50 * 1000 if p50 is not None else None,
+                p99_ms=p99 * 1000 if p99 is not None else None,
+            )
+        return dict(
+            counters=dict((name, current["counters"][name] - since["counters"][name]) for name in COUNTERS),
+            stages=stages
+        )
+
+    def to_prometheus(self):
+        """
+        :return: (str) - Text exposition format 0.0.4
+        """
+        current = self.snapshot()
+        lines = []
+        for name, description in COUNTERS.items():
+            metric = "{}_{}_total".format(self.prefix, name)
+            lines.append("# HELP {} {}".format(metric, description))
+            lines.append("# TYPE {} counter".format(metric))
+            lines.append("{} {}".format(metric, current["counters"][name]))
+        metric = "{}_stage_seconds".format(self.prefix)
+        lines.append("# HELP {} Latency of one ingest stage step: a feed download, an item, a write batch".format(metric))
+        lines.append("# TYPE {} histogram".format(metric))
+        for stage in STAGES:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), current["histograms"][stage]):
+                cumulative += count
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(metric, stage, bound, cumulative))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(metric, stage, repr(current["sums"][stage])))
+            lines.append('{}_count{{stage="{}"}} {}'.format(metric, stage, cumulative))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write the text format for the node exporter textfile collector,
+        atomically replacing path
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(handle, "w") as metrics_file:
+                metrics_file.write(self.to_prometheus())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# Shared by every engine, like the CPE parse counters
+INGEST_METRICS = StageMetrics()
+
+
+def with_ingest_metrics(action):
+    """
+    Decorator for the ingest actions of an engine: adds the stage summary of
+    the call to the result as "metrics" and, when SETTINGS["metrics_path"]
+    is set, rewrites the Prometheus text file. Nested actions are fine, the
+    outermost call writes last.
+    """
+    @functools.wraps(action)
+    def wrapper(self, *args, **kwargs):
+        since = INGEST_METRICS.snapshot()
+        result = action(self, *args, **kwargs)
+        if isinstance(result, dict):
+            result["metrics"] = INGEST_METRICS.summary(since)
+        metrics_path = self.SETTINGS.get("metrics_path")
+        if metrics_path:
+            INGEST_METRICS.write_prometheus(metrics_path)
+        return result
+    return wrapper
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="", metrics=None):
+    """
+    Serve GET /metrics from a daemon thread
+    :return: (ThreadingHTTPServer) - Call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.metrics = metrics if metrics is not None else INGEST_METRICS
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
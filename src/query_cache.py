@@ -0,0 +1,86 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class QueryCache(object):
+    """
+    Size-bounded LRU cache of query results with a TTL. Every entry belongs
+    to an index generation: once the generation read from Redis moves on,
+    the whole cache is dropped, so results are never older than the last
+    completed update.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        """
+        :param maxsize: (int) - Entries kept, least recently used go first
+        :param ttl: (float) - Seconds an entry lives, 0 - no limit
+        """
+        self.maxsize = max(int(maxsize), 1)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def check_generation(self, generation):
+        # Called with the lock held
+        if generation != self.generation:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.generation = generation
+
+    def get(self, key, generation):
+        """
+        :return: (tuple) - (True, value) on a hit, (False, None) on a miss
+        """
+        with self.lock:
+            self.check_generation(generation)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, generation, value):
+        with self.lock:
+            self.check_generation(generation)
+            expires_at = time.time() + self.ttl if self.ttl else None
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                invalidations=self.invalidations,
+                size=len(self.entries),
+                maxsize=self.maxsize,
+                ttl=self.ttl,
+                generation=self.generation
+            )
@@ -0,0 +1,340 @@
+import os
+import mmap
+import struct
+import fnmatch
+import tempfile
+
+from cve_codec import decode_value
+from version_key import version_sort_key
+from index_mutations import split_component, LEGACY_INDEX_LAYOUT
+from engine_base import SearchEngineBase
+
+# File layout, all integers little endian:
+#
+#   header     MAGIC, key count, CVE count, offsets of the two tables,
+#              (offset, length) of the key layout
+#   data       CVE IDs, encoded bodies, lastModifiedDate strings, index
+#              keys and posting lists, referenced by (offset, length)
+#   CVE table  one CVE_ENTRY per CVE, sorted by ID
+#   key table  one KEY_ENTRY per index key, sorted by key bytes
+#
+# Index keys are "<component>\x00<version>" in UTF-8, so all versions of a
+# component are neighbours. A posting list is an array of uint32 positions
+# in the CVE table. Bodies are copied from Redis as they are stored, in the
+# codec of the exporting engine. The key layout is ComponentNames.layout()
+# of the exporting engine; files of the first version do not record it.
+MAGIC = b"CVESNAP2"
+HEADER = struct.Struct("<8sIIQQQI")
+MAGIC_V1 = b"CVESNAP1"
+HEADER_V1 = struct.Struct("<8sIIQQ")
+CVE_ENTRY = struct.Struct("<QIQIQI")
+KEY_ENTRY = struct.Struct("<QIQI")
+POSTING = struct.Struct("<I")
+
+KEY_SEPARATOR = b"\x00"
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def create_snapshot_key(component, version):
+    return component.encode("utf-8") + KEY_SEPARATOR + version.encode("utf-8")
+
+
+def write_snapshot(path, index, bodies, last_modified=None, layout=""):
+    """
+    Write a snapshot file, atomically replacing path
+    :param path: (str) - Target file
+    :param index: (dict) - (component, version) -> list of CVE IDs
+    :param bodies: (dict) - CVE ID -> encoded body (bytes)
+    :param last_modified: (dict) - CVE ID -> lastModifiedDate (str)
+    :param layout: (str) - Key layout the index was built with
+    :return: (dict) - keys, cves and size of the file in bytes
+    """
+    if last_modified is None:
+        last_modified = {}
+    cve_ids = sorted(bodies)
+    position = dict((cve_id, number) for number, cve_id in enumerate(cve_ids))
+
+    data = bytearray()
+    offset = HEADER.size
+
+    def append(blob):
+        start = offset + len(data)
+        data.extend(blob)
+        return start, len(blob)
+
+    layout_offset, layout_length = append(layout.encode("utf-8"))
+    cve_table = bytearray()
+    for cve_id in cve_ids:
+        id_offset, id_length = append(cve_id.encode("utf-8"))
+        body_offset, body_length = append(bodies[cve_id])
+        date_offset, date_length = append((last_modified.get(cve_id) or "").encode("utf-8"))
+        cve_table += CVE_ENTRY.pack(id_offset, id_length, body_offset, body_length, date_offset, date_length)
+
+    keys = sorted(
+        (create_snapshot_key(component, version), ids)
+        for (component, version), ids in index.items())
+    key_table = bytearray()
+    for key, ids in keys:
+        key_offset, key_length = append(key)
+        postings = sorted(set(position[cve_id] for cve_id in ids if cve_id in position))
+        postings_offset, _ = append(struct.pack("<{}I".format(len(postings)), *postings))
+        key_table += KEY_ENTRY.pack(key_offset, key_length, postings_offset, len(postings))
+
+    cve_table_offset = HEADER.size + len(data)
+    key_table_offset = cve_table_offset + len(cve_table)
+    header = HEADER.pack(
+        MAGIC, len(keys), len(cve_ids), cve_table_offset, key_table_offset, layout_offset, layout_length)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as snapshot_file:
+            snapshot_file.write(header)
+            snapshot_file.write(data)
+            snapshot_file.write(cve_table)
+            snapshot_file.write(key_table)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return dict(
+        keys=len(keys),
+        cves=len(cve_ids),
+        size=key_table_offset + len(key_table)
+    )
+
+
+class SnapshotReader(object):
+    """
+    Read-only index served straight from a memory-mapped snapshot, with
+    the query methods of the Redis engines. Only the pages a query touches
+    are read from disk. Components are queried by their canonical names,
+    aliases are resolved when the index is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.components_by_product = None
+        self.file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise SnapshotError("Empty snapshot file: {}".format(path))
+        magic = self.mm[:len(MAGIC)]
+        header = HEADER_V1 if magic == MAGIC_V1 else HEADER
+        if len(self.mm) < header.size:
+            self.close()
+            raise SnapshotError("Truncated snapshot file: {}".format(path))
+        if magic == MAGIC_V1:
+            _, self.key_count, self.cve_count, self.cve_table_offset, self.key_table_offset = \
+                HEADER_V1.unpack_from(self.mm, 0)
+            self.layout = None
+        elif magic == MAGIC:
+            _, self.key_count, self.cve_count, self.cve_table_offset, self.key_table_offset, \
+                layout_offset, layout_length = HEADER.unpack_from(self.mm, 0)
+            self.layout = self.mm[layout_offset:layout_offset + layout_length].decode("utf-8")
+        else:
+            self.close()
+            raise SnapshotError("Not a snapshot file: {}".format(path))
+        if self.key_table_offset + self.key_count * KEY_ENTRY.size > len(self.mm):
+            self.close()
+            raise SnapshotError("Truncated snapshot file: {}".format(path))
+
+    def close(self):
+        if getattr(self, "mm", None) is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def index_layout(self):
+        """
+        :return: (str) - Key layout the snapshot was exported with. Files of
+        the first version do not record it: vendor-qualified keys tell
+        "vendor", otherwise it is LEGACY_INDEX_LAYOUT
+        """
+        if self.layout is not None:
+            return self.layout
+        for number in range(self.key_count):
+            component = self.read_key(number)[0].partition(KEY_SEPARATOR)[0].decode("utf-8")
+            if split_component(component)[0] is not None:
+                return "vendor"
+        return LEGACY_INDEX_LAYOUT
+
+    def read_key(self, number):
+        key_offset, key_length, postings_offset, postings_count = KEY_ENTRY.unpack_from(
+            self.mm, self.key_table_offset + number * KEY_ENTRY.size)
+        return self.mm[key_offset:key_offset + key_length], postings_offset, postings_count
+
+    def read_postings(self, postings_offset, postings_count):
+        return struct.unpack_from("<{}I".format(postings_count), self.mm, postings_offset)
+
+    def read_cve(self, number):
+        """
+        :return: (tuple) - (CVE ID, encoded body, lastModifiedDate)
+        """
+        id_offset, id_length, body_offset, body_length, date_offset, date_length = CVE_ENTRY.unpack_from(
+            self.mm, self.cve_table_offset + number * CVE_ENTRY.size)
+        return (
+            self.mm[id_offset:id_offset + id_length].decode("utf-8"),
+            self.mm[body_offset:body_offset + body_length],
+            self.mm[date_offset:date_offset + date_length].decode("utf-8")
+        )
+
+    def lower_bound(self, key):
+        # First key table entry >= key
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.read_key(middle)[0] < key:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def iter_keys(self):
+        """
+        :return: (generator) - (component, version, CVE IDs) for every index key
+        """
+        for number in range(self.key_count):
+            key, postings_offset, postings_count = self.read_key(number)
+            component, _, version = key.decode("utf-8").partition("\x00")
+            yield component, version, [
+                self.read_cve(position)[0] for position in self.read_postings(postings_offset, postings_count)]
+
+    def iter_cves(self):
+        """
+        :return: (generator) - (CVE ID, encoded body, lastModifiedDate)
+        """
+        for number in range(self.cve_count):
+            yield self.read_cve(number)
+
+    def resolve_components(self, component):
+        """
+        :return: (list) - The component, or every vendor-qualified component
+        of a bare product; the lookup is built from the key table on first use
+        """
+        if split_component(component)[0] is not None:
+            return [component]
+        if self.components_by_product is None:
+            self.components_by_product = dict()
+            for number in range(self.key_count):
+                one_component = self.read_key(number)[0].partition(KEY_SEPARATOR)[0].decode("utf-8")
+                vendor, product = split_component(one_component)
+                if vendor is not None:
+                    components = self.components_by_product.setdefault(product, [])
+                    if one_component not in components:
+                        components.append(one_component)
+        return self.components_by_product.get(component) or [component]
+
+    def get_postings(self, component, version):
+        key = create_snapshot_key(component, version)
+        number = self.lower_bound(key)
+        if number < self.key_count:
+            found, postings_offset, postings_count = self.read_key(number)
+            if found == key:
+                return self.read_postings(postings_offset, postings_count)
+        return ()
+
+    def get_versions(self, component):
+        prefix = component.encode("utf-8") + KEY_SEPARATOR
+        versions = []
+        number = self.lower_bound(prefix)
+        while number < self.key_count:
+            key = self.read_key(number)[0]
+            if not key.startswith(prefix):
+                break
+            versions.append(key[len(prefix):].decode("utf-8"))
+            number += 1
+        return versions
+
+    def find_versions_by_pattern(self, component, pattern=None):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return SearchEngineBase.merge_component_versions(
+                [self.find_versions_by_pattern(one_component, pattern) for one_component in components])
+        component = components[0]
+        versions = self.get_versions(component)
+        if pattern is not None and pattern != "*":
+            versions = [version for version in versions if fnmatch.fnmatchcase(version, pattern)]
+        return versions
+
+    def find_versions_by_range(self, component, lo=None, hi=None, inclusive=True):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return SearchEngineBase.merge_component_versions(
+                [self.find_versions_by_range(one_component, lo, hi, inclusive) for one_component in components],
+                key=version_sort_key)
+        component = components[0]
+        if isinstance(inclusive, tuple):
+            lo_inclusive, hi_inclusive = inclusive
+        else:
+            lo_inclusive = hi_inclusive = inclusive
+        lo_key = version_sort_key(lo) if lo is not None else None
+        hi_key = version_sort_key(hi) if hi is not None else None
+        versions = []
+        for version_key, version in sorted(
+                (version_sort_key(version), version) for version in self.get_versions(component)):
+            if lo_key is not None and (version_key < lo_key or (version_key == lo_key and not lo_inclusive)):
+                continue
+            if hi_key is not None and (version_key > hi_key or (version_key == hi_key and not hi_inclusive)):
+                continue
+            versions.append(version)
+        return versions
+
+    def find_by_component_and_version(self, component, version):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return SearchEngineBase.merge_component_results(
+                [self.find_by_component_and_version(one_component, version) for one_component in components])
+        component = components[0]
+        if version is None or any(char in version for char in "*?["):
+            return self.find_by_component_and_versions(
+                component, self.find_versions_by_pattern(component, version))
+        list_of_components = []
+        for position in self.get_postings(component, version):
+            one_component = decode_value(self.read_cve(position)[1])
+            one_component["component"] = component
+            one_component["version"] = version
+            list_of_components.append(one_component)
+        return list_of_components
+
+    def find_by_component_and_version_range(self, component, lo=None, hi=None, inclusive=True):
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return SearchEngineBase.merge_component_results(
+                [self.find_by_component_and_version_range(one_component, lo, hi, inclusive)
+                 for one_component in components])
+        component = components[0]
+        return self.find_by_component_and_versions(
+            component, self.find_versions_by_range(component, lo, hi, inclusive))
+
+    def find_by_component_and_versions(self, component, versions):
+        # Each CVE once; "version" is the first matching version
+        components = self.resolve_components(component)
+        if len(components) > 1:
+            return SearchEngineBase.merge_component_results(
+                [self.find_by_component_and_versions(one_component, versions) for one_component in components])
+        component = components[0]
+        matched_versions = dict()
+        for version in versions:
+            for position in self.get_postings(component, version):
+                matched_versions.setdefault(position, []).append(version)
+        list_of_components = []
+        for position in sorted(matched_versions):
+            one_component = decode_value(self.read_cve(position)[1])
+            one_component["component"] = component
+            one_component["version"] = matched_versions[position][0]
+            one_component["matched_versions"] = matched_versions[position]
+            list_of_components.append(one_component)
+        return list_of_components
@@ -0,0 +1,85 @@
+import re
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words too common to be worth a posting list. Queries may still contain
+# them: they are checked against the description text instead.
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with", "via",
+))
+
+
+def tokenize(text):
+    """
+    :param text: (str) - Description
+    :return: (list) - Lower case alphanumeric tokens in text order
+    """
+    if not text:
+        return []
+    return TOKEN.findall(text.lower())
+
+
+def is_indexed_term(token):
+    return len(token) > 1 and token not in STOP_WORDS
+
+
+def description_terms(text):
+    """
+    :return: (tuple) - Sorted unique terms that get a posting list
+    """
+    return tuple(sorted(set(token for token in tokenize(text) if is_indexed_term(token))))
+
+
+def parse_text_query(query):
+    """
+    Parse a keyword query:
+        heap overflow             all words
+        "heap overflow" libpng    phrase and word
+        xss OR "cross site"       either side
+    :return: (list) - Clauses joined by OR; a clause is a list of phrases
+    that must all match, a phrase is a tuple of tokens
+    """
+    clauses = [[]]
+    for quoted, bare in re.findall(r'"([^"]*)"|(\S+)', query):
+        if bare == "OR":
+            clauses.append([])
+            continue
+        # "heap-based" is the phrase (heap, based), as in the text
+        phrase = tuple(tokenize(quoted or bare))
+        if len(phrase) > 0:
+            clauses[-1].append(phrase)
+    return [clause for clause in clauses if len(clause) > 0]
+
+
+def clause_terms(clause):
+    """
+    :return: (list) - Indexed terms of the clause, for the posting list
+    intersection; empty if the clause has only stop words
+    """
+    return sorted(set(token for phrase in clause for token in phrase if is_indexed_term(token)))
+
+
+def needs_text_check(clause):
+    """
+    :return: (bool) - True if the posting lists alone can not decide the
+    clause: it has a phrase of several words or a word without a posting list
+    """
+    return any(len(phrase) > 1 or not is_indexed_term(phrase[0]) for phrase in clause)
+
+
+def contains_phrase(tokens, phrase):
+    if len(phrase) == 1:
+        return phrase[0] in tokens
+    first = phrase[0]
+    for position in range(len(tokens) - len(phrase) + 1):
+        if tokens[position] == first and tuple(tokens[position:position + len(phrase)]) == phrase:
+            return True
+    return False
+
+
+def match_clause(tokens, clause):
+    """
+    :param tokens: (list) - tokenize() of the description
+    """
+    return all(contains_phrase(tokens, phrase) for phrase in clause)
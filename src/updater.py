@@ -3,6 +3,8 @@ import time
 
 from engine_hash import SearchEngineHashes
 from engine_stack import SearchEngineStacks
+from engine_sqlite import SearchEngineSQLite
+from metrics import serve_metrics
 
 ##############################################################################
 
@@ -20,18 +22,109 @@ SETTINGS = dict(
         d2sec="http://www.d2sec.com/exploits/elliot.xml",
         npm="https://api.nodesecurity.io/advisories",
     ),
+    # Storage backend: hashes, stacks (Redis) or sqlite
+    engine="hashes",
+    sqlite_path="cve_index.sqlite",
     cache_for_indexer = dict(
         host="localhost",
         port=6379,
         db=2
     ),
     collection_for_index="indexer::",
+    collection_for_cve="cve::",
+    collection_for_versions="versions::",
+    collection_for_version_order="version_order::",
+    collection_for_feeds="feeds::",
+    collection_for_text="text::",
+    collection_for_products="products::",
+    collection_for_cwe="cwe::",
+    collection_for_severity="severity::",
+    collection_for_published="published_dates",
+    collection_for_modified="modified_dates",
+    collection_for_temporary="tmp::",
+    collection_for_cve_state="cve_state",
+    collection_for_generation="index_generation",
+    collection_for_index_pointer="index_pointer",
+    collection_for_namespace_counter="index_namespace_counter",
+    collection_for_retired_namespaces="index_retired_namespaces",
+    # Naming of the index keys (vendor_qualified_index and aliases) the
+    # index was built with; the next action_* rebuilds it when they change
+    collection_for_layout="index_layout",
     start_year=2002,
+    # Index keys name components "vendor:product"; queries by a bare product
+    # cover all of its vendors. Aliases map alternative names to one vendor
+    # ({"openssl_project": "openssl"}) or product ({"vendor:old": "vendor:new"})
+    vendor_qualified_index=True,
+    vendor_aliases=dict(),
+    product_aliases=dict(),
+    # Decompress and parse feeds incrementally instead of buffering whole files
+    stream_feeds=True,
+    # Index writes are buffered and sent through Redis pipelines
+    batch_size=1000,
+    batch_transaction=False,
+    # Storage format of CVE records: json, binary, binary_zlib or json_zlib
+    codec="json",
+    # Entries in the LRU cache of parsed CPE names
+    cpe_cache_size=65536,
+    # Processes that parse year feeds in action_populate_cve, 1 - sequential
+    populate_workers=1,
+    # Overlap download, parse and index writes of the action_* methods
+    ingest_pipeline=True,
+    pipeline_fetch_concurrency=4,
+    pipeline_queue_size=4,
+    pipeline_batch_items=500,
+    # Downloaded feeds are kept here and revalidated with .meta files or
+    # ETag, feeds that did not change are not indexed again. None disables
+    feed_cache_dir="feed_cache",
+    # Index only CVEs whose lastModifiedDate or content changed since the
+    # last run. Disable to force a full reindex
+    change_detection=True,
+    # Inverted index of description words for search_descriptions
+    text_index=True,
+    # CWE and severity sets plus published/modified sorted sets for
+    # find_ids_by_attributes
+    secondary_indexes=True,
+    # In-process cache of find_by_component_and_version results, dropped
+    # whenever an action_* method commits an update. 0 disables
+    query_cache_size=1024,
+    query_cache_ttl=300,
+    # action_populate_cve rebuilds everything in a new namespace and switches
+    # readers to it when done; the old one is deleted in the background in
+    # small batches. Off: populate updates the live index in place
+    shadow_rebuild=False,
+    shadow_gc_background=True,
+    shadow_gc_delay=5,
+    shadow_gc_batch=500,
+    shadow_gc_pause=0.01,
+    # File written by action_export_snapshot and read by action_import_snapshot
+    snapshot_path="cve_index.snapshot",
+    # Per stage timings of the ingest actions: Prometheus text file rewritten
+    # after every action (node exporter textfile collector) and an HTTP
+    # /metrics endpoint started by main(). None disables either
+    metrics_path=None,
+    metrics_port=None,
 
 )
 
 ##############################################################################
 
+ENGINES = dict(
+    hashes=SearchEngineHashes,
+    stacks=SearchEngineStacks,
+    sqlite=SearchEngineSQLite,
+)
+
+
+def create_search_engine(SETTINGS):
+    try:
+        engine_class = ENGINES[SETTINGS.get("engine", "hashes")]
+    except KeyError:
+        raise ValueError("Unknown engine: {}. Available: {}".format(
+            SETTINGS.get("engine"), ", ".join(sorted(ENGINES))))
+    return engine_class(SETTINGS=SETTINGS)
+
+##############################################################################
+
 def print_as_list(to_print):
     for element in list(to_print):
         print(element)
@@ -67,7 +160,10 @@ def main():
 
     start_global = time.time()
 
-    engine_stacks = SearchEngineHashes(SETTINGS=SETTINGS)
+    if SETTINGS.get("metrics_port") is not None:
+        serve_metrics(SETTINGS["metrics_port"])
+
+    engine_stacks = create_search_engine(SETTINGS)
 
     print(engine_stacks.action_populate_cve()["message"])
     print(engine_stacks.action_update_cve_modified()["message"])
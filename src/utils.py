@@ -1,4 +1,8 @@
+import io
+import os
 import json
+import time
+import http.client
 import urllib.request as req
 import zipfile
 from io import BytesIO
@@ -9,18 +13,130 @@ from dateutil.parser import parse as parse_datetime
 
 
 from cve_item import CVEItem
+from metrics import INGEST_METRICS
+
+# Raised while a streamed feed is read: invalid or truncated JSON, corrupt
+# or truncated archive, connection lost
+FEED_READ_ERRORS = (ValueError, OSError, EOFError, http.client.HTTPException)
 
 
 def download_cve_file(source):
-    file_stream, response_info = get_file(source)
+    """
+    :param source: (str) - Feed URL or path of a file in the local feed cache
+    :return: (tuple) - (list of CVE_Items, response), (None, error) if the
+    feed could not be downloaded or parsed
+    """
+    with INGEST_METRICS.time("download"):
+        file_stream, response_info = get_file(source)
+    if file_stream is None:
+        return None, response_info
     try:
-        result = json.load(file_stream)
+        with INGEST_METRICS.time("gunzip"):
+            text = file_stream.read()
+        INGEST_METRICS.increment("feeds")
+        with INGEST_METRICS.time("json_parse"):
+            result = json.loads(text)
         if "CVE_Items" in result:
             return result["CVE_Items"], response_info
-        return None
+        return None, "No CVE_Items in {}".format(source)
     except json.JSONDecodeError as json_error:
         print('Get an JSON decode error: {}'.format(json_error))
-        return None
+        return None, "JSON decode error: {}".format(json_error)
+    except FEED_READ_ERRORS as read_error:
+        # Truncated or corrupt archive
+        return None, "Read error: {}".format(read_error)
+
+
+def stream_cve_file(source, chunk_size=65536):
+    """
+    Streaming counterpart of download_cve_file: the feed is decompressed
+    straight from the socket and CVE_Items are yielded one by one
+    :param source: (str) - Feed URL
+    :param chunk_size: (int) - Characters read from the stream per step
+    :return: (generator, response) - (None, error) if download failed
+    """
+    # Only the response headers: the body is read while it is parsed
+    with INGEST_METRICS.time("download"):
+        file_stream, response_info = get_file(source, stream=True)
+    if file_stream is None:
+        return None, response_info
+    INGEST_METRICS.increment("feeds")
+    return iter_cve_items(file_stream, chunk_size=chunk_size, response=response_info), response_info
+
+
+def iter_cve_items(file_stream, chunk_size=65536, response=None):
+    """
+    Incremental parser for the "CVE_Items" array of an NVD JSON feed.
+    Only the current item (and one chunk of text) is held in memory.
+    :param file_stream: (file) - Binary or text stream with the feed
+    :param chunk_size: (int) - Characters read from the stream per step
+    :param response: (HTTPResponse) - Closed when the stream is exhausted
+    :raise ValueError: if the feed has no CVE_Items or ends inside them
+    """
+    decoder = json.JSONDecoder()
+    if isinstance(file_stream, io.TextIOBase):
+        text_stream = file_stream
+    else:
+        text_stream = io.TextIOWrapper(file_stream, encoding="utf-8")
+    buf = ""
+    pos = 0
+    eof = False
+    want = chunk_size
+
+    def read_more(size):
+        # Decompression and decoding happen in read()
+        start = time.perf_counter()
+        chunk = text_stream.read(size)
+        INGEST_METRICS.observe("gunzip", time.perf_counter() - start)
+        return chunk, chunk == ""
+
+    try:
+        # Skip the feed header up to the opening bracket of CVE_Items
+        while True:
+            start = buf.find('"CVE_Items"')
+            if start != -1:
+                bracket = buf.find("[", start)
+                if bracket != -1:
+                    pos = bracket + 1
+                    break
+            if eof:
+                raise ValueError("No CVE_Items in feed")
+            chunk, eof = read_more(chunk_size)
+            buf += chunk
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError("Feed ends inside CVE_Items")
+                chunk, eof = read_more(chunk_size)
+                buf = chunk
+                pos = 0
+                continue
+            if buf[pos] == "]":
+                return
+            start = time.perf_counter()
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("JSON decode error in stream at position {}".format(pos))
+                # Item is split across chunks - grow the read size so that
+                # very large items do not get re-parsed over and over
+                chunk, eof = read_more(want)
+                buf = buf[pos:] + chunk
+                pos = 0
+                want *= 2
+                continue
+            INGEST_METRICS.observe("json_parse", time.perf_counter() - start)
+            want = chunk_size
+            pos = end
+            yield item
+    finally:
+        text_stream.close()
+        if response is not None and hasattr(response, "close"):
+            response.close()
 
 
 def parse_cve_file(items=None):
@@ -28,10 +144,31 @@ def parse_cve_file(items=None):
         items = []
     parsed_items = []
     for item in items:
-        parsed_items.append(CVEItem(item).to_json())
+        parsed_items.append(make_cve_record(item))
     return parsed_items
 
 
+def iter_parse_cve_file(items=None):
+    """
+    Lazy version of parse_cve_file for use with stream_cve_file
+    """
+    if items is None:
+        return
+    for item in items:
+        yield make_cve_record(item)
+
+
+def make_cve_record(item):
+    """
+    CVEItem(item).to_record(), timed as the cve_item stage
+    """
+    start = time.perf_counter()
+    record = CVEItem(item).to_record()
+    INGEST_METRICS.observe("cve_item", time.perf_counter() - start)
+    INGEST_METRICS.increment("items")
+    return record
+
+
 def unify_time(dt):
     if isinstance(dt, str):
         if 'Z' in dt:
@@ -58,8 +195,40 @@ def unify_bool(param):
     elif isinstance(param, type(None)):
         return 'false'
 
-def get_file(getfile, unpack=True, raw=False, HTTP_PROXY=None):
+def content_type_for_path(path):
+    """
+    Content type of a local feed file, by extension, in the form get_file
+    and unpack_payload expect from HTTP responses
+    """
+    if path.endswith(".gz"):
+        return 'application/x-gzip'
+    elif path.endswith(".bz2"):
+        return 'application/x-bzip2'
+    elif path.endswith(".zip"):
+        return 'application/zip'
+    return 'application/json'
+
+
+def open_local_file(path, stream=False):
+    """
+    get_file for a file from the local feed cache
+    :return: (tuple) - (unpacked stream, file object to close)
+    """
+    local_file = open(path, 'rb')
+    content_type = content_type_for_path(path)
+    if stream and 'gzip' in content_type:
+        return gzip.GzipFile(fileobj=local_file), local_file
+    try:
+        return unpack_payload(local_file.read(), content_type), local_file
+    finally:
+        local_file.close()
+
+
+def get_file(getfile, unpack=True, raw=False, HTTP_PROXY=None, stream=False):
     try:
+        if unpack and not raw and os.path.isfile(getfile):
+            return open_local_file(getfile, stream=stream)
+
         if HTTP_PROXY:
             proxy = req.ProxyHandler({'http': HTTP_PROXY, 'https': HTTP_PROXY})
             auth = req.HTTPBasicAuthHandler()
@@ -73,8 +242,11 @@ def get_file(getfile, unpack=True, raw=False, HTTP_PROXY=None):
 
         if unpack:
             if 'gzip' in response.info().get('Content-Type'):
-                buf = BytesIO(response.read())
-                data = gzip.GzipFile(fileobj=buf)
+                if stream:
+                    data = gzip.GzipFile(fileobj=response)
+                else:
+                    buf = BytesIO(response.read())
+                    data = gzip.GzipFile(fileobj=buf)
             elif 'bzip2' in response.info().get('Content-Type'):
                 data = BytesIO(bz2.decompress(response.read()))
             elif 'zip' in response.info().get('Content-Type'):
@@ -84,4 +256,44 @@ def get_file(getfile, unpack=True, raw=False, HTTP_PROXY=None):
                     data = BytesIO(fzip.read(fzip.namelist()[0]))
         return data, response
     except Exception as ex:
-        return None, str(ex)
\ No newline at end of file
+        return None, str(ex)
+
+def download_raw_file(source):
+    """
+    Download a file as is, without unpacking
+    :param source: (str) - URL or path of a file in the local feed cache
+    :return: (tuple) - (bytes, content type), (None, error) on failure
+    """
+    start = time.perf_counter()
+    try:
+        if os.path.isfile(source):
+            with open(source, 'rb') as local_file:
+                payload, content_type = local_file.read(), content_type_for_path(source)
+        else:
+            response = req.urlopen(source)
+            try:
+                payload, content_type = response.read(), response.info().get('Content-Type', '')
+            finally:
+                response.close()
+    except Exception as ex:
+        return None, str(ex)
+    INGEST_METRICS.observe("download", time.perf_counter() - start)
+    INGEST_METRICS.increment("feeds")
+    INGEST_METRICS.increment("bytes", len(payload))
+    return payload, content_type
+
+
+def unpack_payload(payload, content_type):
+    """
+    Same unpacking as get_file, for a payload downloaded by download_raw_file
+    :return: (file) - Binary stream with the unpacked content
+    """
+    if 'gzip' in content_type:
+        return gzip.GzipFile(fileobj=BytesIO(payload))
+    elif 'bzip2' in content_type:
+        return BytesIO(bz2.decompress(payload))
+    elif 'zip' in content_type:
+        fzip = zipfile.ZipFile(BytesIO(payload), 'r')
+        if len(fzip.namelist()) > 0:
+            return BytesIO(fzip.read(fzip.namelist()[0]))
+    return BytesIO(payload)
@@ -0,0 +1,58 @@
+import re
+
+# Tokens that mark a pre-release, with their order. They sort before the
+# release they belong to: 2.4.0-rc1 < 2.4.0
+PRE_RELEASE_RANK = dict(
+    dev=0,
+    snapshot=0,
+    alpha=1,
+    a=1,
+    beta=2,
+    b=2,
+    milestone=3,
+    m=3,
+    pre=4,
+    preview=4,
+    rc=5,
+    cr=5,
+)
+
+# Segment classes. At the same position a pre-release sorts before the end
+# of the version, which sorts before a letter suffix (openssl 1.0.2 <
+# 1.0.2k), which sorts before a further numeric segment.
+CLASS_PRE_RELEASE = "1"
+CLASS_END = "2"
+CLASS_LETTERS = "3"
+CLASS_NUMBER = "4"
+
+SEGMENT_SEPARATOR = "."
+
+TOKENS = re.compile(r"\d+|[a-z]+")
+
+
+def version_sort_key(version):
+    """
+    Normalize a version string into a key whose lexicographic order is the
+    semantic order of versions: numeric segments compare by value, letter
+    suffixes sort after the release and known pre-release tags before it.
+    "1.0.2k" -> "4011.4010.4012.3k.2"
+    :param version: (str) - Version as found in the CPE string
+    :return: (str) - Sort key, ASCII only
+    """
+    tokens = TOKENS.findall(version.lower())
+    segments = []
+    for index, token in enumerate(tokens):
+        if token.isdigit():
+            digits = token.lstrip("0") or "0"
+            segments.append("{}{:02d}{}".format(CLASS_NUMBER, len(digits), digits))
+            continue
+        rank = PRE_RELEASE_RANK.get(token)
+        # A single letter is a pre-release only when a number follows it
+        # (1.0a1 is an alpha, 1.0.2a is openssl's first patch letter)
+        followed_by_number = index + 1 < len(tokens) and tokens[index + 1].isdigit()
+        if rank is not None and (len(token) > 1 or followed_by_number):
+            segments.append("{}{}".format(CLASS_PRE_RELEASE, rank))
+        else:
+            segments.append("{}{}".format(CLASS_LETTERS, token))
+    segments.append(CLASS_END)
+    return SEGMENT_SEPARATOR.join(segments)
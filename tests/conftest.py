@@ -0,0 +1,60 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import updater
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """
+    Factory of engines over one shared index: make_engine(name, **settings).
+    Redis engines run on fakeredis and are skipped without it
+    """
+    created = []
+
+    def make(name, **settings):
+        if name != "sqlite":
+            fakeredis = pytest.importorskip("fakeredis")
+            monkeypatch.setattr("engine_redis.redis.StrictRedis", fakeredis.FakeStrictRedis)
+        engine_settings = dict(
+            updater.SETTINGS,
+            engine=name,
+            feed_cache_dir=None,
+            query_cache_size=0,
+            sqlite_path=str(tmp_path / "index.sqlite"))
+        engine_settings.update(settings)
+        engine = updater.create_search_engine(engine_settings)
+        created.append(engine)
+        return engine
+
+    yield make
+    for engine in created:
+        if hasattr(engine, "close"):
+            engine.close()
+        else:
+            engine.cache_for_indexer.flushall()
+
+
+@pytest.fixture
+def feed_server():
+    """
+    benchmarks/feed_server.py with 50 CVEs for each of the last two years
+    """
+    from feed_server import make_feed_server
+    year = datetime.now().year
+    server = make_feed_server([year - 1, year], 50, cpe_fanout=3).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def feed_settings(feed_server):
+    # Settings that point an engine at feed_server
+    return dict(sources=feed_server.sources(), start_year=datetime.now().year - 1)
@@ -0,0 +1,69 @@
+import pytest
+
+from cve_item import CVEItem
+
+
+def make_item(cve_id, cwe, v2_severity, v3_severity, published, last_modified=None):
+    return {
+        "cve": {
+            "CVE_data_meta": {"ID": cve_id},
+            "problemtype": {"problemtype_data": [{"description": [{"lang": "en", "value": cwe}]}]},
+        },
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri="cpe:/a:openssl:openssl:1.0.2")]}]},
+        "impact": {
+            "baseMetricV2": {"cvssV2": {"baseScore": 5.0}, "severity": v2_severity},
+            "baseMetricV3": {"cvssV3": {"baseScore": 9.8, "baseSeverity": v3_severity}},
+        },
+        "publishedDate": published,
+        "lastModifiedDate": last_modified or published,
+    }
+
+
+def index_items(engine, items):
+    engine.update_items_in_cache_index([CVEItem(item).to_record() for item in items])
+
+
+@pytest.fixture(params=["hashes", "stacks", "sqlite"])
+def engine(request, make_engine):
+    engine = make_engine(request.param)
+    index_items(engine, [
+        make_item("CVE-2017-0001", "CWE-79", "MEDIUM", "CRITICAL", "2017-01-10T00:00Z"),
+        make_item("CVE-2017-0002", "CWE-89", "HIGH", "CRITICAL", "2017-02-10T00:00Z"),
+        make_item("CVE-2017-0003", "CWE-79", "HIGH", "HIGH", "2017-03-10T00:00Z", "2017-04-01T00:00Z"),
+    ])
+    return engine
+
+
+def test_set_criteria(engine):
+    assert engine.find_ids_by_attributes(cwe="CWE-79") == ["CVE-2017-0001", "CVE-2017-0003"]
+    assert engine.find_ids_by_attributes(cwe=["CWE-79", "CWE-89"]) == [
+        "CVE-2017-0001", "CVE-2017-0002", "CVE-2017-0003"]
+    assert engine.find_ids_by_attributes(cvssv3_severity="critical", cvssv2_severity="HIGH") == ["CVE-2017-0002"]
+    assert engine.find_ids_by_attributes(cwe=[]) == []
+
+
+def test_date_criteria(engine):
+    assert engine.find_ids_by_attributes(published_after="2017-02-10T00:00Z") == ["CVE-2017-0002", "CVE-2017-0003"]
+    assert engine.find_ids_by_attributes(published_before="2017-02-10T00:00Z") == ["CVE-2017-0001"]
+    assert engine.find_ids_by_attributes(cwe="CWE-79", modified_after="2017-03-15") == ["CVE-2017-0003"]
+    with pytest.raises(ValueError):
+        engine.find_ids_by_attributes()
+
+
+def test_changed_cve_leaves_its_old_attributes(engine):
+    index_items(engine, [
+        make_item("CVE-2017-0001", "CWE-89", "LOW", "LOW", "2017-01-10T00:00Z", "2017-05-01T00:00Z"),
+    ])
+    assert engine.find_ids_by_attributes(cwe="CWE-79") == ["CVE-2017-0003"]
+    assert engine.find_ids_by_attributes(cvssv3_severity="CRITICAL") == ["CVE-2017-0002"]
+    assert engine.find_ids_by_attributes(modified_after="2017-04-15") == ["CVE-2017-0001"]
+    assert [cve["id"] for cve in engine.find_by_attributes(cwe="CWE-89", cvssv3_severity="LOW")] == ["CVE-2017-0001"]
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_no_temporary_keys_are_left(make_engine, name):
+    engine = make_engine(name)
+    index_items(engine, [make_item("CVE-2017-0001", "CWE-79", "MEDIUM", "CRITICAL", "2017-01-10T00:00Z")])
+    assert engine.find_ids_by_attributes(cwe=["CWE-79", "CWE-89"], published_after="2017-01-01") == ["CVE-2017-0001"]
+    assert engine.cache_for_indexer.keys("*tmp::*") == []
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from cve_codec import encode_value, decode_value, CodecError, CODECS, MAGIC, TAG_BINARY
+from engine_redis import SearchEngineRedis
+
+RECORD = {
+    "id": "CVE-2017-0001",
+    "description": "Überlauf in libpng",
+    "cpe": {"data": ["cpe:/a:libpng:libpng:1.6.0"]},
+    "cvssv3": {"baseScore": 9.8, "baseSeverity": "CRITICAL"},
+    "references": [],
+    "counts": [0, 1, -1, 127, 128, -300, 2 ** 40],
+    "flags": [True, False, None],
+}
+
+
+@pytest.mark.parametrize("codec_name", sorted(CODECS))
+def test_round_trip(codec_name):
+    assert decode_value(encode_value(RECORD, codec_name)) == RECORD
+
+
+def test_untagged_values_stay_readable():
+    assert decode_value(json.dumps(RECORD).encode("utf-8")) == RECORD
+    assert decode_value(repr([RECORD])) == [RECORD]
+    assert decode_value(None) is None
+
+
+@pytest.mark.parametrize("codec_name", sorted(CODECS))
+def test_truncated_body_raises_codec_error(codec_name):
+    encoded = encode_value(RECORD, codec_name)
+    with pytest.raises(CodecError):
+        decode_value(encoded[:len(encoded) // 2])
+
+
+@pytest.mark.parametrize("corrupt", [
+    bytes((MAGIC, 99)) + b"{}",
+    bytes((MAGIC, TAG_BINARY, 0x4B, 250)),
+    bytes((MAGIC, TAG_BINARY, 0x53, 2)) + b"\xff\xfe",
+    bytes((MAGIC, TAG_BINARY, 0x5A)),
+    b"\xff\xfe not json",
+])
+def test_corrupt_body_raises_codec_error(corrupt):
+    with pytest.raises(CodecError):
+        decode_value(corrupt)
+    assert SearchEngineRedis.deserialize(corrupt) is None
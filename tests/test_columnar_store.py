@@ -0,0 +1,56 @@
+import pytest
+
+from cve_item import CVEItem
+from index_mutations import ComponentNames
+
+pytest.importorskip("numpy")
+
+from columnar_store import ColumnarCVEStore
+
+
+def make_item(cve_id, cpe_uris, severity=None, published="2017-01-01T00:00Z"):
+    item = {
+        "cve": {"CVE_data_meta": {"ID": cve_id}},
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri=uri) for uri in cpe_uris]}]},
+        "publishedDate": published,
+        "lastModifiedDate": published,
+    }
+    if severity is not None:
+        item["impact"] = {"baseMetricV3": {"cvssV3": {"baseScore": 9.8, "baseSeverity": severity}}}
+    return item
+
+
+ITEMS = [
+    make_item("CVE-2017-0001", ["cpe:/a:openssl:openssl:1.0.1"], "CRITICAL"),
+    make_item("CVE-2017-0002", ["cpe:/a:apache:httpd_server:2.4.1"], "HIGH", "2017-06-01T00:00Z"),
+    make_item("CVE-2017-0003", ["cpe:/a:openssl:openssl:1.0.2", "cpe:/a:apache:http_server:2.4.2"]),
+]
+
+
+def test_unknown_severity_matches_unknown_code():
+    store = ColumnarCVEStore.from_records(CVEItem(item).to_record() for item in ITEMS)
+    assert store.filter(cvssv3_severity=["critical"]) == ["CVE-2017-0001"]
+    assert store.filter(cvssv3_severity=["UNRATED"]) == ["CVE-2017-0003"]
+
+
+def test_products_are_named_as_in_the_index():
+    component_names = ComponentNames(product_aliases={"apache:httpd_server": "apache:http_server"})
+    store = ColumnarCVEStore.from_records((CVEItem(item).to_record() for item in ITEMS), component_names)
+    assert store.filter(products=["apache:httpd_server"]) == ["CVE-2017-0002", "CVE-2017-0003"]
+    assert store.filter(products=["http_server"]) == ["CVE-2017-0002", "CVE-2017-0003"]
+    assert store.count_by_product() == [("openssl:openssl", 2), ("apache:http_server", 2)]
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks", "sqlite"])
+def test_engine_loads_its_index(make_engine, name):
+    engine = make_engine(name, product_aliases={"apache:httpd_server": "apache:http_server"})
+    engine.update_items_in_cache_index([CVEItem(item).to_record() for item in ITEMS])
+
+    store = engine.create_columnar_store(chunk_size=2)
+    assert len(store) == 3
+    for product, expected in (("openssl", ["CVE-2017-0001", "CVE-2017-0003"]),
+                              ("apache:httpd_server", ["CVE-2017-0002", "CVE-2017-0003"])):
+        assert store.filter(products=[product]) == expected
+        assert sorted(set(cve["id"] for cve in engine.find_by_component_and_version(product, None))) == expected
+    assert store.filter(published_after="2017-03-01", cvssv3_severity=["HIGH"]) == ["CVE-2017-0002"]
@@ -0,0 +1,48 @@
+import pytest
+
+import cpe_parser
+from cpe_parser import parse_cpe_fast, parse_cpe_with_library, cpe_cache_stats, cpe_cache_delta
+
+FAST_NAMES = [
+    "cpe:/a:openssl:openssl:1.0.2k",
+    "cpe:/o:linux:linux_kernel:4.9::~~~~x64~",
+    "cpe:/a:apache:http_server",
+    "cpe:/a:foo:bar:1.0:beta",
+    "cpe:/a:foo%21:bar:1.0",
+    "cpe:/h:cisco:router:1.0",
+    "cpe:/a:hp:system_management_homepage:2.0.2.106",
+    "cpe:2.3:a:openssl:openssl:1.0.2k:*:*:*:*:*:*:*",
+    "cpe:2.3:o:microsoft:windows_10:-:*:*:*:*:*:x64:*",
+]
+
+# Escapes and language tags are left to the cpe library
+LIBRARY_NAMES = [
+    "cpe:2.3:a:foo\\:bar:baz:1.0:*:*:*:*:*:*:*",
+    "cpe:/a:foo:bar:1.0::~~~~x64~:en-us",
+    "cpe:2.3:a:foo:bar:1.0:*:*:en:*:*:*:*",
+]
+
+
+@pytest.mark.parametrize("cpe_string", FAST_NAMES)
+def test_fast_path_agrees_with_the_library(cpe_string):
+    assert parse_cpe_fast(cpe_string) is not None
+    assert parse_cpe_fast(cpe_string) == parse_cpe_with_library(cpe_string)
+
+
+@pytest.mark.parametrize("cpe_string", LIBRARY_NAMES + ["cpe:/x:foo:bar:1.0", "not a cpe"])
+def test_other_names_need_the_library(cpe_string):
+    assert parse_cpe_fast(cpe_string) is None
+
+
+def test_extract_is_cached():
+    cpe_parser.configure_cpe_cache(16)
+    since = cpe_cache_stats()
+    for cpe_string in FAST_NAMES + LIBRARY_NAMES + FAST_NAMES:
+        cpe_parser.extract_component_and_version(cpe_string)
+    delta = cpe_cache_delta(since)
+    assert delta["misses"] == len(FAST_NAMES) + len(LIBRARY_NAMES)
+    assert delta["hits"] == len(FAST_NAMES)
+    assert (delta["fast_parsed"], delta["library_parsed"]) == (len(FAST_NAMES), len(LIBRARY_NAMES))
+    assert cpe_parser.extract_component_and_version("cpe:/a:openssl:openssl:1.0.2k") == dict(
+        vendor="openssl", component="openssl", version="1.0.2k")
+    cpe_parser.configure_cpe_cache(cpe_parser.DEFAULT_CACHE_SIZE)
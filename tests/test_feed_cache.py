@@ -0,0 +1,70 @@
+import io
+import hashlib
+
+import pytest
+
+import utils
+from feed_cache import FeedCache, COPY_CHUNK_SIZE
+
+
+class RecordingStream(io.BytesIO):
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.sizes = []
+
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return super().read(size)
+
+
+def test_copy_reads_in_chunks(tmp_path):
+    data = bytes(range(256)) * (COPY_CHUNK_SIZE // 100)
+    stream = RecordingStream(data)
+    path = str(tmp_path / "feed.json.gz")
+    assert FeedCache(str(tmp_path)).copy_atomic(path, stream) == hashlib.sha256(data).hexdigest()
+    assert set(stream.sizes) == {COPY_CHUNK_SIZE}
+    with open(path, "rb") as copied:
+        assert copied.read() == data
+
+
+def test_failed_copy_keeps_the_cached_file(tmp_path):
+    cache = FeedCache(str(tmp_path))
+    path = str(tmp_path / "feed.json.gz")
+    cache.write_atomic(path, b"cached")
+
+    class BrokenStream(object):
+        def read(self, size=-1):
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        cache.copy_atomic(path, BrokenStream())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["feed.json.gz"]
+    with open(path, "rb") as cached:
+        assert cached.read() == b"cached"
+
+
+def not_streamed(source):
+    raise AssertionError("{} was downloaded whole".format(source))
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks", "sqlite"])
+def test_default_settings_stream_feeds(make_engine, feed_settings, tmp_path, monkeypatch, name):
+    streamed = []
+
+    def iter_cve_items(file_stream, *args, **kwargs):
+        streamed.append(file_stream)
+        return parse_items(file_stream, *args, **kwargs)
+
+    parse_items = utils.iter_cve_items
+    monkeypatch.setattr("utils.iter_cve_items", iter_cve_items)
+    for whole_download in ("feed_pipeline.download_raw_file", "engine_redis.download_cve_file",
+                           "engine_sqlite.download_cve_file"):
+        monkeypatch.setattr(whole_download, not_streamed)
+    # Everything but the feeds and the feed cache as shipped
+    engine = make_engine(name, feed_cache_dir=str(tmp_path / "feeds"), **feed_settings)
+
+    result = engine.action_populate_cve()
+    assert result["failed"] == []
+    assert len(streamed) == 2
+    assert len(engine.find_by_component_and_version("openssl", "*")) > 0
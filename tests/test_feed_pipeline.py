@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+YEAR = datetime.now().year
+
+
+def feed_name(year):
+    return "nvdcve-1.0-{}.json.gz".format(year)
+
+
+def not_streamed(source):
+    raise AssertionError("{} was downloaded whole".format(source))
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+@pytest.mark.parametrize("stream_feeds", [True, False])
+def test_pipeline_against_feed_server(make_engine, feed_settings, feed_server, tmp_path, monkeypatch,
+                                      name, stream_feeds):
+    complete = feed_server.files[feed_name(YEAR)]
+    feed_server.files[feed_name(YEAR)] = complete[:len(complete) // 2]
+    if stream_feeds:
+        monkeypatch.setattr("feed_pipeline.download_raw_file", not_streamed)
+    engine = make_engine(
+        name, ingest_pipeline=True, stream_feeds=stream_feeds, feed_cache_dir=str(tmp_path / "feeds"),
+        pipeline_batch_items=10, **feed_settings)
+    sources = [(year, feed_server.base_url + feed_name(year)) for year in (YEAR - 1, YEAR)]
+
+    result = engine.run_ingest_pipeline("populated", sources + [("missing", feed_server.base_url + "missing.json.gz")])
+    assert result["failed"] == [YEAR, "missing"]
+    assert "Failed feeds: {} (Read error".format(YEAR) in result["message"]
+    assert result["feeds"][0]["items"] == 50
+    assert result["feeds"][1]["items"] < 50
+    # Only the complete feed counts as indexed
+    assert len(engine.cache_for_indexer.keys("feeds::*")) == 1
+
+    feed_server.files[feed_name(YEAR)] = complete
+    result = engine.run_ingest_pipeline("populated", sources)
+    assert result["failed"] == []
+    assert result["skipped"] == [YEAR - 1]
+    assert result["feeds"][1]["items"] == 50
+    assert len(engine.find_by_attributes(published_after="{}-01-01".format(YEAR))) == 50
@@ -0,0 +1,74 @@
+import pytest
+
+from cve_item import CVEItem
+
+
+def make_item(cve_id, cpe_uris):
+    return {
+        "cve": {"CVE_data_meta": {"ID": cve_id}},
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri=uri) for uri in cpe_uris]}]},
+        "publishedDate": "2017-01-01T00:00Z",
+        "lastModifiedDate": "2017-01-01T00:00Z",
+    }
+
+
+@pytest.fixture(params=["hashes", "stacks", "sqlite"])
+def engine(request, make_engine):
+    engine = make_engine(request.param)
+    engine.update_items_in_cache_index([CVEItem(item).to_record() for item in [
+        make_item("CVE-2017-0001", ["cpe:/a:openssl:openssl:1.0.1", "cpe:/a:openssl:openssl:1.0.2"]),
+        make_item("CVE-2017-0002", ["cpe:/a:openssl:openssl:1.0.2k"]),
+        make_item("CVE-2017-0003", ["cpe:/a:openssl:openssl:1.1.0", "cpe:/a:fork:openssl:1.0.2"]),
+        make_item("CVE-2017-0004", ["cpe:/a:apache:http_server:2.4.1"]),
+    ]])
+    return engine
+
+
+def ids(records):
+    return [record["id"] for record in records]
+
+
+def test_version_patterns(engine):
+    assert engine.find_versions_by_pattern("openssl:openssl", "1.0.2*") == ["1.0.2", "1.0.2k"]
+    assert engine.find_versions_by_pattern("openssl:openssl", "1.?.?") == ["1.0.1", "1.0.2", "1.1.0"]
+    assert engine.find_versions_by_pattern("openssl:openssl", "1.0.[12]") == ["1.0.1", "1.0.2"]
+    assert engine.find_versions_by_pattern("openssl", None) == ["1.0.1", "1.0.2", "1.0.2k", "1.1.0"]
+
+
+def test_wildcard_query_reports_matched_versions(engine):
+    cves = engine.find_by_component_and_version("openssl:openssl", "1.0.*")
+    assert ids(cves) == ["CVE-2017-0001", "CVE-2017-0002"]
+    assert cves[0]["matched_versions"] == ["1.0.1", "1.0.2"]
+    assert ids(engine.find_by_component_and_version("openssl", "1.0.2")) == ["CVE-2017-0001", "CVE-2017-0003"]
+
+
+QUERIES = [
+    ("openssl:openssl", "1.0.2"),
+    ("openssl", "1.0.2"),
+    ("openssl:openssl", "1.0.2*"),
+    ("apache:http_server", None),
+    ("unknown:product", "1.0"),
+    ("openssl:openssl", "1.0.2"),
+]
+
+
+def test_find_many_answers_like_single_queries(engine):
+    found = engine.find_many(QUERIES)
+    assert list(found["results"]) == list(dict.fromkeys(QUERIES))
+    for (component, version), cves in found["results"].items():
+        assert cves == engine.find_by_component_and_version(component, version)
+    assert found["results"][("unknown:product", "1.0")] == []
+    assert found["stats"]["queries"] == 6
+    assert found["stats"]["unique_queries"] == 5
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_find_many_round_trips_do_not_grow_with_queries(make_engine, name):
+    engine = make_engine(name)
+    engine.update_items_in_cache_index([
+        CVEItem(make_item("CVE-2017-{:04d}".format(number), ["cpe:/a:vendor:product{}:1.0".format(number)])).to_record()
+        for number in range(50)])
+    found = engine.find_many([("vendor:product{}".format(number), "1.*") for number in range(50)])
+    assert sum(len(cves) for cves in found["results"].values()) == 50
+    assert found["stats"]["round_trips"] <= 3
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from cve_item import CVEItem
+from feed_cache import FeedCache
+
+
+
+def make_item(cve_id, cpe_uris, last_modified):
+    return {
+        "cve": {"CVE_data_meta": {"ID": cve_id}},
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri=uri) for uri in cpe_uris]}]},
+        "publishedDate": "2017-01-01T00:00Z",
+        "lastModifiedDate": last_modified,
+    }
+
+
+def index_items(engine, items):
+    engine.update_items_in_cache_index([CVEItem(item).to_record() for item in items])
+
+
+@pytest.fixture(params=["hashes", "stacks", "sqlite"])
+def engine(request, make_engine):
+    return make_engine(request.param)
+
+
+def ids(records):
+    return sorted(record["id"] for record in records)
+
+
+def test_changed_cpe_list_replaces_versions(engine):
+    index_items(engine, [
+        make_item("CVE-2017-0001", ["cpe:/a:openssl:openssl:1.0.1", "cpe:/a:openssl:openssl:1.0.2"], "2017-01-01T00:00Z"),
+        make_item("CVE-2017-0002", ["cpe:/a:openssl:openssl:1.0.2"], "2017-01-01T00:00Z"),
+    ])
+    index_items(engine, [
+        make_item("CVE-2017-0001", ["cpe:/a:openssl:openssl:1.0.3"], "2017-02-01T00:00Z"),
+    ])
+
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "1.0.1")) == []
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "1.0.2")) == ["CVE-2017-0002"]
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "1.0.3")) == ["CVE-2017-0001"]
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "1.0.*")) == ["CVE-2017-0001", "CVE-2017-0002"]
+    assert engine.find_versions_by_pattern("openssl:openssl") == ["1.0.2", "1.0.3"]
+
+
+def test_changed_vendor_leaves_product(engine):
+    index_items(engine, [
+        make_item("CVE-2017-0001", ["cpe:/a:apache:http_server:2.4.1"], "2017-01-01T00:00Z"),
+        make_item("CVE-2017-0002", ["cpe:/a:nginx:http_server:1.0"], "2017-01-01T00:00Z"),
+    ])
+    index_items(engine, [
+        make_item("CVE-2017-0001", ["cpe:/a:nginx:http_server:1.1"], "2017-02-01T00:00Z"),
+    ])
+
+    assert engine.resolve_components("http_server") == ["nginx:http_server"]
+    assert engine.find_versions_by_pattern("apache:http_server") == []
+    assert ids(engine.find_by_component_and_version("http_server", "*")) == ["CVE-2017-0001", "CVE-2017-0002"]
+
+
+@pytest.mark.parametrize("reader", [
+    dict(ingest_pipeline=True),
+    dict(ingest_pipeline=False, stream_feeds=True),
+    dict(ingest_pipeline=False, stream_feeds=False),
+])
+def test_failed_feed_is_not_marked_indexed(engine, tmp_path, reader):
+    feed_path = tmp_path / "nvdcve-modified.json"
+    feed_path.write_text("{\"CVE_Items\": [")
+    source = feed_path.as_uri()
+    engine.feed_cache = FeedCache(str(tmp_path / "feeds"))
+    engine.SETTINGS = dict(
+        engine.SETTINGS, sources=dict(engine.SETTINGS["sources"], cve_modified=source), **reader)
+
+    result = engine.action_update_cve_modified()
+    assert result["failed"] == ["modified"]
+    assert "Failed feeds: modified (" in result["message"]
+    # Neither the feed marker nor the cached copy may survive the failure
+    assert list((tmp_path / "feeds").iterdir()) == []
+
+    feed_path.write_text(json.dumps(dict(CVE_Items=[
+        make_item("CVE-2017-0001", ["cpe:/a:openssl:openssl:1.0.1"], "2017-01-01T00:00Z")])))
+    result = engine.action_update_cve_modified()
+    assert result["failed"] == []
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "1.0.1")) == ["CVE-2017-0001"]
+    assert engine.action_update_cve_modified()["skipped"] == ["modified"]
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+
+def legacy_record(cve_id):
+    return dict(id=cve_id, component="libpng", version="1.6.0", lastModifiedDate="2017-01-01T00:00Z")
+
+
+def write_legacy_key(engine, records):
+    # Index key as written before CVE bodies moved to cve::<ID>
+    key = "indexer::libpng::1.6.0"
+    bodies = [json.dumps(record) for record in records]
+    if engine.SETTINGS["engine"] == "hashes":
+        engine.cache_for_indexer.hset(key, "data", json.dumps(records))
+    else:
+        engine.cache_for_indexer.rpush(key, *bodies)
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_legacy_index_is_migrated_when_its_layout_is_kept(make_engine, name):
+    engine = make_engine(name, vendor_qualified_index=False)
+    write_legacy_key(engine, [legacy_record("CVE-2017-0001"), legacy_record("CVE-2017-0002")])
+
+    assert engine.index_layout_changed() is False
+    assert engine.get_index_layout() == "product"
+    assert sorted(cve["id"] for cve in engine.find_by_component_and_version("libpng", "1.6.0")) == [
+        "CVE-2017-0001", "CVE-2017-0002"]
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_legacy_index_of_another_layout_is_rebuilt(make_engine, feed_settings, name):
+    engine = make_engine(name, **feed_settings)
+    write_legacy_key(engine, [legacy_record("CVE-2017-0001")])
+
+    result = engine.action_populate_cve()
+    assert result["layout"] == dict(previous="product", current="vendor")
+    assert not engine.cache_for_indexer.exists("indexer::libpng::1.6.0")
+    assert engine.find_by_component_and_version("libpng", "1.6.0") == []
+    assert len(engine.find_by_component_and_version("openssl", "*")) > 0
@@ -0,0 +1,38 @@
+import pytest
+
+
+def dump_keyspace(cache):
+    dumped = dict()
+    for key in cache.keys("*"):
+        kind = cache.type(key)
+        if kind == b"string":
+            dumped[key] = cache.get(key)
+        elif kind == b"hash":
+            dumped[key] = cache.hgetall(key)
+        elif kind == b"set":
+            dumped[key] = cache.smembers(key)
+        elif kind == b"zset":
+            dumped[key] = cache.zrange(key, 0, -1, withscores=True)
+        else:
+            dumped[key] = cache.lrange(key, 0, -1)
+    return dumped
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_parallel_populate_matches_sequential(make_engine, feed_settings, name):
+    engine = make_engine(name, ingest_pipeline=False, populate_workers=1, **feed_settings)
+    sequential = engine.action_populate_cve()
+    assert sequential["count"] > 0
+    expected = dump_keyspace(engine.cache_for_indexer)
+    engine.cache_for_indexer.flushall()
+
+    engine = make_engine(name, ingest_pipeline=False, populate_workers=2, **feed_settings)
+    parallel = engine.action_populate_cve()
+    assert parallel["failed"] == []
+    assert parallel["count"] == sequential["count"]
+    assert dump_keyspace(engine.cache_for_indexer) == expected
+
+    # What the workers parsed is reported by this process
+    assert parallel["metrics"]["counters"]["items"] == sequential["metrics"]["counters"]["items"] == 100
+    assert parallel["metrics"]["stages"]["cpe_extraction"]["count"] == 100
+    assert parallel["cpe_cache"]["hits"] + parallel["cpe_cache"]["misses"] > 0
@@ -0,0 +1,63 @@
+import pytest
+
+from cve_item import CVEItem
+from query_cache import QueryCache
+
+
+def test_new_generation_drops_every_entry():
+    cache = QueryCache(maxsize=4)
+    cache.put("a", 1, ["CVE-2017-0001"])
+    cache.put("b", 1, [])
+    assert cache.get("a", 1) == (True, ["CVE-2017-0001"])
+    assert cache.get("a", 2) == (False, None)
+    assert cache.get("b", 2) == (False, None)
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(maxsize=2)
+    cache.put("a", 1, 1)
+    cache.put("b", 1, 2)
+    cache.get("a", 1)
+    cache.put("c", 1, 3)
+    assert cache.get("b", 1) == (False, None)
+    assert cache.get("a", 1) == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("query_cache.time.time", lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache.put("a", 1, 1)
+    now[0] += 11
+    assert cache.get("a", 1) == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+
+def make_item(cve_id, version, last_modified):
+    return CVEItem({
+        "cve": {"CVE_data_meta": {"ID": cve_id}},
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri="cpe:/a:openssl:openssl:" + version)]}]},
+        "publishedDate": "2017-01-01T00:00Z",
+        "lastModifiedDate": last_modified,
+    }).to_record()
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+def test_update_by_another_engine_invalidates_the_cache(make_engine, name):
+    writer = make_engine(name)
+    reader = make_engine(name, query_cache_size=16)
+    writer.update_items_in_cache_index([make_item("CVE-2017-0001", "1.0.1", "2017-01-01T00:00Z")])
+
+    assert [cve["id"] for cve in reader.find_by_component_and_version("openssl", "1.0.1")] == ["CVE-2017-0001"]
+    assert [cve["id"] for cve in reader.find_by_component_and_version("openssl", "1.0.1")] == ["CVE-2017-0001"]
+    assert reader.query_cache.stats()["hits"] == 1
+
+    writer.update_items_in_cache_index([
+        make_item("CVE-2017-0001", "1.0.2", "2017-02-01T00:00Z"),
+        make_item("CVE-2017-0002", "1.0.1", "2017-02-01T00:00Z"),
+    ])
+    assert [cve["id"] for cve in reader.find_by_component_and_version("openssl", "1.0.1")] == ["CVE-2017-0002"]
+    assert reader.query_cache.stats()["invalidations"] > 0
@@ -0,0 +1,29 @@
+import pytest
+
+
+def ids(records):
+    return sorted(record["id"] for record in records)
+
+
+@pytest.mark.parametrize("name", ["hashes", "stacks"])
+@pytest.mark.parametrize("query_cache_size", [0, 1024])
+def test_default_engines_follow_the_switched_namespace(make_engine, feed_settings, name, query_cache_size):
+    make_engine(name, **feed_settings).action_populate_cve()
+    # Reader and updater on default settings, created before the switch
+    reader = make_engine(name, query_cache_size=query_cache_size, **feed_settings)
+    updater = make_engine(name, **feed_settings)
+    before = ids(reader.find_by_component_and_version("openssl:openssl", "*"))
+    assert len(before) > 0
+
+    writer = make_engine(
+        name, shadow_rebuild=True, shadow_gc_background=False, shadow_gc_delay=0, **feed_settings)
+    result = writer.action_populate_cve()
+    assert result["namespace"] != ""
+    # The retired "" namespace is gone
+    assert writer.cache_for_indexer.keys("indexer::*") == []
+    assert ids(reader.find_by_component_and_version("openssl:openssl", "*")) == before
+
+    updater.action_update_cve_modified()
+    assert writer.cache_for_indexer.keys("cve::*") == []
+    assert ids(reader.find_by_component_and_version("openssl:openssl", "*")) == \
+        ids(writer.find_by_component_and_version("openssl:openssl", "*"))
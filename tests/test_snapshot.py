@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+from cve_codec import encode_value
+from snapshot import SnapshotReader, SnapshotError, write_snapshot
+
+YEAR_FEED = "nvdcve-1.0-{}.json.gz".format(datetime.now().year)
+
+
+def ids(records):
+    return sorted(record["id"] for record in records)
+
+
+@pytest.fixture(params=["hashes", "stacks"])
+def name(request):
+    return request.param
+
+
+def test_imported_snapshot_is_not_rebuilt(make_engine, feed_settings, feed_server, tmp_path, name):
+    path = str(tmp_path / "index.snapshot")
+    exporter = make_engine(name, **feed_settings)
+    exporter.action_populate_cve()
+    exporter.action_export_snapshot(path)
+    expected = exporter.find_by_component_and_version("openssl:openssl", "*")
+    exporter.cache_for_indexer.flushall()
+
+    engine = make_engine(name, **feed_settings)
+    result = engine.action_import_snapshot(path)
+    assert result["count"] == 100
+    assert engine.get_index_layout() == "vendor"
+    assert ids(engine.find_by_component_and_version("openssl:openssl", "*")) == ids(expected)
+    # The next update keeps the imported index instead of populating again
+    result = engine.action_update_cve_modified()
+    assert "layout" not in result
+    assert feed_server.requests[YEAR_FEED] == 1
+
+
+def test_snapshot_of_another_layout_is_refused(make_engine, feed_settings, tmp_path, name):
+    path = str(tmp_path / "index.snapshot")
+    exporter = make_engine(name, vendor_aliases={"openssl": "openssl_project"}, **feed_settings)
+    exporter.action_populate_cve()
+    exporter.action_export_snapshot(path)
+    exporter.cache_for_indexer.flushall()
+
+    engine = make_engine(name, **feed_settings)
+    result = engine.action_import_snapshot(path)
+    assert result["count"] == 0
+    assert result["layout"] == dict(snapshot=exporter.component_names.layout(), current="vendor")
+    assert not engine.index_exists()
+
+
+def test_reader_answers_like_the_engine(make_engine, feed_settings, tmp_path, name):
+    path = str(tmp_path / "index.snapshot")
+    engine = make_engine(name, **feed_settings)
+    engine.action_populate_cve()
+    result = engine.action_export_snapshot(path)
+    assert result["count"] == 100
+
+    with SnapshotReader(path) as reader:
+        assert reader.layout == "vendor"
+        for component, version in (("openssl:openssl", "*"), ("openssl", None), ("linux_kernel", "1.*")):
+            expected = engine.find_by_component_and_version(component, version)
+            assert len(expected) > 0
+            assert ids(reader.find_by_component_and_version(component, version)) == ids(expected)
+        assert reader.find_versions_by_pattern("openssl") == engine.find_versions_by_pattern("openssl")
+        assert reader.find_versions_by_range("openssl", "1.0", "2.5") == engine.find_versions_by_range(
+            "openssl", "1.0", "2.5")
+        assert ids(reader.find_by_component_and_version_range("openssl", hi="2", inclusive=False)) == ids(
+            engine.find_by_component_and_version_range("openssl", hi="2", inclusive=False))
+
+
+def test_damaged_files_are_refused(tmp_path):
+    path = str(tmp_path / "index.snapshot")
+    body = encode_value(dict(id="CVE-2017-0001"))
+    write_snapshot(path, {("openssl:openssl", "1.0.2"): ["CVE-2017-0001"]}, {"CVE-2017-0001": body}, layout="vendor")
+    with SnapshotReader(path) as reader:
+        assert ids(reader.find_by_component_and_version("openssl", "1.0.2")) == ["CVE-2017-0001"]
+
+    with open(path, "rb") as snapshot_file:
+        data = snapshot_file.read()
+    for damaged in (b"", data[:20], data[:-4], b"NOTASNAP" + data[8:]):
+        with open(path, "wb") as snapshot_file:
+            snapshot_file.write(damaged)
+        with pytest.raises(SnapshotError):
+            SnapshotReader(path)
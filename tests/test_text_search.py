@@ -0,0 +1,72 @@
+import pytest
+
+from cve_item import CVEItem
+
+
+def make_item(cve_id, description, last_modified="2017-01-01T00:00Z"):
+    return {
+        "cve": {
+            "CVE_data_meta": {"ID": cve_id},
+            "description": {"description_data": [{"lang": "en", "value": description}]},
+        },
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri="cpe:/a:libpng:libpng:1.6.0")]}]},
+        "publishedDate": "2017-01-01T00:00Z",
+        "lastModifiedDate": last_modified,
+    }
+
+
+def index_items(engine, items):
+    engine.update_items_in_cache_index([CVEItem(item).to_record() for item in items])
+
+
+def postings(engine, term):
+    if hasattr(engine, "connection"):
+        return sorted(cve_id for (cve_id,) in engine.connection.execute(
+            "SELECT cve_id FROM cve_term WHERE term = ?", (term,)))
+    return sorted(cve_id.decode("utf-8") for cve_id in
+                  engine.cache_for_indexer.smembers(engine.create_text_collection_name(term)))
+
+
+def ids(records):
+    return [record["id"] for record in records]
+
+
+@pytest.fixture(params=["hashes", "stacks", "sqlite"])
+def engine(request, make_engine):
+    engine = make_engine(request.param)
+    index_items(engine, [
+        make_item("CVE-2017-0001", "Heap overflow in libpng allows remote attackers to crash the reader."),
+        make_item("CVE-2017-0002", "Stack overflow in libpng via a crafted chunk."),
+        make_item("CVE-2017-0003", "The overflow of the heap in zlib."),
+    ])
+    return engine
+
+
+def test_changed_description_drops_lost_terms(engine):
+    index_items(engine, [
+        make_item("CVE-2017-0002", "Use after free in libxml2.", last_modified="2017-02-01T00:00Z"),
+    ])
+    assert postings(engine, "libpng") == ["CVE-2017-0001"]
+    assert postings(engine, "libxml2") == ["CVE-2017-0002"]
+    assert ids(engine.search_descriptions("libpng")) == ["CVE-2017-0001"]
+
+
+def test_words_are_answered_by_posting_lists(engine, monkeypatch):
+    read = []
+    get_cve_records_by_ids = engine.get_cve_records_by_ids
+
+    def recording(cve_ids):
+        read.extend(cve_ids)
+        return get_cve_records_by_ids(cve_ids)
+
+    monkeypatch.setattr(engine, "get_cve_records_by_ids", recording)
+    assert ids(engine.search_descriptions("overflow", limit=1)) == ["CVE-2017-0001"]
+    assert read == ["CVE-2017-0001"]
+    assert ids(engine.search_descriptions("overflow libpng")) == ["CVE-2017-0001", "CVE-2017-0002"]
+
+
+def test_phrases_and_stop_words_are_checked_on_the_text(engine):
+    assert ids(engine.search_descriptions('"heap overflow"')) == ["CVE-2017-0001"]
+    assert ids(engine.search_descriptions("the heap")) == ["CVE-2017-0001", "CVE-2017-0003"]
+    assert ids(engine.search_descriptions('zlib OR "stack overflow"')) == ["CVE-2017-0002", "CVE-2017-0003"]
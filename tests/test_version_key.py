@@ -0,0 +1,55 @@
+import pytest
+
+from cve_item import CVEItem
+from version_key import version_sort_key
+
+# Semantic order, lowest first
+ORDERED_VERSIONS = [
+    "0.9.8", "1.0a1", "1.0b2", "1.0rc1", "1.0", "1.0.0", "1.0.1", "1.0.2-beta1",
+    "1.0.2", "1.0.2a", "1.0.2k", "1.0.2.1", "1.0.10", "1.1.0-dev", "1.1.0", "2.4.0-rc1", "2.4.0", "10.0",
+]
+
+
+def test_sort_keys_follow_semantic_order():
+    keys = [version_sort_key(version) for version in ORDERED_VERSIONS]
+    assert sorted(keys) == keys
+    assert len(set(keys)) == len(keys)
+
+
+def test_sort_keys_ignore_leading_zeros_and_case():
+    assert version_sort_key("1.02") == version_sort_key("1.2")
+    assert version_sort_key("2.4.0-RC1") == version_sort_key("2.4.0-rc1")
+    assert all(ord(char) < 128 for char in version_sort_key("1.0.2k"))
+
+
+def make_item(cve_id, version):
+    return {
+        "cve": {"CVE_data_meta": {"ID": cve_id}},
+        "configurations": {"nodes": [{"operator": "OR", "cpe": [
+            dict(vulnerable=True, cpe22Uri="cpe:/a:openssl:openssl:" + version)]}]},
+        "publishedDate": "2017-01-01T00:00Z",
+        "lastModifiedDate": "2017-01-01T00:00Z",
+    }
+
+
+@pytest.fixture(params=["hashes", "stacks", "sqlite"])
+def engine(request, make_engine):
+    engine = make_engine(request.param)
+    engine.update_items_in_cache_index([
+        CVEItem(make_item("CVE-2017-{:04d}".format(number), version)).to_record()
+        for number, version in enumerate(["1.0.1", "1.0.2", "1.0.2k", "1.0.10", "1.1.0"], 1)])
+    return engine
+
+
+def test_versions_by_range(engine):
+    assert engine.find_versions_by_range("openssl", "1.0.2", "1.0.10") == ["1.0.2", "1.0.2k", "1.0.10"]
+    assert engine.find_versions_by_range("openssl", "1.0.2", "1.0.10", inclusive=(False, True)) == [
+        "1.0.2k", "1.0.10"]
+    assert engine.find_versions_by_range("openssl", hi="1.0.2k", inclusive=False) == ["1.0.1", "1.0.2"]
+    assert engine.find_versions_by_range("openssl", lo="1.0.10") == ["1.0.10", "1.1.0"]
+
+
+def test_cves_by_range(engine):
+    cves = engine.find_by_component_and_version_range("openssl:openssl", hi="1.0.2k", inclusive=False)
+    assert sorted(cve["id"] for cve in cves) == ["CVE-2017-0001", "CVE-2017-0002"]
+    assert engine.find_by_component_and_version_range("openssl", lo="2.0") == []